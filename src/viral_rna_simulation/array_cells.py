@@ -0,0 +1,570 @@
+from collections import Counter
+from typing import Iterator
+
+import numpy as np
+
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.cells import Cells, Seed, sequenced_counts
+from viral_rna_simulation.counts import Counts
+from viral_rna_simulation.genome import DeltaGenome, Genome, sample_copy_offsets
+from viral_rna_simulation.pileup import Pileup
+from viral_rna_simulation.profiling import timed
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.spectrum import MutationSpectrum
+from viral_rna_simulation.utils import BASES, CHANGES, grow
+
+
+def _ranges(starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """
+    Concatenate the ranges of integers starting at each of 'starts' with the
+    corresponding number of 'sizes' in them.
+    """
+    ends = np.cumsum(sizes)
+    total = int(ends[-1]) if len(ends) else 0
+    return np.arange(total) + np.repeat(starts - (ends - sizes), sizes)
+
+
+class ArrayCells(Cells):
+    """
+    A collection of cells whose RNA molecules are all held together in NumPy
+    arrays, so that one replication step for every cell is a handful of array
+    operations rather than a Python loop in each cell.
+
+    Each molecule has a cell, a sense, a replication count, and an index into
+    a table of genomes. A molecule that is copied without mutation just gets
+    the genome index of the molecule it was copied from. Only a molecule with
+    new mutations gets a new genome, and it is marked as the molecule in which
+    those mutations were made. The mutations of all such molecules in a step
+    are drawn together (see _add_genomes).
+
+    Like a delta genome (see DeltaGenome), each genome in the table is held as
+    its changes from the infecting genome, in (+) reference offsets and (+)
+    sense base codes, and so does not depend on the sense of the molecules
+    that have it. The changes of all genomes are held in flat arrays. The
+    changes of genome g are those from self.genome_start[g] up to (but not
+    including) self.genome_end[g], sorted by offset. For each change, the
+    arrays give its offset, its base code, the index of the genome in which
+    it was made (the genome itself, if the change is one of its new
+    mutations, or an ancestor of it), and the index of the change it replaced
+    (or -1 if the site had not changed before), from which the mutation
+    history of its site is found. The sense of the molecule in which each
+    genome was made is in self.genome_positive.
+
+    Cell instances are only made when the cells are iterated (e.g., for
+    display).
+
+    @param n_cells: The number of cells.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @param seed: The seed for the random number generator. Because all cells are
+        replicated together, a single generator is used for all of them.
+    """
+
+    def __init__(
+        self, n_cells: int, infecting_genome: Genome, seed: Seed = None
+    ) -> None:
+        assert infecting_genome.positive
+        # Cells.__init__ is not called, because there are no Cell instances,
+        # but the attributes its methods use must still be set. There are no
+        # running totals to check.
+        self.infecting_genome = infecting_genome
+        self.check = False
+        self.directory = None
+        self.n_cells = n_cells
+        self.rng = np.random.default_rng(seed)
+
+        # Per-molecule arrays, of which the first self.size entries are in use.
+        self.size = n_cells
+        self.cell = np.arange(n_cells, dtype=np.int64)
+        self.positive = np.ones(n_cells, dtype=bool)
+        self.replications = np.zeros(n_cells, dtype=np.int64)
+        self.genome = np.zeros(n_cells, dtype=np.int64)
+        self.created = np.zeros(n_cells, dtype=bool)
+
+        # The molecules of cell c are self.members[c, : self.sizes[c]].
+        self.members = np.arange(n_cells, dtype=np.int64).reshape(n_cells, 1)
+        self.sizes = np.ones(n_cells, dtype=np.int64)
+
+        # The genome table. The infecting genome has index zero and no changes.
+        self.n_genomes = 1
+        self.genome_start = np.zeros(1, dtype=np.int64)
+        self.genome_end = np.zeros(1, dtype=np.int64)
+        self.genome_positive = np.ones(1, dtype=bool)
+
+        # The changes of all genomes, of which the first self.n_changes entries
+        # are in use.
+        self.n_changes = 0
+        self.change_offset = np.zeros(0, dtype=np.int64)
+        self.change_code = np.zeros(0, dtype=np.uint8)
+        self.change_genome = np.zeros(0, dtype=np.int64)
+        self.change_previous = np.zeros(0, dtype=np.int64)
+        self.trajectory = None
+
+    def __iter__(self) -> Iterator[Cell]:
+        for index in range(self.n_cells):
+            cell = Cell(self.infecting_genome, delta=True)
+            cell.rnas = [
+                self._rna(molecule)
+                for molecule in self.members[index, : self.sizes[index]].tolist()
+            ]
+            cell.counts = cell.recount()
+            yield cell
+
+    def __len__(self) -> int:
+        return self.n_cells
+
+    @property
+    def cells(self) -> list[Cell]:
+        """
+        Make Cell instances holding the RNA molecules in each cell.
+        """
+        return list(self)
+
+    def _rna(self, molecule: int) -> RNA:
+        """
+        Make an RNA instance for a molecule.
+        """
+        genome = int(self.genome[molecule])
+        changes = {}
+        history = {}
+        mutant = []
+        for change in range(self.genome_start[genome], self.genome_end[genome]):
+            offset = int(self.change_offset[change])
+            changes[offset] = int(self.change_code[change])
+            history[offset] = self._history(change)
+            if self.change_genome[change] == genome:
+                mutant.append(offset)
+
+        rna = RNA(
+            DeltaGenome(
+                self.infecting_genome,
+                bool(self.positive[molecule]),
+                changes,
+                history,
+                frozenset(mutant) if self.created[molecule] else None,
+            )
+        )
+        rna.replications = int(self.replications[molecule])
+        return rna
+
+    def _history(self, change: int) -> tuple[tuple[str, bool], ...]:
+        """
+        Find the mutation history (see Site) of the site of a change, by
+        following the chain of the changes it replaced.
+        """
+        history = []
+        while change >= 0:
+            previous = int(self.change_previous[change])
+            from_ = int(
+                self.infecting_genome.bases[self.change_offset[change]]
+                if previous < 0
+                else self.change_code[previous]
+            )
+            to = int(self.change_code[change])
+            positive = bool(self.genome_positive[self.change_genome[change]])
+            if not positive:
+                from_, to = 3 - from_, 3 - to
+            history.append((BASES[from_] + BASES[to], positive))
+            change = previous
+        return tuple(reversed(history))
+
+    def replicate(
+        self,
+        workers: int | None = None,
+        steps: int = 1,
+        mutate_in: str = "both",
+        mutation_rate: float = 0.0,
+        ratio: int = 1,
+        backend: str = "auto",
+        negative_propensity: float = 1.0,
+        positive_decay: float = 0.0,
+        negative_decay: float = 0.0,
+        max_rnas: int | None = None,
+        mutation_spectrum: MutationSpectrum | None = None,
+    ) -> None:
+        """
+        Replicate each cell for a given number of steps. See Cells.replicate.
+
+        @param workers: Ignored. All cells are replicated together, in this process.
+        @param steps: The number of replication steps each cell should perform.
+        @param mutate_in: The type of RNA molecules to allow mutations in. If
+            'negative' or 'positive', mutations should only be allowed in those
+            molecules.
+        @param mutation_rate: The per-base mutation probability.
+        @param ratio: The number of +RNA molecules to make from a -RNA.
+        @param backend: Ignored.
+        @param negative_propensity: Must be one, because molecules are always
+            chosen uniformly.
+        @param positive_decay: Must be zero, because molecules cannot be
+            removed from the shared arrays.
+        @param negative_decay: Must be zero.
+        @param max_rnas: Must be None, because cells cannot be downsampled.
+        @param mutation_spectrum: Must be None, because the number of mutations
+            of all new molecules is drawn at once, from a uniform rate.
+        @raise ValueError: If 'negative_propensity' is not one, a decay rate
+            is not zero, or 'max_rnas' or 'mutation_spectrum' is given.
+        """
+        if negative_propensity != 1.0:
+            raise ValueError(
+                "ArrayCells can only choose molecules uniformly, so the (-) "
+                "molecule propensity must be one."
+            )
+        if positive_decay or negative_decay:
+            raise ValueError("The molecules of ArrayCells cannot degrade.")
+        if max_rnas is not None:
+            raise ValueError("ArrayCells cannot be downsampled.")
+        if mutation_spectrum is not None:
+            raise ValueError("ArrayCells cannot use a mutation spectrum.")
+
+        # The mutation rate when making a (+) or (-) molecule. A rate of more
+        # than one mutates every site.
+        mutation_rate = min(mutation_rate, 1.0)
+        positive_rate = 0.0 if mutate_in == "negative" else mutation_rate
+        negative_rate = 0.0 if mutate_in == "positive" else mutation_rate
+
+        for _ in range(steps):
+            self._step(positive_rate, negative_rate, ratio)
+
+    def record_trajectory(self, every: int, steps: int = 0, start: int = 0) -> None:
+        """
+        Trajectories cannot be recorded, because no running totals are kept.
+
+        @raise ValueError: Always.
+        """
+        raise ValueError("ArrayCells cannot record trajectories.")
+
+    def _step(self, positive_rate: float, negative_rate: float, ratio: int) -> None:
+        """
+        Choose one molecule in each cell and replicate it (once if it is a (+)
+        RNA or 'ratio' times, if it's (-) RNA).
+        """
+        rng = self.rng
+        cells = np.arange(self.n_cells)
+        choices = rng.integers(self.sizes)
+        parents = self.members[cells, choices]
+        parent_positive = self.positive[parents]
+        copies = np.where(parent_positive, 1, ratio)
+        # Each cell chooses a different molecule, so there are no repeated indices.
+        self.replications[parents] += copies
+
+        child_parents = np.repeat(parents, copies)
+        child_cells = np.repeat(cells, copies)
+        child_positive = ~self.positive[child_parents]
+        child_genome = self.genome[child_parents]
+        child_created = np.zeros(len(child_parents), dtype=bool)
+
+        if positive_rate > 0.0 or negative_rate > 0.0:
+            n_mutations = rng.binomial(
+                len(self.infecting_genome),
+                np.where(child_positive, positive_rate, negative_rate),
+            )
+            mutated = np.flatnonzero(n_mutations)
+            if len(mutated):
+                child_genome[mutated] = self._add_genomes(
+                    child_genome[mutated], child_positive[mutated], n_mutations[mutated]
+                )
+                child_created[mutated] = True
+
+        self._append(child_cells, child_positive, child_genome, child_created, copies)
+
+    def _add_genomes(
+        self, parents: np.ndarray, positive: np.ndarray, counts: np.ndarray
+    ) -> np.ndarray:
+        """
+        Add the genomes of some new molecules, each a copy of the genome of its
+        parent molecule with some mutations. The mutated sites of all the new
+        genomes are chosen at once (see sample_copy_offsets), and the base at
+        each is replaced by one of the other three bases (in the sense of the
+        new molecule), also all at once.
+
+        @param parents: The genome indices of the parent molecules.
+        @param positive: The sense of each new molecule.
+        @param counts: The (non-zero) number of mutations of each new genome.
+        @return: The indices of the new genomes.
+        """
+        rng = self.rng
+        reference = self.infecting_genome.bases
+        length = len(reference)
+        n = len(parents)
+        copies, offsets = sample_copy_offsets(length, counts, rng)
+        keys = copies * length + offsets
+
+        # The changes of the parent genomes, with keys made in the same way.
+        # These are sorted, like the keys of the new mutations, because the
+        # changes of each genome are sorted by offset.
+        starts = self.genome_start[parents]
+        sizes = self.genome_end[parents] - starts
+        inherited = _ranges(starts, sizes)
+        inherited_keys = (
+            np.repeat(np.arange(n), sizes) * length + self.change_offset[inherited]
+        )
+
+        # Find the parent's base at each mutated site, and the change (if any)
+        # that the mutation replaces.
+        position = np.searchsorted(inherited_keys, keys)
+        found = position < len(inherited_keys)
+        found[found] = inherited_keys[position[found]] == keys[found]
+        previous = np.full(len(keys), -1, dtype=np.int64)
+        previous[found] = inherited[position[found]]
+        parent_codes = reference[offsets]
+        parent_codes[found] = self.change_code[previous[found]]
+
+        # Replace the (new sense) base at each site with one of the other three.
+        sense = positive[copies]
+        old = np.where(sense, parent_codes, 3 - parent_codes)
+        new = (old + rng.integers(1, len(BASES), size=len(old))) % len(BASES)
+        codes = np.where(sense, new, 3 - new).astype(np.uint8)
+
+        # The changes of each new genome are those of its parent that are not
+        # replaced, merged (in offset order) with its new mutations.
+        genomes = self.n_genomes + np.arange(n)
+        kept = np.ones(len(inherited), dtype=bool)
+        kept[position[found]] = False
+        inherited = inherited[kept]
+        all_keys = np.concatenate((inherited_keys[kept], keys))
+        order = np.argsort(all_keys, kind="stable")
+
+        start, end = self.n_changes, self.n_changes + len(all_keys)
+        self.change_offset = grow(self.change_offset, end)
+        self.change_code = grow(self.change_code, end)
+        self.change_genome = grow(self.change_genome, end)
+        self.change_previous = grow(self.change_previous, end)
+        self.change_offset[start:end] = (all_keys % length)[order]
+        self.change_code[start:end] = np.concatenate(
+            (self.change_code[inherited], codes)
+        )[order]
+        self.change_genome[start:end] = np.concatenate(
+            (self.change_genome[inherited], genomes[copies])
+        )[order]
+        self.change_previous[start:end] = np.concatenate(
+            (self.change_previous[inherited], previous)
+        )[order]
+        self.n_changes = end
+
+        ends = start + np.cumsum(np.bincount(all_keys // length, minlength=n))
+        self.genome_start = grow(self.genome_start, genomes[-1] + 1)
+        self.genome_end = grow(self.genome_end, genomes[-1] + 1)
+        self.genome_positive = grow(self.genome_positive, genomes[-1] + 1)
+        self.genome_start[genomes] = np.concatenate(([start], ends[:-1]))
+        self.genome_end[genomes] = ends
+        self.genome_positive[genomes] = positive
+        self.n_genomes += n
+
+        return genomes
+
+    def _owners(self) -> np.ndarray:
+        """
+        Get the index of the genome that each change belongs to. The changes of
+        successive genomes are held one after the other.
+        """
+        n = self.n_genomes
+        return np.repeat(np.arange(n), self.genome_end[:n] - self.genome_start[:n])
+
+    def _mutations(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find all the mutations that were made, i.e., the new mutations of
+        every genome.
+
+        @return: A 4-tuple of arrays with the (+) offset of each mutation, the
+            sense of the molecule it was made in, and the base codes (in the
+            sense of that molecule) it changed from and to.
+        """
+        new = self.change_genome[: self.n_changes] == self._owners()
+        offsets = self.change_offset[: self.n_changes][new]
+        previous = self.change_previous[: self.n_changes][new]
+        to = self.change_code[: self.n_changes][new]
+        from_ = self.infecting_genome.bases[offsets]
+        replaced = previous >= 0
+        from_[replaced] = self.change_code[previous[replaced]]
+        positive = self.genome_positive[self.change_genome[: self.n_changes][new]]
+        return (
+            offsets,
+            positive,
+            np.where(positive, from_, 3 - from_),
+            np.where(positive, to, 3 - to),
+        )
+
+    def _molecule_counts(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Count the (+) and (-) molecules that have each genome.
+        """
+        genome = self.genome[: self.size]
+        positive = self.positive[: self.size]
+        return (
+            np.bincount(genome[positive], minlength=self.n_genomes),
+            np.bincount(genome[~positive], minlength=self.n_genomes),
+        )
+
+    def _append(
+        self,
+        cells: np.ndarray,
+        positive: np.ndarray,
+        genome: np.ndarray,
+        created: np.ndarray,
+        copies: np.ndarray,
+    ) -> None:
+        """
+        Add new molecules, which must be sorted by cell.
+
+        @param copies: The number of new molecules in each cell.
+        """
+        start, end = self.size, self.size + len(cells)
+        self.cell = grow(self.cell, end)
+        self.positive = grow(self.positive, end)
+        self.replications = grow(self.replications, end)
+        self.genome = grow(self.genome, end)
+        self.created = grow(self.created, end)
+        self.cell[start:end] = cells
+        self.positive[start:end] = positive
+        self.replications[start:end] = 0
+        self.genome[start:end] = genome
+        self.created[start:end] = created
+        self.size = end
+
+        # The offset of each new molecule among the new molecules of its cell.
+        rank = np.arange(len(cells)) - np.repeat(np.cumsum(copies) - copies, copies)
+        columns = self.sizes[cells] + rank
+        new_sizes = self.sizes + copies
+        if new_sizes.max() > self.members.shape[1]:
+            members = np.zeros(
+                (self.n_cells, max(new_sizes.max(), 2 * self.members.shape[1])),
+                dtype=np.int64,
+            )
+            members[:, : self.members.shape[1]] = self.members
+            self.members = members
+        self.members[cells, columns] = np.arange(start, end)
+        self.sizes = new_sizes
+
+    def cell_sizes(self) -> list[int]:
+        """
+        Get the number of RNA molecules in each cell.
+        """
+        return self.sizes.tolist()
+
+    def _sample(
+        self, allocation: list[int], seeds: list[np.random.SeedSequence]
+    ) -> tuple[Counter, Counter, np.ndarray]:
+        """
+        Sample RNA molecules and find their apparent changes. See
+        Cells.sample_apparent_mutation_counts.
+        """
+        molecules = []
+        for index, (n, seed) in enumerate(zip(allocation, seeds)):
+            choices = np.random.default_rng(seed).integers(self.sizes[index], size=n)
+            molecules.extend(self.members[index, choices].tolist())
+        return sequenced_counts(map(self._rna, molecules), self.infecting_genome)
+
+    def counts(self) -> Counts:
+        """
+        Add up the totals of all cells, from the molecule arrays and the genome
+        table (see rna_count, replication_count, mutation_counts and
+        apparent_mutation_counts).
+        """
+        counts = Counts()
+        counts.positive_rnas, counts.negative_rnas = self.rna_count()
+        counts.positive_replications, counts.negative_replications = (
+            self.replication_count()
+        )
+        counts.positive_mutations, counts.negative_mutations = self.mutation_counts()
+        counts.from_positive, counts.from_negative = self.apparent_mutation_counts()
+        return counts
+
+    @timed("Cells.mutation_counts")
+    def mutation_counts(self) -> tuple[Counter, Counter]:
+        """
+        Add up all mutations in all (+/-) RNA molecules in all cells.
+        """
+        positive_counts = Counter()
+        negative_counts = Counter()
+        _, positive, from_, to = self._mutations()
+
+        for mutations, sense in (
+            (positive_counts, positive),
+            (negative_counts, ~positive),
+        ):
+            pairs = np.bincount(from_[sense] * 4 + to[sense], minlength=16)
+            for pair in np.flatnonzero(pairs).tolist():
+                mutations[CHANGES[pair]] = int(pairs[pair])
+
+        return positive_counts, negative_counts
+
+    @timed("Cells.rna_count")
+    def rna_count(self) -> tuple[int, int]:
+        """
+        Get the number of all (+/-) RNA molecules in all cells.
+        """
+        positive = int(np.count_nonzero(self.positive[: self.size]))
+        return positive, self.size - positive
+
+    @timed("Cells.replication_count")
+    def replication_count(self) -> tuple[int, int]:
+        """
+        Get the number of (+/-) RNA molecule replications that occurred.
+        """
+        replications = self.replications[: self.size]
+        positive = self.positive[: self.size]
+        return int(replications[positive].sum()), int(replications[~positive].sum())
+
+    @timed("Cells.apparent_mutation_counts")
+    def apparent_mutation_counts(self) -> tuple[Counter, Counter]:
+        """
+        Get the apparent changes. I.e., what it looks like happened, based on sample
+        preparation, sequencing, alignment to the (+) RNA reference (infecting) genome.
+
+        The apparent changes of a genome do not depend on the sense of the molecule
+        it is in, so the changes of all genomes are read at once and weighted by
+        the number of (+) and (-) molecules that have each genome.
+        """
+        from_positive = Counter()
+        from_negative = Counter()
+        offsets = self.change_offset[: self.n_changes]
+        codes = self.change_code[: self.n_changes]
+        reference = self.infecting_genome.bases[offsets]
+        # A site may have been mutated back to the reference base.
+        different = reference != codes
+        pairs = reference[different] * 4 + codes[different]
+        owners = self._owners()[different]
+
+        for mutations, counts in zip(
+            (from_positive, from_negative), self._molecule_counts()
+        ):
+            # The weights of bincount are floats, which hold integer counts
+            # exactly.
+            totals = np.rint(
+                np.bincount(pairs, counts[owners], minlength=16)
+            ).astype(np.int64)
+            for pair in np.flatnonzero(totals).tolist():
+                mutations[CHANGES[pair]] = int(totals[pair])
+
+        return from_positive, from_negative
+
+    @timed("Cells.pileup")
+    def pileup(self) -> np.ndarray:
+        """
+        Count the A/C/G/T bases at each site of all RNA molecules in all cells.
+        See Cells.pileup.
+
+        The changes of all genomes in the genome table are read at once and
+        weighted by the number of (+) and (-) molecules that have each genome.
+        Each mutation was made in just one molecule, so the actual counts are
+        the new mutations of all genomes.
+        """
+        pileup = Pileup(self.infecting_genome)
+        positive = self.positive[: self.size]
+        pileup.depth[:] = np.count_nonzero(positive), np.count_nonzero(~positive)
+
+        offsets = self.change_offset[: self.n_changes]
+        codes = self.change_code[: self.n_changes]
+        # A site may have been mutated back to the reference base.
+        different = self.infecting_genome.bases[offsets] != codes
+        owners = self._owners()[different]
+        for strand, counts in enumerate(self._molecule_counts()):
+            pileup.add_differences(
+                strand, offsets[different], codes[different], counts[owners]
+            )
+
+        offsets, positive, _, to = self._mutations()
+        codes = np.where(positive, to, 3 - to)
+        for strand, sense in enumerate((positive, ~positive)):
+            pileup.add_bases("actual", strand, offsets[sense], codes[sense], 1)
+
+        return pileup.counts()
@@ -0,0 +1,385 @@
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from statistics import median
+from timeit import Timer
+from typing import Callable, Iterator
+
+import numpy as np
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.plot import plot_data
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.site import Site
+
+# The benchmark results format version. Increase this if the format changes.
+VERSION = 1
+
+GENOME_LENGTHS = (100, 1_000, 10_000, 30_000)
+QUICK_GENOME_LENGTHS = (100, 1_000)
+MUTATION_RATES = (0.0, 0.001, 0.01)
+RATIOS = (1, 10, 50)
+
+# The number of replication steps in the cell benchmarks.
+STEPS = 200
+
+# The number of cells in the ArrayCells benchmarks. Each step replicates one
+# molecule in each cell, so there are ARRAY_CELLS * STEPS replications.
+ARRAY_CELLS = 10_000
+
+# A benchmark case: a name, a dict of parameters, a setup function that
+# returns the (zero-argument) function to time, and whether that function
+# changes its state (e.g., by adding RNA molecules to a cell) so that a new one
+# must be set up for every timing.
+Case = tuple[str, dict, Callable[[], Callable[[], object]], bool]
+
+
+def _rng() -> np.random.Generator:
+    """
+    Make a random number generator with a fixed seed, so that every run of a
+    benchmark does the same work.
+    """
+    return np.random.default_rng(1)
+
+
+def _mutated(length: int, rate: float) -> tuple[RNA, Genome]:
+    """
+    Make a random infecting genome and a (+) RNA whose genome differs from it
+    by about '2 * length * rate' mutations.
+
+    @return: A 2-tuple with the RNA and the infecting genome.
+    """
+    rng = _rng()
+    genome = Genome(length=length, rng=rng)
+    return RNA(genome.replicate(rate, rng).replicate(rate, rng)), genome
+
+
+def _replicated_cells(length: int, n_cells: int = 4) -> Cells:
+    """
+    Make some cells with mutations in them.
+    """
+    cells = Cells(n_cells, Genome(length=length, rng=_rng()), seed=1)
+    cells.replicate(steps=STEPS, mutation_rate=0.001, ratio=10, backend="serial")
+    return cells
+
+
+def _worker_counts() -> list[int]:
+    """
+    Get the numbers of workers to benchmark: powers of two up to the number of
+    CPUs, and the number of CPUs.
+    """
+    cpus = os.cpu_count() or 1
+    return sorted(
+        {2**power for power in range(cpus.bit_length()) if 2**power <= cpus} | {cpus}
+    )
+
+
+def benchmark_cases(quick: bool = False) -> Iterator[Case]:
+    """
+    Make the benchmark cases.
+
+    @param quick: If True, only use short genomes (see QUICK_GENOME_LENGTHS).
+    """
+    lengths = QUICK_GENOME_LENGTHS if quick else GENOME_LENGTHS
+
+    for rate in MUTATION_RATES:
+
+        def setup(rate=rate):
+            site, rng = Site("A"), _rng()
+            return lambda: site.replicate(False, rate, rng)
+
+        yield "Site.replicate", {"mutation_rate": rate}, setup, False
+
+    for length in lengths:
+        yield (
+            "Genome.rc",
+            {"genome_length": length},
+            lambda length=length: Genome(length=length, rng=_rng()).rc,
+            False,
+        )
+        for rate in MUTATION_RATES:
+
+            def setup(length=length, rate=rate):
+                genome, rng = Genome(length=length, rng=_rng()), _rng()
+                return lambda: genome.replicate(rate, rng)
+
+            yield (
+                "Genome.replicate",
+                {"genome_length": length, "mutation_rate": rate},
+                setup,
+                False,
+            )
+
+            def setup(length=length, rate=rate):
+                rna, genome = _mutated(length, rate)
+                return lambda: rna.sequencing_mutation_counts(genome)
+
+            yield (
+                "RNA.sequencing_mutation_counts",
+                {"genome_length": length, "mutation_rate": rate},
+                setup,
+                False,
+            )
+
+            for ratio in RATIOS:
+
+                def setup(length=length, rate=rate, ratio=ratio):
+                    cell = Cell(Genome(length=length, rng=_rng()), rng=_rng())
+                    return lambda: cell.replicate_rnas(
+                        STEPS, mutation_rate=rate, ratio=ratio
+                    )
+
+                yield (
+                    "Cell.replicate_rnas",
+                    {
+                        "genome_length": length,
+                        "mutation_rate": rate,
+                        "ratio": ratio,
+                        "steps": STEPS,
+                    },
+                    setup,
+                    True,
+                )
+
+        for rate in MUTATION_RATES:
+
+            def setup(length=length, rate=rate):
+                cells = ArrayCells(
+                    ARRAY_CELLS, Genome(length=length, rng=_rng()), seed=1
+                )
+                return lambda: cells.replicate(steps=STEPS, mutation_rate=rate)
+
+            yield (
+                "ArrayCells.replicate",
+                {
+                    "genome_length": length,
+                    "mutation_rate": rate,
+                    "n_cells": ARRAY_CELLS,
+                    "steps": STEPS,
+                },
+                setup,
+                True,
+            )
+
+        # The same cells are replicated with each number of workers.
+        n_cells = max(4, os.cpu_count() or 1)
+        for workers in _worker_counts():
+
+            def setup(length=length, workers=workers):
+                cells = Cells(n_cells, Genome(length=length, rng=_rng()), seed=1)
+                return lambda: cells.replicate(
+                    workers=workers,
+                    steps=STEPS,
+                    mutation_rate=0.001,
+                    ratio=1,
+                    backend="serial" if workers == 1 else "processes",
+                )
+
+            yield (
+                "Cells.replicate",
+                {
+                    "genome_length": length,
+                    "n_cells": n_cells,
+                    "workers": workers,
+                    "steps": STEPS,
+                },
+                setup,
+                True,
+            )
+
+        yield (
+            "Cells.summary",
+            {"genome_length": length},
+            lambda length=length: _replicated_cells(length).summary,
+            False,
+        )
+
+        def setup(length=length):
+            cells = _replicated_cells(length)
+            return lambda: plot_data(cells)
+
+        yield "plot_data", {"genome_length": length}, setup, False
+
+
+def case_key(name: str, params: dict) -> str:
+    """
+    Make a key for a benchmark case, e.g., 'Genome.rc[genome_length=100]'.
+    """
+    return (
+        name + "[" + ",".join(f"{key}={value}" for key, value in params.items()) + "]"
+    )
+
+
+def time_case(
+    setup: Callable[[], Callable[[], object]],
+    stateful: bool,
+    repeat: int = 5,
+    min_seconds: float = 0.2,
+) -> tuple[list[float], int]:
+    """
+    Time a benchmark case.
+
+    @param setup: A function that returns the function to time.
+    @param stateful: If True, a new function is set up (untimed) for each timing,
+        and it is called just once. Otherwise, the function is called enough
+        times for each timing to take at least 'min_seconds'.
+    @param repeat: The number of timings.
+    @param min_seconds: The minimum duration of each timing of a function that
+        is not stateful.
+    @return: A 2-tuple with a list of the 'repeat' per-call times (in seconds) and
+        the number of calls made for each.
+    """
+    if stateful:
+        times = []
+        for _ in range(repeat):
+            function = setup()
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return times, 1
+
+    timer = Timer(setup())
+    number = 1
+    while (elapsed := timer.timeit(number)) < min_seconds:
+        number *= max(2, min(10, int(min_seconds / max(elapsed, 1e-9)) + 1))
+    times = [elapsed / number] + [
+        timer.timeit(number) / number for _ in range(repeat - 1)
+    ]
+    return times, number
+
+
+def run_benchmarks(
+    quick: bool = False,
+    match: str | None = None,
+    repeat: int = 5,
+    min_seconds: float = 0.2,
+    progress: Callable[[str, float], None] | None = None,
+) -> dict:
+    """
+    Run the benchmarks.
+
+    @param quick: If True, only use short genomes.
+    @param match: If not None, only run cases whose key contains this string.
+    @param repeat: The number of timings of each case.
+    @param min_seconds: See time_case.
+    @param progress: A function to call with the key and best time of each case
+        once it has been run.
+    @return: A JSON serializable dict with information about this machine and a
+        'results' dict mapping case keys to their results.
+    """
+    results = {}
+
+    for name, params, setup, stateful in benchmark_cases(quick):
+        key = case_key(name, params)
+        if match is not None and match not in key:
+            continue
+        times, number = time_case(setup, stateful, repeat, min_seconds)
+        results[key] = {
+            "name": name,
+            "params": params,
+            "best": min(times),
+            "median": median(times),
+            "repeat": repeat,
+            "number": number,
+        }
+        if progress:
+            progress(key, min(times))
+
+    return {
+        "version": VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine(),
+        "results": results,
+    }
+
+
+def machine() -> dict:
+    """
+    Describe this machine and Python, so results from different machines can be
+    told apart.
+    """
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = 0.2
+) -> list[tuple[str, float, float, str]]:
+    """
+    Compare benchmark results to a baseline.
+
+    @param baseline: Results from run_benchmarks (e.g., as loaded from JSON).
+    @param current: Results from run_benchmarks.
+    @param threshold: The fractional change in best time above which a case is
+        considered to have got slower (or below which, faster).
+    @return: A list of (key, baseline best, current best, status) 4-tuples for
+        the cases in both, where status is 'slower', 'faster' or 'same'.
+    """
+    comparison = []
+    for key, result in current["results"].items():
+        if key in baseline["results"]:
+            before, after = baseline["results"][key]["best"], result["best"]
+            if after > before * (1.0 + threshold):
+                status = "slower"
+            elif after < before * (1.0 - threshold):
+                status = "faster"
+            else:
+                status = "same"
+            comparison.append((key, before, after, status))
+    return comparison
+
+
+def format_comparison(
+    baseline: dict, current: dict, comparison: list[tuple[str, float, float, str]]
+) -> str:
+    """
+    Make a printable table of a comparison made by 'compare'.
+    """
+    result = []
+    if baseline["machine"] != current["machine"]:
+        result.append(
+            "Warning: the baseline was made on a different machine or Python:\n"
+            f"  baseline: {baseline['machine']}\n"
+            f"  current:  {current['machine']}"
+        )
+
+    width = max((len(key) for key, *_ in comparison), default=0)
+    for key, before, after, status in comparison:
+        flag = "  REGRESSION" if status == "slower" else ""
+        result.append(
+            f"{key:{width}}  {before:10.3g}s  {after:10.3g}s  "
+            f"{after / before:6.2f}x{flag}"
+        )
+
+    slower = sum(status == "slower" for *_, status in comparison)
+    faster = sum(status == "faster" for *_, status in comparison)
+    result.append(
+        f"{len(comparison)} cases compared: {slower} slower, {faster} faster."
+    )
+    return "\n".join(result)
+
+
+def load(filename: str) -> dict:
+    """
+    Load benchmark results saved as JSON.
+
+    @raise ValueError: If the file has an unknown results format version.
+    """
+    with open(filename) as fp:
+        results = json.load(fp)
+    if results.get("version") != VERSION:
+        raise ValueError(
+            f"Benchmark results file {filename!r} has version "
+            f"{results.get('version')}, but only version {VERSION} can be read."
+        )
+    return results
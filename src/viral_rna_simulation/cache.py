@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.checkpoint import load_checkpoint, save_checkpoint
+from viral_rna_simulation.counts import TOTALS, Counts
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.trajectory import Trajectory
+
+# The cache entry format version. Increase this if the format changes.
+VERSION = 1
+
+# The default maximum total size of the files in a cache directory.
+DEFAULT_MAX_BYTES = 1024**3
+
+# The names of the files of an entry are the entry key followed by these.
+RESULTS_SUFFIX = ".npz"
+POPULATION_SUFFIX = "-population.npz"
+
+
+def default_directory() -> str:
+    """
+    Get the default cache directory, in $XDG_CACHE_HOME (or ~/.cache).
+    """
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "viral-rna-simulation",
+    )
+
+
+def package_version() -> str:
+    """
+    Get the version of this package, or 'unknown' if it is not installed.
+    """
+    try:
+        return version("viral-rna-simulation")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def cache_key(parameters: dict) -> str:
+    """
+    Make a cache key for a simulation.
+
+    @param parameters: A JSON serializable dict of everything that determines
+        the result of the simulation (e.g., the simulate.run arguments,
+        including the seed, but not those that only change how it is run).
+    @return: A hex SHA-256 digest of the parameters, the package version and
+        the cache format version.
+    """
+    key = json.dumps(
+        {
+            "parameters": parameters,
+            "package": package_version(),
+            "version": VERSION,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedCells(Cells):
+    """
+    The results of a simulation read from a cache without its RNA molecules.
+    Only the aggregate counts (and any trajectory) are available, so anything
+    that needs the molecules (e.g., a pileup or sampling) raises a ValueError.
+
+    @param n_cells: The number of cells.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @param counts: The running totals of all cells.
+    @param trajectory: The recorded trajectory, if any.
+    """
+
+    def __init__(
+        self,
+        n_cells: int,
+        infecting_genome: Genome,
+        counts: Counts,
+        trajectory: Trajectory | None = None,
+    ) -> None:
+        self.n_cells = n_cells
+        self.infecting_genome = infecting_genome
+        self.check = False
+        self._counts = counts
+        self.trajectory = trajectory
+
+    def __len__(self) -> int:
+        return self.n_cells
+
+    @property
+    def cells(self) -> list[Cell]:
+        """
+        The cells are not available.
+
+        @raise ValueError: Always.
+        """
+        raise ValueError("The RNA molecules of cached results are not available.")
+
+    def counts(self) -> Counts:
+        """
+        Get the cached totals of all cells.
+        """
+        return self._counts
+
+
+class ResultCache:
+    """
+    A directory of simulation results, keyed by cache_key.
+
+    Each entry holds the aggregate counts, the infecting genome and any
+    trajectory of a simulation and, optionally, its complete population of RNA
+    molecules (as a checkpoint, see save_checkpoint). Reading an entry marks
+    it as recently used. When the total size of the files in the directory is
+    more than 'max_bytes', the least recently used entries are removed.
+
+    @param directory: The cache directory. It is made if it does not exist.
+    @param max_bytes: The maximum total size of the cache files.
+    """
+
+    def __init__(
+        self, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.directory = default_directory() if directory is None else directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def get(
+        self,
+        key: str,
+        population: bool = False,
+        check: bool = False,
+        rna_directory: str | None = None,
+    ) -> Cells | None:
+        """
+        Get cached results.
+
+        @param key: The cache key.
+        @param population: If True, the RNA molecules are needed, so only an
+            entry with its population counts as a hit.
+        @param check: Passed to load_checkpoint.
+        @param rna_directory: Passed to load_checkpoint.
+        @return: None if there is no (suitable) entry. Otherwise, a Cells
+            instance with the cached population if 'population' is True, or
+            else a CachedCells instance.
+        """
+        results = self._path(key, RESULTS_SUFFIX)
+        populated = self._path(key, POPULATION_SUFFIX)
+        if not os.path.exists(results) or (
+            population and not os.path.exists(populated)
+        ):
+            return None
+
+        with np.load(results) as data:
+            metadata = json.loads(data["metadata"].item())
+            infecting_genome = Genome(data["infecting_genome"])
+            trajectory_totals = data["trajectory"] if metadata["trajectory"] else None
+
+        trajectory = None
+        if trajectory_totals is not None:
+            every, first, step = metadata["trajectory"]
+            trajectory = Trajectory(metadata["n_cells"], every)
+            trajectory.first, trajectory.step = first, step
+            trajectory.totals = trajectory_totals
+            trajectory.recorded = len(trajectory_totals)
+
+        if population:
+            cells, _, _ = load_checkpoint(
+                populated, check=check, rna_directory=rna_directory
+            )
+            cells.trajectory = trajectory
+            os.utime(populated)
+        else:
+            counts = Counts()
+            for name, value in metadata["counts"].items():
+                if isinstance(value, dict):
+                    value = Counter(value)
+                setattr(counts, name, value)
+            cells = CachedCells(
+                metadata["n_cells"], infecting_genome, counts, trajectory
+            )
+
+        os.utime(results)
+        return cells
+
+    def put(self, key: str, cells: Cells, population: bool = False) -> None:
+        """
+        Store the results of a simulation, and remove old entries if the cache
+        is too big.
+
+        @param key: The cache key.
+        @param cells: The simulated cells.
+        @param population: If True, also store the RNA molecules. Only plain
+            Cells instances (i.e., those of the 'cells' engine) can be stored.
+        @raise ValueError: If 'population' is True and the cells cannot be
+            stored.
+        """
+        if population and type(cells) is not Cells:
+            raise ValueError(
+                f"The RNA molecules of {type(cells).__name__} cannot be cached."
+            )
+
+        # The totals are found with the methods that all kinds of cells have
+        # (e.g., ResidentCells would otherwise have to fetch all its cells).
+        trajectory = cells.trajectory
+        metadata = {
+            "version": VERSION,
+            "n_cells": len(cells),
+            "counts": dict(
+                zip(
+                    TOTALS,
+                    (
+                        *cells.rna_count(),
+                        *cells.replication_count(),
+                        *cells.mutation_counts(),
+                        *cells.apparent_mutation_counts(),
+                    ),
+                )
+            ),
+            "trajectory": (
+                None
+                if trajectory is None
+                else [trajectory.every, trajectory.first, trajectory.step]
+            ),
+        }
+        arrays = {
+            "metadata": np.array(json.dumps(metadata)),
+            "infecting_genome": cells.infecting_genome.bases,
+        }
+        if trajectory is not None:
+            arrays["trajectory"] = trajectory.totals[: len(trajectory)]
+
+        if population:
+            save_checkpoint(cells, self._path(key, POPULATION_SUFFIX))
+
+        # Write under a temporary name and then rename, so a half-written entry
+        # is never read.
+        results = self._path(key, RESULTS_SUFFIX)
+        temporary = f"{results}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, **arrays)
+        os.replace(temporary, results)
+
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, list[str]]]:
+        """
+        Find the entries in the cache.
+
+        @return: A list of (last use time, total size, filenames) tuples, one
+            for each entry, least recently used first.
+        """
+        entries = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(POPULATION_SUFFIX):
+                key = entry.name[: -len(POPULATION_SUFFIX)]
+            elif entry.name.endswith(RESULTS_SUFFIX) and ".tmp" not in entry.name:
+                key = entry.name[: -len(RESULTS_SUFFIX)]
+            else:
+                continue
+            stat = entry.stat()
+            used, size, filenames = entries.get(key, (0.0, 0, []))
+            entries[key] = (
+                max(used, stat.st_mtime),
+                size + stat.st_size,
+                filenames + [entry.path],
+            )
+        return sorted(entries.values())
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache is no bigger
+        than self.max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, filenames in entries:
+            if total <= self.max_bytes:
+                break
+            for filename in filenames:
+                try:
+                    os.unlink(filename)
+                except FileNotFoundError:
+                    # Another process removed it.
+                    pass
+            total -= size
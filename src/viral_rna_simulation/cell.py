@@ -1,15 +1,85 @@
-from random import choice
-from typing import Iterator
+from collections import Counter
+from typing import Callable, Iterator, Sequence
 
-from viral_rna_simulation.genome import Genome
+import numpy as np
+
+from viral_rna_simulation.counts import TOTALS, Counts
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.haplotypes import Haplotypes
 from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.rna_store import RNAStore
+from viral_rna_simulation.selection import Selection
+from viral_rna_simulation.spectrum import MutationSpectrum
 
 
 class Cell:
-    def __init__(self, infecting_genome: Genome) -> None:
+    """
+    Hold a collection of RNA molecules, initially just one copy of the infecting
+    genome.
+
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @param delta: If True, the RNA genomes in the cell will only store their
+        differences from the infecting genome (see DeltaGenome).
+    @param haplotypes: If True, identical RNA molecules will be stored just once,
+        along with their number (see Haplotypes).
+    @param rng: The random number generator for all random choices made in this
+        cell. If None, a generator seeded from fresh OS entropy is made.
+    @param directory: If not None, the RNA molecules in the cell will be stored
+        in memory-mapped files in this directory (see RNAStore). This cannot be
+        combined with 'delta' or 'haplotypes'.
+    @raise ValueError: If 'directory' is combined with 'delta' or 'haplotypes'.
+    @ivar counts: A Counts instance with the running totals for the cell.
+    @ivar snapshots: None, or an array with the totals recorded during the last
+        call to replicate_rnas (see its 'record_every' argument).
+    @ivar selection: None if molecules are chosen for replication uniformly,
+        or else a Selection with the weight of each molecule (or, for
+        haplotypes, each distinct RNA). See set_negative_propensity.
+    @ivar degraded_replications: A list with the replications of the (+) and
+        (-) molecules that have degraded (or been removed by downsampling).
+        Replications are counted when they happen, so they stay in the running
+        totals, and a recount adds these.
+    @ivar scale: The number of molecules that each molecule in the cell stands
+        for, because the cell has been downsampled (see downsample). This is
+        one if it never has been.
+    @ivar senses: None until molecules first degrade, and then an index of the
+        molecules of each sense (see index_senses).
+    """
+
+    def __init__(
+        self,
+        infecting_genome: Genome,
+        delta: bool = False,
+        haplotypes: bool = False,
+        rng: np.random.Generator | None = None,
+        directory: str | None = None,
+    ) -> None:
         assert infecting_genome.positive
         self.infecting_genome = infecting_genome
-        self.rnas = [RNA(infecting_genome)]
+        self.rng = np.random.default_rng() if rng is None else rng
+        rna = RNA(DeltaGenome(infecting_genome) if delta else infecting_genome)
+        self.rnas: list[RNA] | Haplotypes | RNAStore
+        if directory is not None:
+            if delta or haplotypes:
+                raise ValueError(
+                    "RNA molecules stored on disk cannot also be stored as delta "
+                    "genomes or haplotypes."
+                )
+            self.rnas = RNAStore(directory, len(infecting_genome), [rna])
+        elif haplotypes:
+            self.rnas = Haplotypes([rna])
+        else:
+            self.rnas = [rna]
+        self.counts = Counts()
+        self.counts.add_rna(rna, infecting_genome)
+        self.snapshots: np.ndarray | None = None
+        self.negative_propensity = 1.0
+        self.selection: Selection | None = None
+        self.degraded_replications = [0, 0]
+        self.scale = 1.0
+        self.senses: (
+            tuple[list[int], list[int]] | tuple[Selection, Selection] | None
+        ) = None
+        self._slots: list[int] = []
 
     def __iter__(self) -> Iterator[RNA]:
         return iter(self.rnas)
@@ -24,33 +94,448 @@ class Cell:
 
         return "\n".join(result)
 
+    def rna_counts(self) -> Iterator[tuple[RNA, int]]:
+        """
+        Get each distinct RNA in this cell, together with the number of molecules
+        it stands for. Unless the cell stores haplotypes, each count is one.
+        """
+        if isinstance(self.rnas, Haplotypes):
+            return self.rnas.items()
+        return ((rna, 1) for rna in self.rnas)
+
+    def recount(self) -> Counts:
+        """
+        Find the totals for this cell by looking at every RNA molecule in it. This
+        is slow, and only intended for checking the running totals in
+        self.counts.
+        """
+        counts = Counts()
+        for rna, count in self.rna_counts():
+            counts.add_rna(rna, self.infecting_genome, count)
+        counts.positive_replications += self.degraded_replications[0]
+        counts.negative_replications += self.degraded_replications[1]
+        return counts
+
+    def estimated_counts(self) -> Counts:
+        """
+        Estimate the totals of the whole population of the cell, as though it
+        had never been downsampled, by scaling up the molecule and mutation
+        totals of its molecules (see downsample). The replication totals are
+        those of all replications, so are not scaled.
+
+        @return: The running totals if the cell has never been downsampled, or
+            else a new Counts instance with the estimated (rounded) totals.
+        """
+        scale = self.scale
+        if scale == 1.0:
+            return self.counts
+
+        counts = self.counts
+        estimated = Counts()
+        estimated.positive_rnas = round(counts.positive_rnas * scale)
+        estimated.negative_rnas = round(counts.negative_rnas * scale)
+        estimated.positive_replications = counts.positive_replications
+        estimated.negative_replications = counts.negative_replications
+        for name in (
+            "positive_mutations",
+            "negative_mutations",
+            "from_positive",
+            "from_negative",
+        ):
+            setattr(
+                estimated,
+                name,
+                Counter({
+                    change: round(count * scale)
+                    for change, count in getattr(counts, name).items()
+                }),
+            )
+        return estimated
+
+    def set_negative_propensity(self, negative_propensity: float) -> None:
+        """
+        Set how likely a (-) molecule is to be chosen for replication, relative
+        to a (+) molecule.
+
+        If the propensity is not one, the molecules are weighted in
+        self.selection (by the propensity of their strand times, for
+        haplotypes, their number), so choosing one and adding new molecules
+        both take O(log n) time.
+
+        @param negative_propensity: The propensity of (-) molecules to be
+            chosen. That of (+) molecules is one.
+        @raise ValueError: If the propensity is not positive.
+        """
+        if negative_propensity <= 0.0:
+            raise ValueError(
+                f"The (-) molecule propensity ({negative_propensity}) must be "
+                "positive."
+            )
+        self.negative_propensity = negative_propensity
+        if negative_propensity == 1.0:
+            self.selection = None
+        else:
+            self.selection = Selection(
+                count * (1.0 if rna.positive else negative_propensity)
+                for rna, count in self.rna_counts()
+            )
+
+    def _extend(self, rnas: list[RNA]) -> None:
+        """
+        Add new RNA molecules, all of the same sense, to the cell, keeping the
+        weights in self.selection (if any) up to date.
+        """
+        selection = self.selection
+        senses = self.senses
+        if selection is None and senses is None:
+            self.rnas.extend(rnas)
+            return
+
+        positive = rnas[0].positive
+        weight = 1.0 if positive else self.negative_propensity
+        if isinstance(self.rnas, Haplotypes):
+            for rna in rnas:
+                index = self.rnas.append(rna)
+                count = self.rnas.counts[index]
+                # A count of one means a new distinct RNA was added.
+                if selection is not None:
+                    if count == 1:
+                        selection.append(weight)
+                    else:
+                        selection.update(index, count * weight)
+                if senses is not None:
+                    if count == 1:
+                        senses[0].append(1 if positive else 0)
+                        senses[1].append(0 if positive else 1)
+                    else:
+                        senses[not positive].update(index, count)
+        else:
+            start = len(self.rnas)
+            self.rnas.extend(rnas)
+            if selection is not None:
+                for _ in rnas:
+                    selection.append(weight)
+            if senses is not None:
+                sense = senses[not positive]
+                self._slots.extend(range(len(sense), len(sense) + len(rnas)))
+                sense.extend(range(start, start + len(rnas)))
+
+    def index_senses(self, order: Sequence[int] | None = None) -> None:
+        """
+        Index the molecules of each sense in self.senses, so that degrade can
+        choose a molecule of a given sense uniformly, without trying molecules
+        of the other sense.
+
+        For haplotypes, each sense has a Selection with the number of molecules
+        of each distinct RNA (zero for those of the other sense), so choosing
+        takes O(log n) time. Otherwise, each sense has a list of the offsets of
+        its molecules, and self._slots has the place of each molecule in the
+        list of its sense, so choosing and removing take O(1) time. Removals
+        change the order of the lists, which decides which molecules are
+        chosen, so it is saved in checkpoints.
+
+        @param order: For a cell that does not store haplotypes, the offsets in
+            the list of (+) molecules and then in that of (-) molecules (as
+            saved in a checkpoint). If None, the offsets are put in the lists
+            in increasing order.
+        """
+        rnas = self.rnas
+        if isinstance(rnas, Haplotypes):
+            items = list(rnas.items())
+            self.senses = (
+                Selection(count if rna.positive else 0 for rna, count in items),
+                Selection(0 if rna.positive else count for rna, count in items),
+            )
+            return
+
+        if order is None:
+            senses = ([], [])
+            for offset, rna in enumerate(rnas):
+                senses[not rna.positive].append(offset)
+        else:
+            order = list(order)
+            n = self.counts.positive_rnas
+            senses = (order[:n], order[n:])
+
+        slots = [0] * len(rnas)
+        for sense in senses:
+            for slot, offset in enumerate(sense):
+                slots[offset] = slot
+        self.senses = senses
+        self._slots = slots
+
+    def degrade(self, positive_decay: float, negative_decay: float) -> None:
+        """
+        Remove each (+) and (-) molecule with a given probability, as though it
+        had degraded.
+
+        The number of molecules of each sense to remove is drawn from a
+        binomial distribution, and then that many distinct molecules of that
+        sense are chosen uniformly, from an index of the molecules of each
+        sense (see index_senses). Each is chosen and removed in O(1) time
+        (O(log n) with haplotypes or a weighted selection), and the running
+        totals are updated.
+
+        @param positive_decay: The probability that a (+) molecule degrades.
+        @param negative_decay: The probability that a (-) molecule degrades.
+        @raise ValueError: If the molecules are stored on disk (see RNAStore),
+            which only allows molecules to be added.
+        """
+        if isinstance(self.rnas, RNAStore):
+            raise ValueError("RNA molecules stored on disk cannot degrade.")
+
+        if self.senses is None:
+            self.index_senses()
+
+        rng = self.rng
+        haplotypes = isinstance(self.rnas, Haplotypes)
+        for positive, decay, n in (
+            (True, positive_decay, self.counts.positive_rnas),
+            (False, negative_decay, self.counts.negative_rnas),
+        ):
+            if not (decay and n):
+                continue
+            sense = self.senses[not positive]
+            for _ in range(int(rng.binomial(n, decay))):
+                if haplotypes:
+                    self._remove_haplotype(sense.sample(rng))
+                else:
+                    self._remove(sense[int(rng.integers(len(sense)))])
+
+    def downsample(self, size: int) -> None:
+        """
+        Remove molecules, chosen uniformly at random, until the cell has a given
+        number left, and increase self.scale to match, so the totals of the
+        whole population can still be estimated (see estimated_counts). With
+        haplotypes, molecules (not distinct RNAs) are chosen uniformly, so each
+        distinct RNA loses molecules in proportion to its number.
+
+        The molecules left are then a uniform sample of the population, so
+        choosing one of them to replicate is the same as choosing one from the
+        whole population. Each replication step is still one replication (in
+        the population), but only some of its new molecules (each with
+        probability 1 / self.scale) are kept (see replicate_rnas), so the
+        sample stays uniform.
+
+        Molecules are removed as in degrade, but chosen regardless of their
+        sense, so each removal takes O(1) time (O(log n) with haplotypes or a
+        weighted selection).
+
+        @param size: The number of molecules to keep.
+        @raise ValueError: If the molecules are stored on disk (see RNAStore),
+            or 'size' is less than one.
+        """
+        if isinstance(self.rnas, RNAStore):
+            raise ValueError("RNA molecules stored on disk cannot be downsampled.")
+        if size < 1:
+            raise ValueError(f"Cannot downsample a cell to {size} molecules.")
+
+        n = len(self.rnas)
+        if size >= n:
+            return
+
+        self.scale *= n / size
+
+        rng = self.rng
+        for _ in range(n - size):
+            self._remove(int(rng.integers(len(self.rnas))))
+
+    def _remove(self, offset: int) -> None:
+        """
+        Remove a molecule from the cell, keeping the running totals and the
+        weights in self.selection and the index in self.senses (if any) up to
+        date. The last molecule is moved into the place of a removed one.
+
+        @param offset: The offset of the molecule (as in indexing self.rnas).
+        """
+        rnas = self.rnas
+        if isinstance(rnas, Haplotypes):
+            self._remove_haplotype(rnas.find(offset))
+            return
+
+        rna = rnas[offset]
+        self.counts.remove_rna(rna, self.infecting_genome)
+        self.degraded_replications[not rna.positive] += rna.replications
+        last = rnas.pop()
+        if offset < len(rnas):
+            rnas[offset] = last
+        if self.selection is not None:
+            self.selection.swap_remove(offset)
+
+        if self.senses is not None:
+            # Take the offset out of the list of its sense (by moving the last
+            # offset in that list into its place), and then give the molecule
+            # that was moved in self.rnas its new offset.
+            slots = self._slots
+            sense = self.senses[not rna.positive]
+            moved = sense.pop()
+            if moved != offset:
+                sense[slots[offset]] = moved
+                slots[moved] = slots[offset]
+            slot = slots.pop()
+            if offset < len(rnas):
+                self.senses[not last.positive][slot] = offset
+                slots[offset] = slot
+
+    def _remove_haplotype(self, index: int) -> None:
+        """
+        Remove a molecule of a distinct RNA from a cell that stores haplotypes,
+        keeping the running totals, the weights in self.selection and the
+        index in self.senses (if any) up to date. If it was the last molecule
+        of the RNA, the last distinct RNA is moved into its place.
+
+        @param index: The index (in self.rnas.rnas) of the distinct RNA.
+        """
+        rnas = self.rnas
+        selection = self.selection
+        senses = self.senses
+        rna = rnas.rnas[index]
+        self.counts.remove_rna(rna, self.infecting_genome)
+        if rnas.remove(index):
+            self.degraded_replications[not rna.positive] += rna.replications
+            if selection is not None:
+                selection.swap_remove(index)
+            if senses is not None:
+                for sense in senses:
+                    sense.swap_remove(index)
+        else:
+            count = rnas.counts[index]
+            if selection is not None:
+                weight = 1.0 if rna.positive else self.negative_propensity
+                selection.update(index, count * weight)
+            if senses is not None:
+                senses[not rna.positive].update(index, count)
+
+    def sample_rnas(self, n: int, rng: np.random.Generator) -> list[RNA]:
+        """
+        Choose RNA molecules from this cell at random, with replacement. If the
+        cell stores haplotypes, each distinct RNA is chosen with probability
+        proportional to its number of molecules.
+
+        @param n: The number of molecules to choose.
+        @param rng: The random number generator to use. The cell's own generator
+            is not used, so sampling does not change the rest of a simulation.
+        """
+        return [
+            self.rnas[index] for index in rng.integers(len(self.rnas), size=n).tolist()
+        ]
+
     def replicate_rnas(
         self,
         steps: int,
         mutate_in: str = "both",
         mutation_rate: float = 0.0,
         ratio: int = 1,
-        chooser=choice,
+        chooser: Callable[[Sequence[RNA]], RNA] | None = None,
+        record_every: int | None = None,
+        start: int = 0,
+        negative_propensity: float = 1.0,
+        positive_decay: float = 0.0,
+        negative_decay: float = 0.0,
+        max_rnas: int | None = None,
+        mutation_spectrum: MutationSpectrum | None = None,
     ) -> None:
         """
         Repeatedly ('steps' times) choose an RNA molecule at random from this cell,
         replicate it (once if it is a (+) RNA or 'ratio' times, if it's (-) RNA)
         according to the given mutation rate, and add the result to the list of RNAs
         in this cell. Note that replicating the RNA genome results in the reverse
-        complement sequence being synthesized.
+        complement sequence being synthesized. If a decay rate is given, some
+        molecules then degrade at the end of each step, and if the cell has a
+        carrying capacity ('max_rnas'), it is downsampled when it reaches it.
 
         @param chooser: A function that works like 'random.choice', to be used to choose
             the RNA molecule to replicate at each repetition. This is just used for
-            testing, to allow for control over what would otherwise be random.
-        """
-        for _ in range(steps):
-            rna = chooser(self.rnas)
-            if rna.positive:
-                # Our chosen molecule is positive, so we're about to make a
-                # (-) RNA. If we are only mutating positive strands, we must
-                # set the mutation rate to zero.
-                rate = 0.0 if mutate_in == "positive" else mutation_rate
-                self.rnas.append(rna.replicate(rate))
-            else:
-                rate = 0.0 if mutate_in == "negative" else mutation_rate
-                self.rnas.extend(rna.replicate(rate) for _ in range(ratio))
+            testing, to allow for control over what would otherwise be random. If
+            None, an RNA is chosen at random (uniformly, unless
+            'negative_propensity' is not one) using the cell's random number
+            generator.
+        @param record_every: If not None, record the running totals of the cell
+            (see Counts.totals) after every step whose number (counting from
+            one, and including the 'start' steps) is a multiple of this. They
+            are put into a preallocated array, with a row for each recorded
+            step, in self.snapshots.
+        @param start: The number of replication steps already done by the cell.
+        @param negative_propensity: How likely a (-) molecule is to be chosen,
+            relative to a (+) molecule (see set_negative_propensity).
+        @param positive_decay: The probability that each (+) molecule degrades
+            at the end of each step (see degrade).
+        @param negative_decay: The probability that each (-) molecule degrades
+            at the end of each step.
+        @param max_rnas: If not None, the carrying capacity of the cell. When a
+            step leaves the cell with this many molecules, it is downsampled to
+            half as many (see downsample), and only some of the new molecules
+            are kept after that. The recorded totals are then estimates for the
+            whole population (see estimated_counts).
+        @param mutation_spectrum: If not None, the context-dependent mutation
+            rates and substitutions to use instead of 'mutation_rate' (see
+            MutationSpectrum).
+        @raise ValueError: If 'max_rnas' is less than two, so the cell would be
+            downsampled to no molecules.
+        """
+        if max_rnas is not None and max_rnas < 2:
+            raise ValueError(
+                f"The carrying capacity must be at least 2 (not {max_rnas})."
+            )
+        rng = self.rng
+        if mutation_spectrum is not None:
+            # The index is shared by all the cells with this infecting genome.
+            mutation_rate = mutation_spectrum.index(self.infecting_genome.bases)
+        if negative_propensity != self.negative_propensity:
+            self.set_negative_propensity(negative_propensity)
+        selection = self.selection
+
+        if record_every:
+            self.snapshots = np.empty(
+                ((start + steps) // record_every - start // record_every, len(TOTALS)),
+                dtype=np.int64,
+            )
+            recorded = 0
+        else:
+            self.snapshots = None
+
+        for step in range(start + 1, start + steps + 1):
+            # A cell whose molecules have all degraded has nothing to replicate.
+            if len(self.rnas):
+                if chooser is not None:
+                    rna = chooser(self.rnas)
+                elif selection is None:
+                    rna = self.rnas[int(rng.integers(len(self.rnas)))]
+                elif isinstance(self.rnas, Haplotypes):
+                    rna = self.rnas.rnas[selection.sample(rng)]
+                else:
+                    rna = self.rnas[selection.sample(rng)]
+
+                if rna.positive:
+                    # Our chosen molecule is positive, so we're about to make a
+                    # (-) RNA. If we are only mutating positive strands, we must
+                    # set the mutation rate to zero.
+                    rate = 0.0 if mutate_in == "positive" else mutation_rate
+                    copies = 1
+                else:
+                    rate = 0.0 if mutate_in == "negative" else mutation_rate
+                    copies = ratio
+
+                # A downsampled cell only keeps some of the new molecules (see
+                # downsample), but all of the replications happened.
+                if self.scale == 1.0:
+                    kept = copies
+                else:
+                    kept = int(rng.binomial(copies, 1.0 / self.scale))
+                self.counts.add_replications(rna.positive, copies)
+                if kept:
+                    new_rnas = rna.replicate(rate, rng, kept)
+                    self.counts.add_copies(rna, new_rnas, self.infecting_genome)
+                    self._extend(new_rnas)
+                if kept < copies:
+                    rna.replications += copies - kept
+
+            if positive_decay or negative_decay:
+                self.degrade(positive_decay, negative_decay)
+
+            if max_rnas and len(self.rnas) >= max_rnas:
+                self.downsample(max_rnas // 2)
+
+            if record_every and step % record_every == 0:
+                self.snapshots[recorded] = self.estimated_counts().totals()
+                recorded += 1
@@ -1,30 +1,269 @@
-from concurrent.futures import ProcessPoolExecutor
+import os
+import pickle
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import repeat
-from typing import Iterator
+from typing import Iterable, Iterator, Sequence
 from collections import Counter
 
+import numpy as np
+
+from viral_rna_simulation import profiling
 from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.counts import Counts
 from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.pileup import Pileup
+from viral_rna_simulation.profiling import Profile, timed
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.spectrum import MutationSpectrum
+from viral_rna_simulation.trajectory import Trajectory
 from viral_rna_simulation.utils import mutations_str
 
 
 def replicate_rnas(
-    cell: Cell, steps: int, mutate_in: str, mutation_rate: float, ratio: int
+    cell: Cell,
+    steps: int,
+    mutate_in: str,
+    mutation_rate: float,
+    ratio: int,
+    record_every: int | None = None,
+    start: int = 0,
+    negative_propensity: float = 1.0,
+    positive_decay: float = 0.0,
+    negative_decay: float = 0.0,
+    max_rnas: int | None = None,
+    mutation_spectrum: MutationSpectrum | None = None,
 ) -> Cell:
     cell.replicate_rnas(
-        steps, mutate_in=mutate_in, mutation_rate=mutation_rate, ratio=ratio
+        steps,
+        mutate_in=mutate_in,
+        mutation_rate=mutation_rate,
+        ratio=ratio,
+        record_every=record_every,
+        start=start,
+        negative_propensity=negative_propensity,
+        positive_decay=positive_decay,
+        negative_decay=negative_decay,
+        max_rnas=max_rnas,
+        mutation_spectrum=mutation_spectrum,
     )
     return cell
 
 
+def profiled_replicate_rnas(
+    cell: Cell | bytes,
+    steps: int,
+    mutate_in: str,
+    mutation_rate: float,
+    ratio: int,
+    record_every: int | None = None,
+    start: int = 0,
+    negative_propensity: float = 1.0,
+    positive_decay: float = 0.0,
+    negative_decay: float = 0.0,
+    max_rnas: int | None = None,
+    mutation_spectrum: MutationSpectrum | None = None,
+) -> tuple[Cell | bytes, dict]:
+    """
+    Replicate a cell, timing the replication. The CPU times are those of the
+    calling thread.
+
+    @param cell: The cell to replicate, or a pickled cell. In the latter case,
+        the replicated cell is returned pickled, and the times taken to
+        unpickle and to pickle it are also measured.
+    @return: A 2-tuple with the replicated (perhaps pickled) cell, and a dict
+        with the wall and CPU times of the replication, the number of
+        replications, and the wall and CPU times of the unpickling (as
+        'cell_transfer_wall' and 'cell_transfer_cpu') and of the pickling (as
+        'result_transfer_wall' and 'result_transfer_cpu').
+    """
+    pickled = isinstance(cell, bytes)
+    timings = {}
+
+    if pickled:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        cell = pickle.loads(cell)
+        timings["cell_transfer_wall"] = time.perf_counter() - wall
+        timings["cell_transfer_cpu"] = time.thread_time() - cpu
+
+    before = cell.counts.positive_replications + cell.counts.negative_replications
+    wall, cpu = time.perf_counter(), time.thread_time()
+    cell.replicate_rnas(
+        steps,
+        mutate_in=mutate_in,
+        mutation_rate=mutation_rate,
+        ratio=ratio,
+        record_every=record_every,
+        start=start,
+        negative_propensity=negative_propensity,
+        positive_decay=positive_decay,
+        negative_decay=negative_decay,
+        max_rnas=max_rnas,
+        mutation_spectrum=mutation_spectrum,
+    )
+    timings["wall"] = time.perf_counter() - wall
+    timings["cpu"] = time.thread_time() - cpu
+    timings["replications"] = (
+        cell.counts.positive_replications + cell.counts.negative_replications - before
+    )
+
+    if pickled:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        cell = pickle.dumps(cell, pickle.HIGHEST_PROTOCOL)
+        timings["result_transfer_wall"] = time.perf_counter() - wall
+        timings["result_transfer_cpu"] = time.thread_time() - cpu
+
+    return cell, timings
+
+
+def sequenced_counts(
+    rnas: Iterable[RNA], infecting_genome: Genome
+) -> tuple[Counter, Counter, np.ndarray]:
+    """
+    Find the apparent changes in some sequenced RNA molecules (see
+    RNA.sequencing_mutation_counts).
+
+    @param rnas: The RNA molecules.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @return: A 3-tuple with the apparent changes in (+) and (-) molecules, and
+        an array with the total number of apparent changes in each molecule.
+    """
+    from_positive = Counter()
+    from_negative = Counter()
+    totals = []
+
+    for rna in rnas:
+        changes, _ = rna.sequencing_mutation_counts(
+            infecting_genome, find_sources=False
+        )
+        (from_positive if rna.positive else from_negative).update(changes)
+        totals.append(sum(changes.values()))
+
+    return from_positive, from_negative, np.array(totals, dtype=np.int64)
+
+
+BACKENDS = ("auto", "serial", "threads", "processes")
+
+# The type of a random seed.
+Seed = int | np.random.SeedSequence | None
+
+# Rough costs (in seconds) of replicating an RNA molecule and of copying each
+# of its sites, and the estimated run time below which the 'auto' backend
+# replicates serially (because starting and feeding a process pool would take
+# longer than the replication itself).
+REPLICATION_SECONDS = 1e-5
+SITE_SECONDS = 2e-9
+SERIAL_SECONDS = 0.5
+
+
+def choose_backend(
+    n_cells: int,
+    steps: int,
+    genome_length: int,
+    ratio: int,
+    workers: int | None = None,
+) -> str:
+    """
+    Choose an execution backend for Cells.replicate, based on the number of
+    cells and an estimate of the amount of work.
+
+    @param n_cells: The number of cells.
+    @param steps: The number of replication steps each cell will perform.
+    @param genome_length: The genome length.
+    @param ratio: The number of +RNA molecules to make from a -RNA.
+    @param workers: The maximum number of workers, or None for no limit.
+    @return: One of 'serial', 'threads', or 'processes'.
+    """
+    if n_cells < 2 or workers == 1 or (os.cpu_count() or 1) == 1:
+        return "serial"
+
+    # On average, half of the chosen molecules are (-) and make 'ratio' copies.
+    replications = n_cells * steps * (1 + ratio) / 2
+    seconds = replications * (REPLICATION_SECONDS + genome_length * SITE_SECONDS)
+
+    if seconds < SERIAL_SECONDS:
+        return "serial"
+
+    # Threads run in parallel on a free-threaded Python build, and do not need
+    # to pickle the cells.
+    if not getattr(sys, "_is_gil_enabled", lambda: True)():
+        return "threads"
+
+    return "processes"
+
+
+def cell_seeds(seed: Seed, n_cells: int) -> list[np.random.SeedSequence]:
+    """
+    Make independent seeds for the random number generators of some cells.
+
+    @param seed: The seed to spawn the cell seeds from. If None, fresh OS
+        entropy is used.
+    @param n_cells: The number of cells.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n_cells)
+
+
 class Cells:
     """
     Maintain a collection of cells, all of which initially contain the same RNA.
+
+    @param n_cells: The number of cells.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @param delta: If True, RNA genomes will only store their differences from
+        the infecting genome (see DeltaGenome).
+    @param haplotypes: If True, each cell will store identical RNA molecules just
+        once, along with their number (see Haplotypes).
+    @param check: If True, check the running totals kept by each cell against a
+        full (slow) recount of all RNA molecules whenever they are used. This is
+        for debugging.
+    @param seed: The seed for the random number generators of the cells. Each
+        cell gets its own independent generator, spawned from this seed (see
+        cell_seeds), so results for a given seed do not depend on how (or in
+        which order) the cells are replicated. A sequence is taken to already
+        hold one seed per cell.
+    @param rna_directory: If not None, the RNA molecules of each cell will be
+        stored in memory-mapped files (see RNAStore) in a temporary directory
+        made in this directory. The temporary directory is removed when the
+        Cells instance is garbage collected or the program exits.
+    @ivar trajectory: None, or a Trajectory with the totals of each cell
+        recorded during replication (see record_trajectory).
     """
 
-    def __init__(self, n_cells: int, infecting_genome: Genome) -> None:
+    def __init__(
+        self,
+        n_cells: int,
+        infecting_genome: Genome,
+        delta: bool = False,
+        haplotypes: bool = False,
+        check: bool = False,
+        seed: Seed | Sequence[np.random.SeedSequence] = None,
+        rna_directory: str | None = None,
+    ) -> None:
         self.infecting_genome = infecting_genome
-        self.cells = [Cell(infecting_genome) for _ in range(n_cells)]
+        self.check = check
+        seeds = seed if isinstance(seed, Sequence) else cell_seeds(seed, n_cells)
+        assert len(seeds) == n_cells
+        if rna_directory is None:
+            self.directory = None
+        else:
+            self.directory = tempfile.TemporaryDirectory(
+                dir=rna_directory, prefix="viral-rna-simulation-"
+            )
+        self.cells = [
+            Cell(
+                infecting_genome,
+                delta=delta,
+                haplotypes=haplotypes,
+                rng=np.random.default_rng(cell_seed),
+                directory=self.directory and self.directory.name,
+            )
+            for cell_seed in seeds
+        ]
+        self.trajectory: Trajectory | None = None
 
     def __iter__(self) -> Iterator[Cell]:
         return iter(self.cells)
@@ -46,105 +285,339 @@ class Cells:
         mutate_in: str = "both",
         mutation_rate: float = 0.0,
         ratio: int = 1,
+        backend: str = "auto",
+        negative_propensity: float = 1.0,
+        positive_decay: float = 0.0,
+        negative_decay: float = 0.0,
+        max_rnas: int | None = None,
+        mutation_spectrum: MutationSpectrum | None = None,
     ) -> None:
         """
-        Replicate (in parallel) each cell for a given number of steps.
+        Replicate (perhaps in parallel) each cell for a given number of steps.
 
         At each step, each cell picks one RNA to replicate, so in each call
         to replicated, the number of RNA molecules overall (i.e., summed over
         all cells) goes up by the product of the number of workers and the
         number of steps (2 x 3 = 6, in this call).
 
-        @param workers: The number of concurrent worker processes to allow in the
-            process pool.
+        @param workers: The number of concurrent worker threads or processes to
+            allow in the pool.
         @param steps: The number of replication steps each cell should perform.
         @param mutate_in: The type of RNA molecules to allow mutations in. If
             'negative' or 'positive', mutations should only be allowed in those
             molecules.
         @param mutation_rate: The per-base mutation probability.
         @param ratio: The number of +RNA molecules to make from a -RNA.
+        @param backend: How to run the replication. One of 'serial' (in this
+            process and thread), 'threads' (in a thread pool, which is only
+            useful on a free-threaded Python build), 'processes' (in a process
+            pool), or 'auto' (to choose one, see choose_backend).
+        @param negative_propensity: How likely a (-) molecule is to be chosen
+            for replication, relative to a (+) molecule (see
+            Cell.set_negative_propensity).
+        @param positive_decay: The probability that each (+) molecule degrades
+            at the end of each step (see Cell.degrade).
+        @param negative_decay: The probability that each (-) molecule degrades
+            at the end of each step.
+        @param max_rnas: If not None, the carrying capacity of each cell (see
+            Cell.replicate_rnas).
+        @param mutation_spectrum: If not None, the context-dependent mutation
+            rates and substitutions to use instead of 'mutation_rate'.
         """
-        new_cells = []
+        if backend == "auto":
+            backend = choose_backend(
+                len(self.cells), steps, len(self.infecting_genome), ratio, workers
+            )
+
+        trajectory = self.trajectory
+        args = (
+            self.cells,
+            repeat(steps),
+            repeat(mutate_in),
+            repeat(mutation_rate),
+            repeat(ratio),
+            repeat(None if trajectory is None else trajectory.every),
+            repeat(0 if trajectory is None else trajectory.step),
+            repeat(negative_propensity),
+            repeat(positive_decay),
+            repeat(negative_decay),
+            repeat(max_rnas),
+            repeat(mutation_spectrum),
+        )
+
+        if profiling.PROFILE is not None:
+            self._profiled_replicate(profiling.PROFILE, backend, workers, args)
+        elif backend == "serial":
+            self.cells = list(map(replicate_rnas, *args))
+        elif backend == "threads":
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self.cells = list(executor.map(replicate_rnas, *args))
+        else:
+            assert backend == "processes", f"Unknown backend {backend!r}."
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self.cells = list(executor.map(replicate_rnas, *args))
 
-        with ProcessPoolExecutor(max_workers=workers) as executor:
-            for cell in executor.map(
-                replicate_rnas,
-                self.cells,
-                repeat(steps),
-                repeat(mutate_in),
-                repeat(mutation_rate),
-                repeat(ratio),
-            ):
-                new_cells.append(cell)
+        if trajectory is not None:
+            trajectory.add(steps, [cell.snapshots for cell in self.cells])
 
-        self.cells = new_cells
+    def record_trajectory(self, every: int, steps: int = 0, start: int = 0) -> None:
+        """
+        Record the running totals of each cell every 'every' replication steps
+        in all further calls to 'replicate', in self.trajectory.
 
-    def mutation_counts(self) -> tuple[Counter, Counter]:
+        @param every: The number of replication steps between recordings.
+        @param steps: The total number of replication steps expected (including
+            the 'start' steps), used to preallocate the recordings.
+        @param start: The number of replication steps already done.
         """
-        Add up all mutations in all (+/-) RNA molecules in all cells.
+        self.trajectory = Trajectory(len(self), every, steps, start)
+
+    def _profiled_replicate(
+        self,
+        profile: Profile,
+        backend: str,
+        workers: int | None,
+        args: tuple,
+    ) -> None:
         """
-        positive_counts = Counter()
-        negative_counts = Counter()
+        Replicate each cell, as in the 'replicate' method, recording the time
+        taken to start a worker pool, to replicate the cells (as measured in each
+        worker), and (with the 'processes' backend) to transfer the cells to the
+        workers ("cell transfer") and back ("result transfer").
+
+        With the 'processes' backend, the cells are pickled and unpickled
+        explicitly (rather than by the process pool), so that this can be timed.
 
+        @param args: The arguments for replicate_rnas, as made by 'replicate'.
+        """
+        if backend == "serial":
+            results = list(map(profiled_replicate_rnas, *args))
+        else:
+            assert backend in ("threads", "processes"), f"Unknown backend {backend!r}."
+            with profile.phase("pool startup"):
+                executor = (
+                    ThreadPoolExecutor if backend == "threads" else ProcessPoolExecutor
+                )(max_workers=workers)
+                executor.submit(int).result()
+
+            with executor:
+                if backend == "processes":
+                    cells = []
+                    for cell in self.cells:
+                        wall, cpu = time.perf_counter(), time.process_time()
+                        cells.append(pickle.dumps(cell, pickle.HIGHEST_PROTOCOL))
+                        profile.add(
+                            "cell transfer",
+                            time.perf_counter() - wall,
+                            time.process_time() - cpu,
+                            items=len(cells[-1]),
+                            unit="bytes",
+                        )
+                else:
+                    cells = self.cells
+                results = list(
+                    executor.map(profiled_replicate_rnas, cells, *args[1:])
+                )
+
+        self.cells = []
+        for cell, timings in results:
+            profile.add(
+                "replicate_rnas",
+                timings["wall"],
+                timings["cpu"],
+                items=timings["replications"],
+                unit="replications",
+            )
+            if isinstance(cell, bytes):
+                # The time the worker took to unpickle the cell it was sent.
+                profile.add(
+                    "cell transfer",
+                    timings["cell_transfer_wall"],
+                    timings["cell_transfer_cpu"],
+                    calls=0,
+                )
+                wall, cpu = time.perf_counter(), time.process_time()
+                size = len(cell)
+                cell = pickle.loads(cell)
+                profile.add(
+                    "result transfer",
+                    timings["result_transfer_wall"] + time.perf_counter() - wall,
+                    timings["result_transfer_cpu"] + time.process_time() - cpu,
+                    items=size,
+                    unit="bytes",
+                )
+            self.cells.append(cell)
+
+    def counts(self) -> Counts:
+        """
+        Add up the running totals of all cells, scaled up for any cell that has
+        been downsampled (see Cell.estimated_counts). If self.check is True,
+        also check the (unscaled) running totals against a full recount.
+        """
+        counts = Counts()
         for cell in self.cells:
-            for rna in cell:
-                for site in rna.genome:
-                    if site.mutant:
-                        change, positive = site.mutation_history[-1]
-                        mutations = positive_counts if positive else negative_counts
-                        mutations[change] += 1
+            counts += cell.estimated_counts()
 
-        return positive_counts, negative_counts
+        if self.check:
+            self.check_counts()
 
-    def rna_count(self) -> tuple[int, int]:
+        return counts
+
+    def recount(self) -> Counts:
         """
-        Get the number of all (+/-) RNA molecules in all cells.
+        Find the totals for all cells by looking at every RNA molecule in every
+        cell. This is slow, and only intended for checking the running totals.
         """
-        positive = negative = 0
-
+        counts = Counts()
         for cell in self.cells:
-            for rna in cell:
-                if rna.positive:
-                    positive += 1
-                else:
-                    negative += 1
+            counts += cell.recount()
+        return counts
 
-        return positive, negative
+    def check_counts(self, counts: Counts | None = None) -> None:
+        """
+        Check the running totals of all cells against a full recount.
 
-    def replication_count(self) -> tuple[int, int]:
+        @param counts: The running totals, if they have already been added up.
+        @raise AssertionError: If the running totals are not correct.
         """
-        Get the number of (+/-) RNA molecule replications that occurred.
+        if counts is None:
+            counts = Counts()
+            for cell in self.cells:
+                counts += cell.counts
+
+        recount = self.recount()
+        if counts != recount:
+            raise AssertionError(
+                f"Running totals {counts!r} do not match recount {recount!r}."
+            )
+
+    @timed("Cells.mutation_counts")
+    def mutation_counts(self) -> tuple[Counter, Counter]:
         """
-        positive = negative = 0
+        Add up all mutations in all (+/-) RNA molecules in all cells.
+        """
+        counts = self.counts()
+        return counts.positive_mutations, counts.negative_mutations
 
-        for cell in self.cells:
-            for rna in cell:
-                if rna.positive:
-                    positive += rna.replications
-                else:
-                    negative += rna.replications
+    @timed("Cells.rna_count")
+    def rna_count(self) -> tuple[int, int]:
+        """
+        Get the number of all (+/-) RNA molecules in all cells.
+        """
+        counts = self.counts()
+        return counts.positive_rnas, counts.negative_rnas
 
-        return positive, negative
+    @timed("Cells.replication_count")
+    def replication_count(self) -> tuple[int, int]:
+        """
+        Get the number of (+/-) RNA molecule replications that occurred.
+        """
+        counts = self.counts()
+        return counts.positive_replications, counts.negative_replications
 
+    @timed("Cells.apparent_mutation_counts")
     def apparent_mutation_counts(self) -> tuple[Counter, Counter]:
         """
         Get the apparent changes. I.e., what it looks like happened, based on sample
         preparation, sequencing, alignment to the (+) RNA reference (infecting) genome.
         """
-        from_positive = Counter()
-        from_negative = Counter()
+        counts = self.counts()
+        return counts.from_positive, counts.from_negative
+
+    def cell_sizes(self) -> list[int]:
+        """
+        Get the number of RNA molecules in each cell (or, for a downsampled
+        cell, the estimated number in its whole population).
+        """
+        return [round(len(cell) * cell.scale) for cell in self.cells]
+
+    @timed("Cells.sample_apparent_mutation_counts")
+    def sample_apparent_mutation_counts(
+        self, molecules: int, seed: Seed = None
+    ) -> tuple[Counter, Counter, np.ndarray]:
+        """
+        Get the apparent changes (see apparent_mutation_counts) in a random
+        sample of the RNA molecules, as when a sequencing library is made from
+        a limited number of molecules. The cost depends on the number of
+        molecules sampled, not on the number in the cells.
+
+        Molecules are sampled with replacement, with each one in any cell
+        equally likely to be chosen. The number from each cell is drawn from a
+        multinomial distribution (weighted by the number of molecules in the
+        cells), and then molecules are chosen within each cell (see
+        Cell.sample_rnas).
+
+        @param molecules: The number of molecules to sample.
+        @param seed: The random seed for the sampling. The random number
+            generators of the cells are not used, so sampling does not change
+            the rest of a simulation.
+        @return: A 3-tuple with the apparent changes in the sampled (+) and (-)
+            molecules, and an array with the number of apparent changes in each
+            sampled molecule (e.g., to find the sampling variance). If the
+            cells have no molecules (e.g., all have decayed), nothing is
+            sampled and the array is empty.
+        """
+        allocation_seed, sample_seed = cell_seeds(seed, 2)
+        sizes = np.array(self.cell_sizes(), dtype=float)
+        if not sizes.sum():
+            return Counter(), Counter(), np.zeros(0, dtype=np.int64)
+        allocation = np.random.default_rng(allocation_seed).multinomial(
+            molecules, sizes / sizes.sum()
+        )
+        return self._sample(allocation.tolist(), cell_seeds(sample_seed, len(sizes)))
+
+    def _sample(
+        self, allocation: list[int], seeds: list[np.random.SeedSequence]
+    ) -> tuple[Counter, Counter, np.ndarray]:
+        """
+        Sample RNA molecules and find their apparent changes. See
+        sample_apparent_mutation_counts.
 
-        for cell in self:
-            for rna in cell:
-                mutations = from_positive if rna.positive else from_negative
-                counts, reasons = rna.sequencing_mutation_counts(self.infecting_genome)
-                mutations += counts
+        @param allocation: The number of molecules to sample from each cell.
+        @param seeds: The seed for the sampling in each cell.
+        """
+        return sequenced_counts(
+            (
+                rna
+                for cell, n, seed in zip(self.cells, allocation, seeds)
+                for rna in cell.sample_rnas(n, np.random.default_rng(seed))
+            ),
+            self.infecting_genome,
+        )
+
+    @timed("Cells.pileup")
+    def pileup(self) -> np.ndarray:
+        """
+        Count the A/C/G/T bases at each site of all RNA molecules in all cells,
+        against the infecting genome, split by actual versus apparent and by
+        source strand. See pileup.Pileup.
+
+        @return: An int64 array of shape (2, 2, L, 4), where L is the genome
+            length, indexed by kind (see pileup.KINDS), source strand (see
+            pileup.STRANDS), (+) offset, and base code (see utils.BASES).
+        @raise ValueError: If any cell has been downsampled (see
+            Cell.downsample), because the pileup could then only count the
+            molecules it kept, and would not agree with the (estimated)
+            molecule and mutation counts.
+        """
+        if any(cell.scale != 1.0 for cell in self.cells):
+            raise ValueError("Cannot make a pileup of downsampled cells.")
 
-        return from_positive, from_negative
+        pileup = Pileup(self.infecting_genome)
+        for cell in self.cells:
+            for rna, count in cell.rna_counts():
+                pileup.add(rna.genome, count)
+        return pileup.counts()
 
-    def summary(self) -> str:
+    @timed("Cells.summary")
+    def summary(self, sequencing_depth: int | None = None, seed: Seed = None) -> str:
         """
         Return a summary of all cells for printing.
+
+        @param sequencing_depth: If not None, the apparent changes are found
+            from a random sample of this many molecules (see
+            sample_apparent_mutation_counts), rather than from all molecules.
+        @param seed: The random seed for the sample.
         """
         result = []
 
@@ -194,20 +667,30 @@ class Cells:
         else:
             result.append("Mutations: None")
 
-        from_positive, from_negative = self.apparent_mutation_counts()
+        if sequencing_depth is None:
+            from_positive, from_negative = self.apparent_mutation_counts()
+            title = "Apparent mutations"
+        else:
+            from_positive, from_negative, totals = self.sample_apparent_mutation_counts(
+                sequencing_depth, seed
+            )
+            title = f"Apparent mutations (in {sequencing_depth} sampled molecules)"
         apparent_changes = from_positive + from_negative
         if apparent_changes:
             total = sum(apparent_changes.values())
-            result.extend([
-                "Apparent mutations:",
-                f"  Total: {total}",
-                f"  From/to: {mutations_str(apparent_changes)}",
-            ])
+            result.extend([f"{title}:", f"  Total: {total}"])
+            if sequencing_depth is not None and sequencing_depth > 1:
+                # The mean per molecule, with its standard error.
+                error = totals.std(ddof=1) / np.sqrt(sequencing_depth)
+                result.append(
+                    f"  Per molecule: {totals.mean():.4f} +/- {error:.4f} (SE)"
+                )
+            result.append(f"  From/to: {mutations_str(apparent_changes)}")
             if from_positive:
                 result.append(f"    (+) From/to: {mutations_str(from_positive)}")
             if from_negative:
                 result.append(f"    (-) From/to: {mutations_str(from_negative)}")
         else:
-            result.append("Apparent mutations: None")
+            result.append(f"{title}: None")
 
         return "\n".join(result)
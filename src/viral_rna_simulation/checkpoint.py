@@ -0,0 +1,367 @@
+import json
+import os
+from collections import Counter
+from itertools import islice
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.counts import Counts
+from viral_rna_simulation.genome import DeltaGenome, Genome, History
+from viral_rna_simulation.haplotypes import Haplotypes
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.utils import CHANGES, CODES
+
+# The checkpoint format version. Increase this if the format changes.
+VERSION = 1
+
+# The Counts attributes saved (in this order) for each cell.
+TOTALS = (
+    "positive_rnas",
+    "negative_rnas",
+    "positive_replications",
+    "negative_replications",
+)
+MUTATIONS = (
+    "positive_mutations",
+    "negative_mutations",
+    "from_positive",
+    "from_negative",
+)
+
+
+def _change_code(change: str) -> int:
+    return 4 * CODES[change[0]] + CODES[change[1]]
+
+
+def _counter(counts: np.ndarray) -> Counter[str]:
+    return Counter({
+        CHANGES[code]: int(counts[code]) for code in np.flatnonzero(counts).tolist()
+    })
+
+
+def save_checkpoint(
+    cells: Cells, filename: str, step: int = 0, parameters: dict | None = None
+) -> None:
+    """
+    Save the complete state of some cells, so that their replication can later be
+    continued exactly as though it had not been interrupted.
+
+    The checkpoint is an (uncompressed) NumPy .npz file holding one array per
+    column: the sense, replication count, number of molecules (for haplotypes),
+    and genome of every distinct RNA in every cell, and a table of the genomes.
+    Genome table entries hold either base arrays or, for delta genomes, the
+    changes from the infecting genome, along with the offsets of sites with a
+    mutation history and an index into a table of the distinct histories.
+    Variable-length entries are flattened into arrays, along with an array of
+    their sizes. Delta genomes that share their changes (e.g., unmutated
+    copies) share an entry. The running totals, the random number generator
+    state, the replications of the degraded molecules, and the downsampling
+    scale of each cell are also saved, as is the order of the index of the
+    molecules of each sense (see Cell.index_senses), which decides which
+    molecules degrade. The file is written under a temporary name and then
+    renamed, so an existing checkpoint is never left half-written.
+
+    @param cells: The Cells instance to save.
+    @param filename: The file to write.
+    @param step: The number of replication steps already done.
+    @param parameters: A dict of replication parameters (e.g., the mutation rate),
+        which must be JSON serializable, to save along with the cells.
+    """
+    infecting_genome = cells.infecting_genome
+    delta = haplotypes = False
+    cell_sizes = []
+    positive = []
+    replications = []
+    molecules = []
+    genome_index = []
+    mutant_sizes = []
+    mutant_offsets: list[int] = []
+
+    # The genome table. Delta genomes that share their changes and history dicts
+    # share an entry.
+    genomes: dict[tuple[int, int], int] = {}
+    bases = []
+    changes_sizes = []
+    changes_offsets: list[int] = []
+    changes_bases: list[int] = []
+    history_sizes = []
+    history_offsets: list[int] = []
+    history_entries = []
+
+    # The table of distinct site histories. The same histories are found in all
+    # the copies of a genome, so each is saved just once.
+    events: dict[History, int] = {}
+    events_sizes = []
+    events_changes = []
+    events_positive = []
+
+    # The offsets in the index of the molecules of each sense, for each cell
+    # that has one (and does not store haplotypes).
+    senses = []
+    sense_offsets: list[int] = []
+
+    totals = np.zeros((len(cells), len(TOTALS)), dtype=np.int64)
+    mutations = np.zeros((len(cells), len(MUTATIONS), len(CHANGES)), dtype=np.int64)
+
+    for cell_index, cell in enumerate(cells):
+        haplotypes = isinstance(cell.rnas, Haplotypes)
+        size = 0
+        for rna, count in cell.rna_counts():
+            size += 1
+            genome = rna.genome
+            positive.append(genome.positive)
+            replications.append(rna.replications)
+            molecules.append(count)
+            mutant_sizes.append(len(genome.mutant))
+            mutant_offsets.extend(genome.mutant)
+
+            delta = isinstance(genome, DeltaGenome)
+            if delta:
+                key = id(genome.changes), id(genome.history)
+                index = genomes.get(key)
+            else:
+                # Full genomes may be made afresh as the cell is iterated (see
+                # RNAStore), so their ids cannot be used to find shared entries.
+                key, index = None, None
+
+            if index is None:
+                index = len(history_sizes)
+                if key:
+                    genomes[key] = index
+                if delta:
+                    changes_sizes.append(len(genome.changes))
+                    changes_offsets.extend(genome.changes)
+                    changes_bases.extend(genome.changes.values())
+                else:
+                    bases.append(genome.bases)
+                history_sizes.append(len(genome.history))
+                history_offsets.extend(genome.history)
+                for history in genome.history.values():
+                    entry = events.get(history)
+                    if entry is None:
+                        entry = events[history] = len(events)
+                        events_sizes.append(len(history))
+                        for change, change_positive in history:
+                            events_changes.append(_change_code(change))
+                            events_positive.append(change_positive)
+                    history_entries.append(entry)
+            genome_index.append(index)
+
+        cell_sizes.append(size)
+        indexed = cell.senses is not None and not haplotypes
+        senses.append(indexed)
+        if indexed:
+            for sense in cell.senses:
+                sense_offsets.extend(sense)
+        for column, name in enumerate(TOTALS):
+            totals[cell_index, column] = getattr(cell.counts, name)
+        for column, name in enumerate(MUTATIONS):
+            for change, count in getattr(cell.counts, name).items():
+                mutations[cell_index, column, _change_code(change)] = count
+
+    metadata = {
+        "version": VERSION,
+        "step": step,
+        "delta": delta,
+        "haplotypes": haplotypes,
+        "parameters": parameters or {},
+        "rng": [cell.rng.bit_generator.state for cell in cells],
+        "degraded_replications": [cell.degraded_replications for cell in cells],
+        "scale": [cell.scale for cell in cells],
+        "senses": senses,
+    }
+
+    arrays = {
+        "metadata": np.array(json.dumps(metadata)),
+        "infecting_genome": infecting_genome.bases,
+        "cell_sizes": np.array(cell_sizes, dtype=np.int64),
+        "positive": np.array(positive, dtype=bool),
+        "replications": np.array(replications, dtype=np.int64),
+        "molecules": np.array(molecules, dtype=np.int64),
+        "genome": np.array(genome_index, dtype=np.int64),
+        "mutant_sizes": np.array(mutant_sizes, dtype=np.int64),
+        "mutant_offsets": np.array(mutant_offsets, dtype=np.int64),
+        "history_sizes": np.array(history_sizes, dtype=np.int64),
+        "history_offsets": np.array(history_offsets, dtype=np.int64),
+        "history_entries": np.array(history_entries, dtype=np.int64),
+        "events_sizes": np.array(events_sizes, dtype=np.int64),
+        "events_changes": np.array(events_changes, dtype=np.uint8),
+        "events_positive": np.array(events_positive, dtype=bool),
+        "totals": totals,
+        "mutations": mutations,
+        "sense_offsets": np.array(sense_offsets, dtype=np.int64),
+    }
+
+    if delta:
+        arrays["changes_sizes"] = np.array(changes_sizes, dtype=np.int64)
+        arrays["changes_offsets"] = np.array(changes_offsets, dtype=np.int64)
+        arrays["changes_bases"] = np.array(changes_bases, dtype=np.uint8)
+    else:
+        arrays["bases"] = np.array(bases, dtype=np.uint8)
+
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as fp:
+        np.savez(fp, **arrays)
+    os.replace(temporary, filename)
+
+
+def _groups(sizes: np.ndarray, values: Iterable) -> Iterator[Iterator]:
+    """
+    Split flattened values into groups.
+
+    @param sizes: The number of values in each group.
+    @param values: The flattened values.
+    @return: A generator yielding an iterator over the values of each group.
+    """
+    values = iter(values)
+    return (islice(values, size) for size in sizes.tolist())
+
+
+def _dicts(sizes: np.ndarray, keys: np.ndarray, values: Iterable) -> list[dict]:
+    """
+    Make dicts from flattened keys and values.
+
+    @param sizes: The number of items in each dict.
+    @param keys: The flattened keys.
+    @param values: The flattened values.
+    @return: A list of dicts.
+    """
+    values = iter(values)
+    return [dict(zip(group, values)) for group in _groups(sizes, keys.tolist())]
+
+
+def load_checkpoint(
+    filename: str, check: bool = False, rna_directory: str | None = None
+) -> tuple[Cells, int, dict]:
+    """
+    Load cells saved by save_checkpoint.
+
+    @param filename: The checkpoint file to read.
+    @param check: Passed to Cells.
+    @param rna_directory: Passed to Cells, to store the loaded RNA molecules on
+        disk.
+    @raise ValueError: If the file has an unknown checkpoint format version.
+    @return: A 3-tuple with the Cells, the number of replication steps already
+        done, and the dict of replication parameters that was saved.
+    """
+    with np.load(filename) as data:
+        metadata = json.loads(data["metadata"].item())
+        if metadata["version"] != VERSION:
+            raise ValueError(
+                f"Checkpoint file {filename!r} has version {metadata['version']}, "
+                f"but only version {VERSION} can be read."
+            )
+        arrays = {name: data[name] for name in data.files}
+
+    delta = metadata["delta"]
+    haplotypes = metadata["haplotypes"]
+    infecting_genome = Genome(arrays["infecting_genome"])
+
+    # Make the table of site histories, and then the genome table.
+    positives = iter(arrays["events_positive"].tolist())
+    events: list[History] = [
+        tuple(zip(group, positives))
+        for group in _groups(
+            arrays["events_sizes"],
+            map(CHANGES.__getitem__, arrays["events_changes"].tolist()),
+        )
+    ]
+    histories: list[dict[int, History]] = _dicts(
+        arrays["history_sizes"],
+        arrays["history_offsets"],
+        map(events.__getitem__, arrays["history_entries"].tolist()),
+    )
+
+    if delta:
+        changes_table = _dicts(
+            arrays["changes_sizes"],
+            arrays["changes_offsets"],
+            arrays["changes_bases"].tolist(),
+        )
+    else:
+        bases = arrays["bases"]
+
+    mutants = list(
+        map(
+            frozenset,
+            _groups(arrays["mutant_sizes"], arrays["mutant_offsets"].tolist()),
+        )
+    )
+    genome_index = arrays["genome"].tolist()
+    positive = arrays["positive"].tolist()
+    replications = arrays["replications"].tolist()
+    molecules = arrays["molecules"].tolist()
+
+    n_cells = len(arrays["cell_sizes"])
+    cells = Cells(
+        n_cells,
+        infecting_genome,
+        delta=delta,
+        haplotypes=haplotypes,
+        check=check,
+        rna_directory=rna_directory,
+    )
+    start = 0
+    sense_offsets = (
+        iter(arrays["sense_offsets"].tolist()) if "sense_offsets" in arrays else None
+    )
+
+    for cell_index, (cell, size) in enumerate(
+        zip(cells, arrays["cell_sizes"].tolist())
+    ):
+        end = start + size
+        if haplotypes:
+            rnas = Haplotypes()
+        elif rna_directory is None:
+            rnas = []
+        else:
+            # Reuse the store the cell was made with, so its files are not left
+            # behind.
+            rnas = cell.rnas
+            rnas.clear()
+
+        for molecule in range(start, end):
+            index = genome_index[molecule]
+            mutant = mutants[molecule]
+            if delta:
+                genome = DeltaGenome(
+                    infecting_genome,
+                    positive[molecule],
+                    changes_table[index],
+                    histories[index],
+                    mutant,
+                )
+            else:
+                genome = Genome(
+                    bases[index],
+                    positive=positive[molecule],
+                    history=histories[index],
+                    mutant=mutant,
+                )
+            rna = RNA(genome)
+            rna.replications = replications[molecule]
+            if haplotypes:
+                rnas.append(rna, molecules[molecule])
+            else:
+                rnas.append(rna)
+
+        cell.rnas = rnas
+        start = end
+
+        counts = Counts()
+        for column, name in enumerate(TOTALS):
+            setattr(counts, name, int(arrays["totals"][cell_index, column]))
+        for column, name in enumerate(MUTATIONS):
+            setattr(counts, name, _counter(arrays["mutations"][cell_index, column]))
+        cell.counts = counts
+        cell.rng.bit_generator.state = metadata["rng"][cell_index]
+        if "degraded_replications" in metadata:
+            cell.degraded_replications = metadata["degraded_replications"][cell_index]
+        if "scale" in metadata:
+            cell.scale = metadata["scale"][cell_index]
+        if "senses" in metadata and metadata["senses"][cell_index]:
+            cell.index_senses(islice(sense_offsets, size))
+
+    return cells, metadata["step"], metadata["parameters"]
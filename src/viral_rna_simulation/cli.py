@@ -1,7 +1,32 @@
 import argparse
+import json
+import sys
+from contextlib import ExitStack
 
-from viral_rna_simulation.plot import make_plot
-from viral_rna_simulation.simulate import run
+import numpy as np
+
+from viral_rna_simulation import profiling
+from viral_rna_simulation.benchmark import (
+    compare,
+    format_comparison,
+    load,
+    run_benchmarks,
+)
+from viral_rna_simulation.cache import DEFAULT_MAX_BYTES, ResultCache, cache_key
+from viral_rna_simulation.cells import BACKENDS
+from viral_rna_simulation.memory import (
+    format_bytes,
+    memory_report,
+    parse_bytes,
+    project_memory,
+)
+from viral_rna_simulation.pileup import pileup_frame
+from viral_rna_simulation.plot import make_plot, make_trajectory_plot
+from viral_rna_simulation.profiling import phase
+from viral_rna_simulation.reads import write_reads
+from viral_rna_simulation.simulate import resume, run
+from viral_rna_simulation.spectrum import read_spectrum
+from viral_rna_simulation.sweep import sweep, sweep_jobs, write_rows
 
 
 def parse_args() -> argparse.Namespace:
@@ -28,7 +53,7 @@ def parse_args() -> argparse.Namespace:
         ),
     )
 
-    group = parser.add_mutually_exclusive_group(required=True)
+    group = parser.add_mutually_exclusive_group()
 
     group.add_argument(
         "--genome-length",
@@ -80,6 +105,17 @@ def parse_args() -> argparse.Namespace:
         ),
     )
 
+    parser.add_argument(
+        "--mutation-spectrum",
+        metavar="FILE",
+        help=(
+            "A tab-separated file of per-nucleotide mutation rates that depend on "
+            "the strand being made and the trinucleotide context of the site, "
+            "and on the new base, to use instead of --mutation-rate (see the "
+            "README for the format). Not supported by the 'arrays' --engine."
+        ),
+    )
+
     parser.add_argument(
         "--ratio",
         type=int,
@@ -91,27 +127,865 @@ def parse_args() -> argparse.Namespace:
         ),
     )
 
+    parser.add_argument(
+        "--negative-propensity",
+        type=float,
+        default=1.0,
+        metavar="N",
+        help=(
+            "How likely a (-) RNA molecule is to be chosen for replication, "
+            "relative to a (+) molecule. Values other than one choose molecules "
+            "with a weighted index and are not supported by the 'arrays' "
+            "--engine."
+        ),
+    )
+
+    parser.add_argument(
+        "--positive-decay-rate",
+        type=float,
+        default=0.0,
+        metavar="N",
+        help=(
+            "The probability that each (+) RNA molecule degrades (and is removed "
+            "from its cell) at the end of each replication step. Not supported "
+            "by the 'arrays' --engine or with --rna-directory."
+        ),
+    )
+
+    parser.add_argument(
+        "--negative-decay-rate",
+        type=float,
+        default=0.0,
+        metavar="N",
+        help=(
+            "The probability that each (-) RNA molecule degrades at the end of "
+            "each replication step. See --positive-decay-rate."
+        ),
+    )
+
+    parser.add_argument(
+        "--max-rnas-per-cell",
+        type=int,
+        metavar="N",
+        help=(
+            "The carrying capacity of each cell. When a cell has this many RNA "
+            "molecules, it is downsampled (uniformly at random) to half as many, "
+            "and the reported counts are scaled up to estimate those of the "
+            "whole population. This keeps the time per step and the memory use "
+            "bounded. Reads (see --fastq-filename) are only made from the "
+            "molecules each cell keeps. Not supported by the 'arrays' --engine, "
+            "with --rna-directory, or with --pileup-filename."
+        ),
+    )
+
+    parser.add_argument(
+        "--delta-genomes",
+        action="store_true",
+        help=(
+            "Store each RNA genome as just its differences from the infecting "
+            "genome. This uses far less memory for long genomes and low mutation "
+            "rates."
+        ),
+    )
+
+    parser.add_argument(
+        "--haplotypes",
+        action="store_true",
+        help=(
+            "Store identical RNA molecules in each cell just once, along with their "
+            "number. This uses far less memory when many molecules are identical "
+            "(e.g., with a high --ratio and a low --mutation-rate)."
+        ),
+    )
+
+    parser.add_argument(
+        "--rna-directory",
+        metavar="DIR",
+        help=(
+            "Store the RNA molecules of each cell in memory-mapped files in a "
+            "temporary directory made in DIR, keeping only a small index of them in "
+            "memory. This allows populations that are too big for memory. The "
+            "temporary directory is removed when the simulation finishes. "
+            "Incompatible with --delta-genomes and --haplotypes, and ignored by "
+            "the 'arrays' --engine."
+        ),
+    )
+
+    parser.add_argument(
+        "--engine",
+        default="cells",
+        choices=("cells", "resident", "arrays"),
+        help=(
+            "How to run the simulation. With 'cells', each cell is replicated "
+            "separately (in its own process) and holds its own RNA molecules. With "
+            "'resident', cells are made and kept by worker processes, which only "
+            "send back aggregate counts, so no cell is ever pickled. With "
+            "'arrays', the molecules of all cells are held together in shared "
+            "arrays and each replication step for all cells is done at once, in "
+            "this process. The 'arrays' engine is much faster and always stores "
+            "genomes as deltas, so --delta-genomes and --haplotypes are ignored."
+        ),
+    )
+
+    parser.add_argument(
+        "--backend",
+        default="auto",
+        choices=BACKENDS,
+        help=(
+            "How to run the replication of the cells with the 'cells' engine: in "
+            "this process ('serial'), in a thread pool ('threads', only useful on a "
+            "free-threaded Python build), or in a process pool ('processes'). With "
+            "'auto', one is chosen based on the number of cells and an estimate of "
+            "the amount of work."
+        ),
+    )
+
+    parser.add_argument(
+        "--check-counts",
+        action="store_true",
+        help=(
+            "Check the running totals of RNA molecules, replications, and actual "
+            "and apparent mutations kept by each cell against a full recount of all "
+            "molecules. This is slow, and is only useful for debugging."
+        ),
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        metavar="N",
+        help=(
+            "The random seed. Runs with the same seed and arguments give the same "
+            "results, whatever the --backend (each cell has its own independent "
+            "random number stream)."
+        ),
+    )
+
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        metavar="N",
+        help=(
+            "Save a checkpoint of the complete simulation state after every N "
+            "replication steps, so that a long run can be continued with --resume "
+            "if it is interrupted. Only the 'cells' --engine can be checkpointed."
+        ),
+    )
+
+    parser.add_argument(
+        "--checkpoint-filename",
+        metavar="FILE",
+        help=(
+            "The file to save checkpoints to. The default is "
+            "viral-rna-simulation-checkpoint.npz, or the --resume file if resuming."
+        ),
+    )
+
+    parser.add_argument(
+        "--resume",
+        metavar="FILE",
+        help=(
+            "Continue a simulation from a checkpoint file (see --checkpoint-every). "
+            "The cells, the number of steps already done, the random number "
+            "generator states, and the replication options (--steps, --mutate-in, "
+            "--mutation-rate and --ratio) are all taken from the checkpoint, so "
+            "the result is the same as if the run had not been interrupted."
+        ),
+    )
+
     parser.add_argument(
         "--plot-filename",
         help="The file to write a plot of actual and apparent changes to.",
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--trajectory-every",
+        type=int,
+        metavar="N",
+        help=(
+            "Record the number of RNA molecules, replications, and actual and "
+            "apparent mutations in each cell after every N replication steps (see "
+            "--trajectory-filename and --trajectory-plot-filename). The running "
+            "totals kept by the cells are used, so this is cheap. The 'arrays' "
+            "--engine cannot record trajectories."
+        ),
+    )
+
+    parser.add_argument(
+        "--trajectory-filename",
+        metavar="FILE",
+        help=(
+            "The Parquet file to write the --trajectory-every recordings to, with "
+            "a row for each recorded step and cell."
+        ),
+    )
+
+    parser.add_argument(
+        "--trajectory-plot-filename",
+        metavar="FILE",
+        help=(
+            "The file to write a plot of the actual and apparent changes (summed "
+            "over all cells) at each --trajectory-every step to."
+        ),
+    )
+
+    parser.add_argument(
+        "--pileup-filename",
+        help=(
+            "The Parquet file to write a per-site pileup to: the count of each "
+            "base at each site of the infecting genome, for the apparent bases "
+            "(as would be seen by sequencing every molecule) and the actual "
+            "mutations, each split by the sense of the molecule they are in."
+        ),
+    )
+
+    parser.add_argument(
+        "--sequencing-depth",
+        metavar="N",
+        type=int,
+        help=(
+            "Find the apparent mutations in the summary from a random sample of "
+            "this many RNA molecules (drawn with replacement from all cells), as "
+            "when a sequencing library is made from a limited number of "
+            "molecules, rather than from every molecule. The mean number of "
+            "apparent mutations per molecule and its standard error are also "
+            "shown."
+        ),
+    )
+
+    parser.add_argument(
+        "--fastq-filename",
+        metavar="FILE",
+        help=(
+            "Sequence every RNA molecule at the end of the simulation and write "
+            "the reads to this file, as gzip compressed FASTQ. Both DNA strands "
+            "made from each molecule are sequenced (see --read-length, "
+            "--read-depth and --sequencing-error-rate)."
+        ),
+    )
+
+    parser.add_argument(
+        "--sam-filename",
+        metavar="FILE",
+        help=(
+            "Write the reads (see --fastq-filename) to this file as SAM, aligned "
+            "to the infecting genome at the place they were read from."
+        ),
+    )
+
+    parser.add_argument(
+        "--read-length",
+        metavar="N",
+        type=int,
+        default=150,
+        help="The length of sequencing reads.",
+    )
+
+    parser.add_argument(
+        "--read-depth",
+        metavar="N",
+        type=float,
+        default=1.0,
+        help=(
+            "The mean number of reads covering each site of each strand of each "
+            "molecule."
+        ),
+    )
+
+    parser.add_argument(
+        "--sequencing-error-rate",
+        metavar="N",
+        type=float,
+        default=0.0,
+        help="The per-base sequencing error rate.",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Record the wall and CPU time, number of calls, and throughput of "
+            "each phase of the simulation (making the genome and cells, "
+            "starting workers, replicating each cell, transferring cells to and "
+            "from worker processes, counting, and plotting). A table is printed "
+            "to standard error and the numbers are saved as JSON (see "
+            "--profile-filename)."
+        ),
+    )
+
+    parser.add_argument(
+        "--profile-filename",
+        metavar="FILE",
+        default="viral-rna-simulation-profile.json",
+        help="The file to save --profile results to.",
+    )
+
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help=(
+            "Report the projected memory needed before the run, the peak memory "
+            "allocated in each phase (as for --profile) and the peak resident "
+            "memory of the process so far at the end of each phase, and the "
+            "bytes used per Site, Genome, RNA and cell. The "
+            "report is printed to standard error. Tracing memory makes the "
+            "simulation run noticeably slower."
+        ),
+    )
+
+    parser.add_argument(
+        "--memory-budget",
+        metavar="BYTES",
+        type=parse_bytes,
+        help=(
+            "Refuse to run a simulation whose projected memory use is more than "
+            "this many bytes. A K, M, G or T suffix may be given (e.g., 8G). The "
+            "projection is an estimate, made by replicating one cell for a few "
+            "steps before the run. It is not made when resuming."
+        ),
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=(
+            "Do not use the result cache. Otherwise, the results of a run with a "
+            "--seed are cached (see --cache-directory), keyed by the simulation "
+            "options, the seed and the version of this package, and a later run "
+            "with the same options uses them instead of simulating again. The "
+            "cache is not used when resuming, checkpointing, profiling, or making "
+            "a memory report."
+        ),
+    )
+
+    parser.add_argument(
+        "--cache-directory",
+        metavar="DIR",
+        help=(
+            "The result cache directory. The default is viral-rna-simulation in "
+            "$XDG_CACHE_HOME (or ~/.cache)."
+        ),
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        metavar="BYTES",
+        type=parse_bytes,
+        default=DEFAULT_MAX_BYTES,
+        help=(
+            "The maximum total size of the result cache. When it is bigger, the "
+            "least recently used results are removed. A K, M, G or T suffix may "
+            "be given (e.g., 8G)."
+        ),
+    )
+
+    parser.add_argument(
+        "--cache-population",
+        action="store_true",
+        help=(
+            "Also cache all RNA molecules (as a checkpoint, see --checkpoint-every), "
+            "so that a later run that needs them (for --sequencing-depth, "
+            "--pileup-filename, --fastq-filename or --sam-filename) can use the "
+            "cache. Only the 'cells' --engine can cache its molecules. Needs "
+            "--seed."
+        ),
+    )
+
+    args = parser.parse_args()
+
+    if not (args.resume or args.genome or args.genome_length):
+        parser.error("one of --genome-length, --genome or --resume is required.")
+
+    if (
+        args.trajectory_filename or args.trajectory_plot_filename
+    ) and not args.trajectory_every:
+        parser.error(
+            "--trajectory-filename and --trajectory-plot-filename need "
+            "--trajectory-every."
+        )
+
+    if args.checkpoint_every and args.engine != "cells":
+        parser.error("--checkpoint-every can only be used with the 'cells' --engine.")
+
+    if args.checkpoint_filename and not args.checkpoint_every:
+        parser.error("--checkpoint-filename needs --checkpoint-every.")
+
+    if args.trajectory_every and args.engine == "arrays":
+        parser.error("--trajectory-every cannot be used with the 'arrays' --engine.")
+
+    if args.negative_propensity <= 0.0:
+        parser.error("--negative-propensity must be positive.")
+
+    if not (
+        0.0 <= args.positive_decay_rate <= 1.0
+        and 0.0 <= args.negative_decay_rate <= 1.0
+    ):
+        parser.error(
+            "--positive-decay-rate and --negative-decay-rate must be from 0 to 1."
+        )
+
+    if (args.positive_decay_rate or args.negative_decay_rate) and (
+        args.engine == "arrays" or args.rna_directory
+    ):
+        parser.error(
+            "--positive-decay-rate and --negative-decay-rate cannot be used with "
+            "the 'arrays' --engine or --rna-directory."
+        )
+
+    if args.max_rnas_per_cell is not None:
+        if args.max_rnas_per_cell < 2:
+            parser.error("--max-rnas-per-cell must be at least 2.")
+        if args.engine == "arrays" or args.rna_directory:
+            parser.error(
+                "--max-rnas-per-cell cannot be used with the 'arrays' --engine or "
+                "--rna-directory."
+            )
+        if args.pileup_filename:
+            parser.error(
+                "--max-rnas-per-cell cannot be used with --pileup-filename, "
+                "because a pileup of downsampled cells would only count the "
+                "molecules they kept."
+            )
+
+    if args.mutation_spectrum:
+        if args.engine == "arrays":
+            parser.error(
+                "--mutation-spectrum cannot be used with the 'arrays' --engine."
+            )
+        try:
+            read_spectrum(args.mutation_spectrum)
+        except (OSError, ValueError) as e:
+            parser.error(f"Could not read --mutation-spectrum: {e}")
+
+    if args.cache_population:
+        if args.engine != "cells":
+            parser.error(
+                "--cache-population can only be used with the 'cells' --engine."
+            )
+        if args.seed is None:
+            parser.error(
+                "--cache-population needs --seed, because only seeded runs are "
+                "cached."
+            )
+        if (
+            args.no_cache
+            or args.resume
+            or args.checkpoint_every
+            or args.profile
+            or args.memory_report
+        ):
+            parser.error(
+                "--cache-population cannot be used with --no-cache, --resume, "
+                "--checkpoint-every, --profile or --memory-report, because those "
+                "runs are not cached."
+            )
+
+    return args
 
 
 def main() -> None:
     args = parse_args()
-    cells = run(
-        args.cells,
-        args.genome,
-        args.genome_length,
-        args.mutate_in,
-        args.mutation_rate,
-        args.steps,
-        args.ratio,
-    )
 
-    print(cells.summary())
+    projected = None
+    if (args.memory_report or args.memory_budget) and not args.resume:
+        projected = project_memory(
+            args.cells,
+            args.genome,
+            args.genome_length,
+            args.mutate_in,
+            args.mutation_rate,
+            args.steps,
+            args.ratio,
+            delta=args.delta_genomes,
+            haplotypes=args.haplotypes,
+            engine=args.engine,
+            rna_directory=args.rna_directory,
+            positive_decay=args.positive_decay_rate,
+            negative_decay=args.negative_decay_rate,
+            max_rnas=args.max_rnas_per_cell,
+        )
+        if args.memory_budget and projected > args.memory_budget:
+            sys.exit(
+                f"The projected memory use ({format_bytes(projected)}) is more "
+                f"than the --memory-budget ({format_bytes(args.memory_budget)})."
+            )
+
+    if args.profile or args.memory_report:
+        profile = profiling.enable(memory=args.memory_report)
+
+    spectrum = read_spectrum(args.mutation_spectrum) if args.mutation_spectrum else None
+
+    cache = key = cells = None
+    if not (
+        args.no_cache
+        or args.seed is None
+        or args.resume
+        or args.checkpoint_every
+        or args.profile
+        or args.memory_report
+    ):
+        cache = ResultCache(args.cache_directory, args.cache_size)
+        key = cache_key({
+            "cells": args.cells,
+            "genome": args.genome,
+            "genome_length": args.genome_length,
+            "mutate_in": args.mutate_in,
+            "mutation_rate": args.mutation_rate,
+            "steps": args.steps,
+            "ratio": args.ratio,
+            "negative_propensity": args.negative_propensity,
+            "positive_decay": args.positive_decay_rate,
+            "negative_decay": args.negative_decay_rate,
+            "max_rnas": args.max_rnas_per_cell,
+            "mutation_spectrum": None if spectrum is None else spectrum.to_list(),
+            "delta": args.delta_genomes,
+            "haplotypes": args.haplotypes,
+            "engine": args.engine,
+            "seed": args.seed,
+            "record_every": args.trajectory_every,
+        })
+        cells = cache.get(
+            key,
+            population=bool(
+                args.sequencing_depth
+                or args.pileup_filename
+                or args.fastq_filename
+                or args.sam_filename
+            ),
+            check=args.check_counts,
+            rna_directory=args.rna_directory,
+        )
+
+    if cells is not None:
+        print(f"Using cached results from {cache.directory!r}.", file=sys.stderr)
+    elif args.resume:
+        cells = resume(
+            args.resume,
+            backend=args.backend,
+            check=args.check_counts,
+            checkpoint_every=args.checkpoint_every,
+            checkpoint_filename=args.checkpoint_filename,
+            rna_directory=args.rna_directory,
+            record_every=args.trajectory_every,
+        )
+    else:
+        cells = run(
+            args.cells,
+            args.genome,
+            args.genome_length,
+            args.mutate_in,
+            args.mutation_rate,
+            args.steps,
+            args.ratio,
+            delta=args.delta_genomes,
+            haplotypes=args.haplotypes,
+            engine=args.engine,
+            backend=args.backend,
+            check=args.check_counts,
+            seed=args.seed,
+            checkpoint_every=args.checkpoint_every,
+            checkpoint_filename=(
+                args.checkpoint_filename or "viral-rna-simulation-checkpoint.npz"
+            ),
+            rna_directory=args.rna_directory,
+            record_every=args.trajectory_every,
+            negative_propensity=args.negative_propensity,
+            positive_decay=args.positive_decay_rate,
+            negative_decay=args.negative_decay_rate,
+            max_rnas=args.max_rnas_per_cell,
+            mutation_spectrum=spectrum,
+        )
+        if cache is not None:
+            cache.put(key, cells, population=args.cache_population)
+
+    print(
+        cells.summary(
+            sequencing_depth=args.sequencing_depth,
+            # Use a random number stream independent of those of the simulation
+            # and of the reads.
+            seed=np.random.SeedSequence(args.seed, spawn_key=(3,)),
+        )
+    )
 
     if args.plot_filename:
         make_plot(cells, args.plot_filename)
+
+    if args.trajectory_filename:
+        cells.trajectory.frame().write_parquet(args.trajectory_filename)
+
+    if args.trajectory_plot_filename:
+        make_trajectory_plot(cells.trajectory, args.trajectory_plot_filename)
+
+    if args.pileup_filename:
+        with phase("write pileup"):
+            pileup_frame(cells.pileup(), cells.infecting_genome).write_parquet(
+                args.pileup_filename
+            )
+
+    if args.fastq_filename or args.sam_filename:
+        # Use a random number stream independent of those of the simulation
+        # (see simulate.run).
+        seed = np.random.SeedSequence(args.seed, spawn_key=(2,))
+        with phase("write reads"), ExitStack() as stack:
+            fastq, sam = (
+                stack.enter_context(open(filename, "wb")) if filename else None
+                for filename in (args.fastq_filename, args.sam_filename)
+            )
+            count = write_reads(
+                cells,
+                fastq,
+                sam,
+                read_length=args.read_length,
+                depth=args.read_depth,
+                error_rate=args.sequencing_error_rate,
+                seed=seed,
+            )
+        print(f"Wrote {count} reads.", file=sys.stderr)
+
+    if args.profile or args.memory_report:
+        profiling.disable()
+        print(profile.format(), file=sys.stderr)
+
+    if args.profile:
+        with open(args.profile_filename, "w") as fp:
+            json.dump(profile.to_dict(), fp, indent=2)
+            fp.write("\n")
+
+    if args.memory_report:
+        print(memory_report(cells, projected), file=sys.stderr)
+
+
+def parse_sweep_args() -> argparse.Namespace:
+    """
+    Make an argument parser for a parameter sweep and use it to parse the
+    command line.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run the viral RNA simulation for every combination of the given "
+            "parameter values (each a given number of times) over one pool of worker "
+            "processes, and write a TSV row of results for each run as it finishes."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--mutation-rate",
+        type=float,
+        nargs="+",
+        default=[0.001],
+        metavar="N",
+        help="The per-nucleotide mutation rates to simulate.",
+    )
+
+    parser.add_argument(
+        "--ratio",
+        type=int,
+        nargs="+",
+        default=[1],
+        metavar="N",
+        help="The numbers of (+) RNA molecules to make from each (-) molecule.",
+    )
+
+    parser.add_argument(
+        "--mutate-in",
+        nargs="+",
+        default=["both"],
+        choices=("both", "negative", "positive"),
+        help="The types of RNA molecules to allow mutations in.",
+    )
+
+    parser.add_argument(
+        "--genome-length",
+        type=int,
+        nargs="+",
+        default=[1000],
+        metavar="N",
+        help="The lengths of the (random) infecting genomes.",
+    )
+
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=1,
+        metavar="N",
+        help="The number of times to run each combination of parameter values.",
+    )
+
+    parser.add_argument(
+        "--cells",
+        type=int,
+        default=1,
+        metavar="N",
+        help="The number of cells to simulate in each run.",
+    )
+
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=1000,
+        metavar="N",
+        help="The number of replication steps to simulate in each run.",
+    )
+
+    parser.add_argument(
+        "--engine",
+        default="cells",
+        choices=("cells", "arrays"),
+        help="How to run each simulation. See viral-rna-simulation --help.",
+    )
+
+    parser.add_argument(
+        "--delta-genomes",
+        action="store_true",
+        help="Store each RNA genome as just its differences from the infecting genome.",
+    )
+
+    parser.add_argument(
+        "--haplotypes",
+        action="store_true",
+        help="Store identical RNA molecules in each cell just once.",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="The number of worker processes. The default is the number of CPUs.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        metavar="N",
+        help=(
+            "The random seed for the whole sweep. The seed of each run is given in "
+            "its output row, so any run can be repeated with viral-rna-simulation."
+        ),
+    )
+
+    parser.add_argument(
+        "--output",
+        help="The file to write the TSV results to. The default is standard output.",
+    )
+
+    return parser.parse_args()
+
+
+def sweep_main() -> None:
+    args = parse_sweep_args()
+    jobs = sweep_jobs(
+        mutation_rates=args.mutation_rate,
+        ratios=args.ratio,
+        mutate_ins=args.mutate_in,
+        genome_lengths=args.genome_length,
+        replicates=args.replicates,
+        seed=args.seed,
+    )
+    rows = sweep(
+        jobs,
+        n_cells=args.cells,
+        steps=args.steps,
+        delta=args.delta_genomes,
+        haplotypes=args.haplotypes,
+        engine=args.engine,
+        workers=args.workers,
+    )
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            write_rows(rows, fp)
+    else:
+        write_rows(rows, sys.stdout)
+
+
+def parse_benchmark_args() -> argparse.Namespace:
+    """
+    Make an argument parser for the benchmarks and use it to parse the command
+    line.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time the main parts of the viral RNA simulation over a range of genome "
+            "lengths, mutation rates and ratios, write the results as JSON, and "
+            "optionally compare them to earlier (baseline) results."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Only benchmark short genomes.",
+    )
+
+    parser.add_argument(
+        "--match",
+        metavar="STRING",
+        help=(
+            "Only run the benchmarks whose names (e.g., "
+            "'Genome.replicate[genome_length=1000,mutation_rate=0.01]') contain "
+            "STRING."
+        ),
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        metavar="N",
+        help="The number of times to time each benchmark. The best time is used.",
+    )
+
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="The file to write the JSON results to. The default is standard output.",
+    )
+
+    parser.add_argument(
+        "--compare",
+        metavar="FILE",
+        help=(
+            "A JSON results file to compare to. A table of the changes is printed to "
+            "standard error, and the exit status is 1 if any benchmark got slower."
+        ),
+    )
+
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        metavar="N",
+        help=(
+            "The fractional increase in time (compared to --compare) above which a "
+            "benchmark is considered to have got slower."
+        ),
+    )
+
+    return parser.parse_args()
+
+
+def benchmark_main() -> None:
+    args = parse_benchmark_args()
+    baseline = load(args.compare) if args.compare else None
+
+    def progress(key: str, seconds: float) -> None:
+        print(f"{key}: {seconds:.3g}s", file=sys.stderr)
+
+    results = run_benchmarks(
+        quick=args.quick, match=args.match, repeat=args.repeat, progress=progress
+    )
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+            fp.write("\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if baseline:
+        comparison = compare(baseline, results, args.threshold)
+        print(format_comparison(baseline, results, comparison), file=sys.stderr)
+        if any(status == "slower" for *_, status in comparison):
+            sys.exit(1)
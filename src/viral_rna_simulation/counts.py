@@ -0,0 +1,208 @@
+from collections import Counter
+
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.utils import BASES, rc1
+
+
+# The names of the totals of a Counts instance (see Counts.totals).
+TOTALS = (
+    "positive_rnas",
+    "negative_rnas",
+    "positive_replications",
+    "negative_replications",
+    "positive_mutations",
+    "negative_mutations",
+    "from_positive",
+    "from_negative",
+)
+
+
+def _subtract(counter: Counter[str], change: str, count: int) -> None:
+    """
+    Subtract from a count, removing it if it falls to zero (so that counters
+    compare equal to those that never had it).
+    """
+    remaining = counter[change] - count
+    assert remaining >= 0
+    if remaining:
+        counter[change] = remaining
+    else:
+        del counter[change]
+
+
+class Counts:
+    """
+    Running totals of the (+/-) RNA molecules in one or more cells, of their
+    replications, and of their actual and apparent mutations. These are kept up
+    to date as RNA molecules are added, so they never need to be found by
+    looking at every molecule.
+    """
+
+    def __init__(self) -> None:
+        self.positive_rnas = self.negative_rnas = 0
+        self.positive_replications = self.negative_replications = 0
+        self.positive_mutations: Counter[str] = Counter()
+        self.negative_mutations: Counter[str] = Counter()
+        self.from_positive: Counter[str] = Counter()
+        self.from_negative: Counter[str] = Counter()
+
+    def __eq__(self, other: object, /) -> bool:
+        if isinstance(other, Counts):
+            return vars(self) == vars(other)
+        return NotImplemented
+
+    def __iadd__(self, other: "Counts") -> "Counts":
+        self.positive_rnas += other.positive_rnas
+        self.negative_rnas += other.negative_rnas
+        self.positive_replications += other.positive_replications
+        self.negative_replications += other.negative_replications
+        self.positive_mutations += other.positive_mutations
+        self.negative_mutations += other.negative_mutations
+        self.from_positive += other.from_positive
+        self.from_negative += other.from_negative
+        return self
+
+    def __repr__(self) -> str:
+        return "<Counts " + ", ".join(f"{k}={v}" for k, v in vars(self).items()) + ">"
+
+    def totals(self) -> tuple[int, ...]:
+        """
+        Get the current totals, in the order of TOTALS. The mutation totals are
+        the number of all actual or apparent changes.
+        """
+        return (
+            self.positive_rnas,
+            self.negative_rnas,
+            self.positive_replications,
+            self.negative_replications,
+            self.positive_mutations.total(),
+            self.negative_mutations.total(),
+            self.from_positive.total(),
+            self.from_negative.total(),
+        )
+
+    def add_rna(self, rna: RNA, infecting_genome: Genome, count: int = 1) -> None:
+        """
+        Add RNA molecules.
+
+        @param rna: The RNA to add. Its replications are added once (they are the
+            total for all of its molecules if it stands for a haplotype).
+        @param infecting_genome: The (+) genome of the infecting virus, used to
+            find the apparent mutations.
+        @param count: The number of molecules with the genome of 'rna'.
+        """
+        if rna.positive:
+            self.positive_rnas += count
+            self.positive_replications += rna.replications
+            apparent = self.from_positive
+        else:
+            self.negative_rnas += count
+            self.negative_replications += rna.replications
+            apparent = self.from_negative
+
+        genome = rna.genome
+        for offset in genome.mutant:
+            change, positive = genome.history[offset][-1]
+            mutations = self.positive_mutations if positive else self.negative_mutations
+            mutations[change] += count
+
+        changes, _ = rna.sequencing_mutation_counts(
+            infecting_genome, find_sources=False
+        )
+        for change, n in changes.items():
+            apparent[change] += n * count
+
+    def remove_rna(
+        self, rna: RNA, infecting_genome: Genome, count: int = 1
+    ) -> None:
+        """
+        Remove RNA molecules (e.g., that have degraded). Their replications
+        still happened, so they are not removed.
+
+        @param rna: The RNA to remove.
+        @param infecting_genome: The (+) genome of the infecting virus, used to
+            find the apparent mutations.
+        @param count: The number of molecules with the genome of 'rna'.
+        """
+        if rna.positive:
+            self.positive_rnas -= count
+            apparent = self.from_positive
+        else:
+            self.negative_rnas -= count
+            apparent = self.from_negative
+
+        genome = rna.genome
+        for offset in genome.mutant:
+            change, positive = genome.history[offset][-1]
+            mutations = self.positive_mutations if positive else self.negative_mutations
+            _subtract(mutations, change, count)
+
+        changes, _ = rna.sequencing_mutation_counts(
+            infecting_genome, find_sources=False
+        )
+        for change, n in changes.items():
+            _subtract(apparent, change, n * count)
+
+    def add_copies(
+        self, parent: RNA, copies: list[RNA], infecting_genome: Genome
+    ) -> None:
+        """
+        Add new RNA molecules copied from the same parent (e.g., by one call to
+        RNA.replicate), without finding the apparent mutations of each copy.
+
+        Read in (+) sense, each copy is the same as its parent except at the
+        sites it mutated, so the apparent mutations of the parent are found
+        once and only changed at those sites.
+
+        @param parent: The RNA that was copied.
+        @param copies: The new RNA molecules, all of the same sense.
+        @param infecting_genome: The (+) genome of the infecting virus, used to
+            find the apparent mutations.
+        """
+        if not copies:
+            return
+
+        positive = copies[0].positive
+        if positive:
+            self.positive_rnas += len(copies)
+            apparent = self.from_positive
+        else:
+            self.negative_rnas += len(copies)
+            apparent = self.from_negative
+
+        changes, _ = parent.sequencing_mutation_counts(
+            infecting_genome, find_sources=False
+        )
+        for change, n in changes.items():
+            apparent[change] += n * len(copies)
+
+        last = len(infecting_genome) - 1
+        mutations = self.positive_mutations if positive else self.negative_mutations
+        for copy in copies:
+            genome = copy.genome
+            for offset in genome.mutant:
+                change = genome.history[offset][-1][0]
+                mutations[change] += 1
+                # Find the (+) sense offset and the bases before and after the
+                # mutation. Delta genome offsets are already (+) offsets.
+                if positive:
+                    old, new = change
+                else:
+                    old, new = rc1(change[0]), rc1(change[1])
+                    if not isinstance(genome, DeltaGenome):
+                        offset = last - offset
+                reference = BASES[infecting_genome.bases[offset]]
+                if old != reference:
+                    _subtract(apparent, reference + old, 1)
+                if new != reference:
+                    apparent[reference + new] += 1
+
+    def add_replications(self, positive: bool, count: int = 1) -> None:
+        """
+        Add replications of (+) or (-) RNA molecules.
+        """
+        if positive:
+            self.positive_replications += count
+        else:
+            self.negative_replications += count
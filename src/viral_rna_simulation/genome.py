@@ -1,26 +1,178 @@
-from random import choice
-from typing import Iterator
+from typing import Hashable, Iterator
 from collections import Counter, defaultdict
+from math import sqrt
+
+import numpy as np
 
 from viral_rna_simulation.site import Site
-from viral_rna_simulation.utils import mutations_str
+from viral_rna_simulation.spectrum import SpectrumIndex
+from viral_rna_simulation.utils import (
+    BASES,
+    CODES,
+    RNG,
+    decode,
+    encode,
+    mutate_base,
+    mutations_str,
+    rc_codes,
+)
+
+# The type of the mutation history of a genome site. See the Site class.
+History = tuple[tuple[str, bool], ...]
+
+
+def mutation_offsets(
+    length: int, mutation_rate: float, rng: np.random.Generator | None = None
+) -> list[int]:
+    """
+    Choose the offsets of the sites to mutate when copying a genome.
+
+    Rather than making a random draw for every site, the gaps between
+    successive mutated sites are drawn from a geometric distribution. This
+    gives exactly the same distribution as an independent per-site test, but
+    needs only about length * mutation_rate random numbers.
+
+    @param length: The genome length.
+    @param mutation_rate: The per-base mutation probability. A rate of more
+        than one is taken to be one (i.e., every site is mutated).
+    @param rng: The random number generator to use.
+    @return: A list of offsets, in increasing order.
+    """
+    if mutation_rate <= 0.0:
+        return []
+
+    rng = RNG if rng is None else rng
+    mutation_rate = min(mutation_rate, 1.0)
+
+    # Draw gaps in batches big enough to (usually) get past the end of the
+    # genome in one go.
+    expected = length * mutation_rate
+    batch = int(expected + 4.0 * sqrt(expected)) + 1
+    offsets = []
+    offset = -1
+
+    while offset < length:
+        positions = offset + np.cumsum(rng.geometric(mutation_rate, batch))
+        offset = int(positions[-1])
+        offsets.extend(positions[positions < length].tolist())
+
+    return offsets
+
+
+def copy_mutation_offsets(
+    length: int,
+    count: int,
+    mutation_rate: float,
+    rng: np.random.Generator | None = None,
+) -> list[list[int]]:
+    """
+    Choose the offsets of the sites to mutate when making several copies of a
+    genome.
+
+    The copies are treated as though they were laid end to end, so the mutated
+    sites of all of them are chosen with one call to mutation_offsets. This
+    gives the same distribution as choosing them for each copy separately.
+
+    @param length: The genome length.
+    @param count: The number of copies.
+    @param mutation_rate: The per-base mutation probability.
+    @param rng: The random number generator to use.
+    @return: A list with a list of offsets (in increasing order) for each copy.
+    """
+    copies: list[list[int]] = [[] for _ in range(count)]
+    for offset in mutation_offsets(length * count, mutation_rate, rng):
+        copies[offset // length].append(offset % length)
+    return copies
+
+
+def sample_copy_offsets(
+    length: int, counts: np.ndarray, rng: np.random.Generator | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Choose distinct genome offsets uniformly at random for each of several
+    copies of a genome, all at once.
+
+    The offsets of all copies are drawn together, each identified by the key
+    'copy * length + offset', and those drawn more than once for a copy are
+    drawn again until every copy has as many as it needs. A copy that needs
+    every offset is given them without drawing.
+
+    @param length: The genome length.
+    @param counts: An int array with the number of offsets to choose for each
+        copy. None may exceed length.
+    @param rng: The random number generator to use.
+    @return: A 2-tuple with int arrays of the copy (an index into 'counts')
+        and the offset of each chosen site, sorted by copy and then by offset.
+    """
+    rng = RNG if rng is None else rng
+    counts = np.asarray(counts, dtype=np.int64)
+    copies = np.arange(len(counts))
+    full = counts == length
+    keys = (copies[full, np.newaxis] * length + np.arange(length)).ravel()
+    missing = np.where(full, 0, counts)
+
+    while missing.any():
+        drawn = np.repeat(copies, missing)
+        drawn = drawn * length + rng.integers(length, size=len(drawn))
+        keys = np.sort(np.concatenate((keys, drawn)))
+        # Drop the keys drawn more than once, and draw that many again.
+        repeated = keys[1:] == keys[:-1]
+        missing = np.bincount(keys[1:][repeated] // length, minlength=len(counts))
+        keys = keys[np.concatenate(([True], ~repeated))]
+
+    return keys // length, keys % length
 
 
 class Genome:
+    """
+    A genome, held as an array of base codes (see utils.BASES) together with
+    a sparse side-table of the (typically few) sites that have a mutation
+    history. Site instances are only made when a genome is iterated or indexed.
+
+    @param sites: The genome sites, given as a list of Site instances, a string
+        of nucleotides, or an array of base codes.
+    @param length: The length of a random genome to make if no sites are given.
+    @param positive: True if the genome is (+) sense.
+    @param history: A dict mapping genome offsets to the mutation history (a
+        tuple of (change, positive) 2-tuples) of the site at that offset.
+    @param mutant: The offsets of sites that were created by a mutation (in
+        which case the detail of the mutation is in history[offset][-1]).
+    @param rng: The random number generator to use to make a random genome.
+    """
+
     def __init__(
         self,
-        sites: list[Site] | str | None = None,
+        sites: list[Site] | str | np.ndarray | None = None,
         length: int = 0,
         positive: bool = True,
+        history: dict[int, History] | None = None,
+        mutant: frozenset[int] | None = None,
+        rng: np.random.Generator | None = None,
     ) -> None:
-        if sites:
-            if isinstance(sites, list):
-                self.sites = sites
-            else:
-                assert isinstance(sites, str)
-                self.sites = [Site(base) for base in sites]
+        if isinstance(sites, np.ndarray) and len(sites):
+            self.bases = sites
+            self.history = history or {}
+            self.mutant = mutant or frozenset()
+        elif isinstance(sites, list) and sites:
+            self.bases = np.array([CODES[site.base] for site in sites], dtype=np.uint8)
+            self.history = {
+                offset: tuple(site.mutation_history)
+                for offset, site in enumerate(sites)
+                if site.mutation_history
+            }
+            self.mutant = frozenset(
+                offset for offset, site in enumerate(sites) if site.mutant
+            )
+        elif isinstance(sites, str) and sites:
+            self.bases = encode(sites)
+            self.history = {}
+            self.mutant = frozenset()
         elif length:
-            self.sites = [Site(choice("ACGT")) for _ in range(length)]
+            self.bases = (RNG if rng is None else rng).integers(
+                0, len(BASES), length, dtype=np.uint8
+            )
+            self.history = {}
+            self.mutant = frozenset()
         else:
             raise ValueError(
                 "You must provide either the genome sites or a non-zero genome length."
@@ -28,23 +180,29 @@ class Genome:
         self.positive = positive
 
     def __iter__(self) -> Iterator[Site]:
-        return iter(self.sites)
+        return (self[offset] for offset in range(len(self)))
 
     def __len__(self) -> int:
-        return len(self.sites)
+        return len(self.bases)
 
-    def __getitem__(self, offset) -> Site:
-        return self.sites[offset]
+    def __getitem__(self, offset: int) -> Site:
+        if offset < 0:
+            offset += len(self)
+        return Site(
+            BASES[self.bases[offset]],
+            mutant=offset in self.mutant,
+            mutation_history=list(self.history.get(offset, ())),
+        )
 
     def __eq__(self, other: object, /) -> bool:
         if isinstance(other, Genome):
-            return self.positive == other.positive and all(
-                a == b for (a, b) in zip(self.sites, other.sites)
+            return self.positive == other.positive and np.array_equal(
+                self.bases, other.bases
             )
         return NotImplemented
 
     def __str__(self) -> str:
-        return "".join(site.base for site in self)
+        return decode(self.bases)
 
     def __repr__(self) -> str:
         positive = "+" if self.positive else "-"
@@ -53,21 +211,101 @@ class Genome:
             + [f"  {site}" for site in self]
         )
 
-    def replicate(self, mutation_rate: float = 0.0) -> "Genome":
+    @property
+    def sites(self) -> list[Site]:
+        """
+        Get the genome as a list of sites. This is only intended for display.
+        """
+        return list(self)
+
+    def _flipped_history(self) -> dict[int, History]:
+        """
+        Get the mutation history side-table with offsets as they will be in the
+        reverse complement of this genome.
+        """
+        last = len(self) - 1
+        return {last - offset: history for offset, history in self.history.items()}
+
+    def replicate(
+        self,
+        mutation_rate: "float | SpectrumIndex" = 0.0,
+        rng: np.random.Generator | None = None,
+        count: int | None = None,
+    ) -> "Genome | list[Genome]":
         """
         Copy the new genome (reverse complemented), possibly with mutations.
+
+        The reverse complement is made once, and shared by all the copies. Each
+        mutated copy gets its own copy of it, with its mutations laid on top.
+        Copies without mutations share its base array and history, so these
+        must not be modified in place.
+
+        @param mutation_rate: The per-base mutation probability, or a
+            SpectrumIndex (of the genome this one descends from) to use
+            context-dependent rates and substitutions.
+        @param rng: The random number generator to use.
+        @param count: If not None, the number of copies to make.
+        @return: The new genome or, if 'count' is not None, a list of them.
         """
         positive = not self.positive
-        sites = [site.replicate(positive, mutation_rate) for site in reversed(self)]
+        template = rc_codes(self.bases)
+        template_history = self._flipped_history()
+        copies = []
+
+        if isinstance(mutation_rate, SpectrumIndex):
+            # Only sites with a mutation history can differ from the indexed
+            # genome.
+            mutants = mutation_rate.mutations(
+                positive,
+                template_history,
+                template.__getitem__,
+                1 if count is None else count,
+                rng,
+            )
+        else:
+            mutants = copy_mutation_offsets(
+                len(template), 1 if count is None else count, mutation_rate, rng
+            )
+
+        for mutant in mutants:
+            if not mutant:
+                copies.append(
+                    Genome(template, positive=positive, history=template_history)
+                )
+                continue
+
+            bases = template.copy()
+            history = template_history.copy()
+            for offset in mutant:
+                rc_base = BASES[bases[offset]]
+                new_base = (
+                    BASES[mutant[offset]]
+                    if isinstance(mutant, dict)
+                    else mutate_base(rc_base, rng)
+                )
+                bases[offset] = CODES[new_base]
+                # Or: change = self.base + new_base (depends on what we're saying
+                # changed). See Site.replicate.
+                history[offset] = history.get(offset, ()) + (
+                    (rc_base + new_base, positive),
+                )
+
+            copies.append(
+                Genome(
+                    bases, positive=positive, history=history, mutant=frozenset(mutant)
+                )
+            )
 
-        return Genome(sites, positive=positive)
+        return copies[0] if count is None else copies
 
     def rc(self) -> "Genome":
         """
         Get a reverse-complemented copy of this genome.
         """
         return Genome(
-            [site.rc() for site in reversed(self)], positive=not self.positive
+            rc_codes(self.bases),
+            positive=not self.positive,
+            history=self._flipped_history(),
         )
 
     def mutations(self) -> Counter:
@@ -75,13 +313,242 @@ class Genome:
         Get the mutations that have occurred in this genome.
         """
         mutations = Counter()
-        for site in self:
-            if site.mutant:
-                change, _ = site.mutation_history[-1]
-                mutations[change] += 1
+        for offset in self.mutant:
+            change, _ = self.history[offset][-1]
+            mutations[change] += 1
 
         return mutations
 
+    def key(self) -> Hashable:
+        """
+        Get a hashable key that is equal for genomes with the same sense, bases,
+        mutation history and mutant sites.
+        """
+        return (
+            self.positive,
+            self.bases.tobytes(),
+            frozenset(self.history.items()),
+            self.mutant,
+        )
+
+    def differences(self, reference: "Genome") -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find where this (+) genome differs from a (+) reference genome.
+
+        @param reference: The (+) genome to compare to.
+        @return: A 2-tuple with an array of the offsets of the differing sites and
+            an array of the base codes of this genome at those offsets.
+        """
+        assert self.positive and reference.positive
+        offsets = np.flatnonzero(reference.bases != self.bases)
+        return offsets, self.bases[offsets]
+
+
+class DeltaGenome(Genome):
+    """
+    A copy-on-write genome that only stores its differences from a reference
+    (i.e., infecting) genome. The full sequence is only built when needed.
+
+    All offsets used as keys here are offsets into the (+) reference genome,
+    and all base codes in 'changes' are (+) sense, so the reverse complement
+    of a delta genome can share its changes and history with it. Because all
+    copies of a genome are made by reverse complementing, a copy with no new
+    mutations also shares the changes and history of the genome it was copied
+    from. These dicts must therefore never be modified in place.
+
+    @param reference: The (+) reference genome.
+    @param positive: True if the genome is (+) sense.
+    @param changes: A dict mapping reference offsets to (+) sense base codes
+        for the sites that have been mutated.
+    @param history: A dict mapping reference offsets to the mutation history of
+        the site at that offset.
+    @param mutant: The reference offsets of sites that were created by a mutation.
+    """
+
+    def __init__(
+        self,
+        reference: Genome,
+        positive: bool = True,
+        changes: dict[int, int] | None = None,
+        history: dict[int, History] | None = None,
+        mutant: frozenset[int] | None = None,
+    ) -> None:
+        assert reference.positive
+        self.reference = reference
+        self.positive = positive
+        self.changes = {} if changes is None else changes
+        self.history = {} if history is None else history
+        self.mutant = mutant or frozenset()
+
+    def __len__(self) -> int:
+        return len(self.reference)
+
+    def __getitem__(self, offset: int) -> Site:
+        if offset < 0:
+            offset += len(self)
+        if not self.positive:
+            offset = len(self) - 1 - offset
+        base = self.changes.get(offset, self.reference.bases[offset])
+        return Site(
+            BASES[base if self.positive else 3 - base],
+            mutant=offset in self.mutant,
+            mutation_history=list(self.history.get(offset, ())),
+        )
+
+    @property
+    def bases(self) -> np.ndarray:
+        """
+        Build the (own sense) array of base codes of this genome.
+        """
+        bases = self.reference.bases.copy()
+        if self.changes:
+            bases[list(self.changes)] = list(self.changes.values())
+        return bases if self.positive else rc_codes(bases)
+
+    def codes(self, offsets: np.ndarray) -> np.ndarray:
+        """
+        Look up the (own sense) base codes at some offsets, without building the
+        whole array (see 'bases').
+
+        @param offsets: An int array of offsets into this genome.
+        @return: A new array with the base codes at the offsets.
+        """
+        offsets = np.asarray(offsets)
+        if not self.positive:
+            offsets = len(self) - 1 - offsets
+        codes = self.reference.bases[offsets]
+        for index, offset in enumerate(offsets.tolist()):
+            code = self.changes.get(offset)
+            if code is not None:
+                codes[index] = code
+        return codes if self.positive else 3 - codes
+
+    def replicate(
+        self,
+        mutation_rate: "float | SpectrumIndex" = 0.0,
+        rng: np.random.Generator | None = None,
+        count: int | None = None,
+    ) -> "DeltaGenome | list[DeltaGenome]":
+        """
+        Copy the new genome (reverse complemented), possibly with mutations.
+
+        @param mutation_rate: The per-base mutation probability, or a
+            SpectrumIndex (of the reference genome) to use context-dependent
+            rates and substitutions.
+        @param rng: The random number generator to use.
+        @param count: If not None, the number of copies to make.
+        @return: The new genome or, if 'count' is not None, a list of them.
+        """
+        n_copies = 1 if count is None else count
+
+        if isinstance(mutation_rate, SpectrumIndex):
+            # Only changed sites can differ from the reference. The bases of the
+            # copies are only needed (to find the contexts of sites next to
+            # these) if there are any, and are looked up just at those sites.
+            positive = not self.positive
+            last = len(self) - 1
+            mutants = mutation_rate.mutations(
+                positive,
+                [offset if positive else last - offset for offset in self.changes],
+                self.rc().codes if self.changes else None,
+                n_copies,
+                rng,
+            )
+        else:
+            mutants = copy_mutation_offsets(len(self), n_copies, mutation_rate, rng)
+
+        copies = [self.mutated_copy(offsets, rng) for offsets in mutants]
+        return copies[0] if count is None else copies
+
+    def mutated_copy(
+        self,
+        offsets: list[int] | dict[int, int],
+        rng: np.random.Generator | None = None,
+    ) -> "DeltaGenome":
+        """
+        Copy the new genome (reverse complemented), with mutations at the given
+        offsets.
+
+        @param offsets: The distinct offsets (in the new genome) of the sites to
+            mutate, or a dict mapping them to the codes of their new bases.
+        @param rng: The random number generator to use to choose the new bases
+            (if they are not given).
+        """
+        positive = not self.positive
+
+        if not offsets:
+            return DeltaGenome(self.reference, positive, self.changes, self.history)
+
+        changes = self.changes.copy()
+        history = self.history.copy()
+        last = len(self) - 1
+        mutant = []
+
+        for new_offset in offsets:
+            # Convert the offset in the new genome to a reference offset.
+            offset = new_offset if positive else last - new_offset
+            base = changes.get(offset, self.reference.bases[offset])
+            rc_base = BASES[base if positive else 3 - base]
+            new_base = (
+                BASES[offsets[new_offset]]
+                if isinstance(offsets, dict)
+                else mutate_base(rc_base, rng)
+            )
+            new_code = CODES[new_base]
+            changes[offset] = new_code if positive else 3 - new_code
+            history[offset] = history.get(offset, ()) + (
+                (rc_base + new_base, positive),
+            )
+            mutant.append(offset)
+
+        return DeltaGenome(
+            self.reference, positive, changes, history, frozenset(mutant)
+        )
+
+    def rc(self) -> "DeltaGenome":
+        """
+        Get a reverse-complemented copy of this genome.
+        """
+        return DeltaGenome(
+            self.reference, not self.positive, self.changes, self.history
+        )
+
+    def key(self) -> Hashable:
+        """
+        Get a hashable key that is equal for delta genomes (of the same
+        reference) with the same sense, changes, mutation history and mutant
+        sites.
+        """
+        return (
+            self.positive,
+            frozenset(self.changes.items()),
+            frozenset(self.history.items()),
+            self.mutant,
+        )
+
+    def differences(self, reference: Genome) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find where this (+) genome differs from a (+) reference genome, reading
+        the changes directly if the reference is the one this genome is relative
+        to.
+
+        @param reference: The (+) genome to compare to.
+        @return: A 2-tuple with an array of the offsets of the differing sites and
+            an array of the base codes of this genome at those offsets.
+        """
+        if reference is not self.reference:
+            return super().differences(reference)
+
+        assert self.positive
+        offsets = np.fromiter(
+            sorted(self.changes), dtype=np.intp, count=len(self.changes)
+        )
+        bases = np.array(
+            [self.changes[offset] for offset in offsets.tolist()], dtype=np.uint8
+        )
+        different = reference.bases[offsets] != bases
+        return offsets[different], bases[different]
+
 
 def genomes_str(
     genome_1: Genome,
@@ -91,8 +558,8 @@ def genomes_str(
     differences_title: str = "Differences: ",
     mutations_title: str | None = None,
 ) -> str:
-    s_1 = "".join(site.base for site in genome_1)
-    s_2 = "".join(site.base for site in genome_2)
+    s_1 = str(genome_1)
+    s_2 = str(genome_2)
 
     mutations = defaultdict(int)
 
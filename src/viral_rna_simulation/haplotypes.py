@@ -0,0 +1,122 @@
+from typing import Hashable, Iterable, Iterator
+
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.selection import Selection
+
+
+class Haplotypes:
+    """
+    Hold a population of RNA molecules as one RNA per distinct (strand, genome)
+    together with the number of molecules that have it. The 'replications'
+    attribute of each stored RNA is the total for all of its molecules.
+
+    Instances act as a read-only sequence of molecules (i.e., each RNA appears
+    as many times as its count) so choosing a random index (as done by
+    Cell.replicate_rnas) or using 'random.choice' picks a distinct RNA with
+    probability proportional to its count. The counts are kept in a Selection,
+    so finding the RNA at an offset takes O(log n) time, even as molecules are
+    added.
+    """
+
+    def __init__(self, rnas: Iterable[RNA] = ()) -> None:
+        self.rnas: list[RNA] = []
+        self.counts: list[int] = []
+        self._index: dict[Hashable, int] = {}
+        self._total = 0
+        self._selection = Selection()
+        self.extend(rnas)
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self) -> Iterator[RNA]:
+        for rna, count in zip(self.rnas, self.counts):
+            for _ in range(count):
+                yield rna
+
+    def __getitem__(self, offset: int) -> RNA:
+        if offset < 0:
+            offset += self._total
+        if not 0 <= offset < self._total:
+            raise IndexError(offset)
+        return self.rnas[self._selection.find(offset)]
+
+    def find(self, offset: int) -> int:
+        """
+        Find the distinct RNA of a molecule.
+
+        @param offset: The offset of the molecule (as in indexing).
+        @return: The index (in self.rnas) of the distinct RNA of the molecule.
+        """
+        return self._selection.find(offset)
+
+    def append(self, rna: RNA, count: int = 1) -> int:
+        """
+        Add molecules with the genome of a given RNA to the population.
+
+        @param rna: The RNA to add.
+        @param count: The number of molecules to add.
+        @return: The index (in self.rnas) of the distinct RNA the molecules
+            were added to.
+        """
+        key = rna.genome.key()
+        index = self._index.get(key)
+
+        if index is None:
+            index = len(self.rnas)
+            self._index[key] = index
+            self.rnas.append(rna)
+            self.counts.append(count)
+            self._selection.append(count)
+        else:
+            self.rnas[index].replications += rna.replications
+            self.counts[index] += count
+            self._selection.update(index, self.counts[index])
+
+        self._total += count
+        return index
+
+    def remove(self, index: int, count: int = 1) -> bool:
+        """
+        Remove molecules (e.g., that have degraded) of a distinct RNA. If none
+        of its molecules are left, the distinct RNA is removed too, and the
+        last distinct RNA is moved into its place, so removal never shifts the
+        others.
+
+        @param index: The index (in self.rnas) of the distinct RNA.
+        @param count: The number of its molecules to remove.
+        @return: True if the distinct RNA was removed.
+        """
+        assert 0 < count <= self.counts[index]
+        self.counts[index] -= count
+        self._total -= count
+        if self.counts[index]:
+            self._selection.update(index, self.counts[index])
+            return False
+
+        del self._index[self.rnas[index].genome.key()]
+        last = len(self.rnas) - 1
+        if index != last:
+            moved = self.rnas[last]
+            self.rnas[index] = moved
+            self.counts[index] = self.counts[last]
+            self._index[moved.genome.key()] = index
+        self.rnas.pop()
+        self.counts.pop()
+        self._selection.swap_remove(index)
+        return True
+
+    def extend(self, rnas: Iterable[RNA]) -> None:
+        """
+        Add RNA molecules to the population.
+
+        @param rnas: An iterable of RNA instances, each of which is one molecule.
+        """
+        for rna in rnas:
+            self.append(rna)
+
+    def items(self) -> Iterator[tuple[RNA, int]]:
+        """
+        Get each distinct RNA together with its number of molecules.
+        """
+        return zip(self.rnas, self.counts)
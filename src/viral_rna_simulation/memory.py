@@ -0,0 +1,276 @@
+import re
+import sys
+from itertools import islice
+
+import numpy as np
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.resident_cells import ResidentCells
+
+# The number of replication steps of the pilot run used to estimate the memory
+# needed per RNA molecule.
+PILOT_STEPS = 200
+
+# The maximum number of RNA molecules to measure to find the mean size of an RNA
+# and its genome.
+SAMPLE = 1000
+
+UNITS = "KMGT"
+
+
+def parse_bytes(value: str) -> int:
+    """
+    Parse a number of bytes, with an optional K, M, G or T (powers of 1024)
+    suffix, e.g., '512M' or '8G'.
+
+    @raise ValueError: If the value cannot be parsed.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?\s*", value.upper())
+    if not match:
+        raise ValueError(f"Could not parse {value!r} as a number of bytes.")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** (UNITS.index(unit) + 1 if unit else 0))
+
+
+def format_bytes(size: float) -> str:
+    """
+    Format a number of bytes for people, e.g., '1.5 MiB'.
+    """
+    if size < 1024:
+        return f"{size:.0f} B"
+    for unit in UNITS:
+        size /= 1024
+        if size < 1024 or unit == UNITS[-1]:
+            break
+    return f"{size:.1f} {unit}iB"
+
+
+def deep_size(obj: object, seen: set[int] | None = None) -> int:
+    """
+    Estimate the memory used by an object and everything it refers to, by
+    adding up the sys.getsizeof sizes of all the objects reachable from it.
+    Each object is only counted once, so objects shared by (e.g.) many genomes
+    are not counted again. The data of memory-mapped arrays is not counted.
+
+    @param obj: The object to measure.
+    @param seen: The ids of objects already counted (and so not to be counted
+        again). This is updated.
+    @return: The estimated number of bytes.
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, np.ndarray):
+            # The size of an array that owns its data includes that data. A view
+            # is counted as the data it exposes (unless it is of a file map),
+            # not as the (perhaps much larger) array it is a view of.
+            if obj.base is not None and not isinstance(obj, np.memmap):
+                size += obj.nbytes
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+
+    return size
+
+
+def expected_molecules(
+    steps: int,
+    ratio: int,
+    positive_decay: float = 0.0,
+    negative_decay: float = 0.0,
+    max_rnas: int | None = None,
+) -> float:
+    """
+    Estimate the largest number of RNA molecules a cell will have during a
+    number of replication steps, starting from a single (+) molecule, by
+    following the expected numbers of (+) and (-) molecules.
+
+    @param steps: The number of replication steps.
+    @param ratio: The number of (+) molecules made from each (-) molecule.
+    @param positive_decay: The probability that each (+) molecule degrades
+        in a step.
+    @param negative_decay: The probability that each (-) molecule degrades
+        in a step.
+    @param max_rnas: If not None, the carrying capacity of the cell. A cell
+        that reaches it is downsampled to half of it, as in Cell.replicate_rnas.
+    """
+    positive, negative = 1.0, 0.0
+    peak = 1.0
+    for _ in range(steps):
+        total = positive + negative
+        if total <= 0.0:
+            break
+        positive, negative = (
+            (positive + ratio * negative / total) * (1.0 - positive_decay),
+            (negative + positive / total) * (1.0 - negative_decay),
+        )
+        total = positive + negative
+        if max_rnas and total >= max_rnas:
+            peak = max(peak, float(max_rnas))
+            positive *= max_rnas // 2 / total
+            negative *= max_rnas // 2 / total
+        else:
+            peak = max(peak, total)
+    return peak
+
+
+def project_memory(
+    n_cells: int,
+    genome: str | None,
+    genome_length: int,
+    mutate_in: str,
+    mutation_rate: float,
+    steps: int,
+    ratio: int,
+    delta: bool = False,
+    haplotypes: bool = False,
+    engine: str = "cells",
+    rna_directory: str | None = None,
+    positive_decay: float = 0.0,
+    negative_decay: float = 0.0,
+    max_rnas: int | None = None,
+) -> int:
+    """
+    Estimate the memory a simulation will need, before running it.
+
+    A single cell is replicated for a few steps (see PILOT_STEPS) to measure the
+    memory used per RNA molecule, which is multiplied by the expected number of
+    molecules (see 'expected_molecules') in all cells, which allows for decay
+    and the carrying capacity ('max_rnas') of the cells. Genomes collect more
+    mutations as a simulation goes on, so this is an estimate, not a bound.
+    With the 'resident' engine, the memory is spread over the worker processes.
+
+    The arguments are as for simulate.run.
+
+    @return: The estimated number of bytes.
+    """
+    infecting_genome = Genome(genome, genome_length, rng=np.random.default_rng(0))
+    pilot_steps = min(steps, PILOT_STEPS)
+
+    if engine == "arrays":
+        cells = ArrayCells(1, infecting_genome, seed=0)
+    else:
+        cells = Cells(
+            1,
+            infecting_genome,
+            delta=delta,
+            haplotypes=haplotypes,
+            seed=0,
+            rna_directory=rna_directory,
+        )
+
+    cells.replicate(
+        steps=pilot_steps,
+        mutate_in=mutate_in,
+        mutation_rate=mutation_rate,
+        ratio=ratio,
+        backend="serial",
+    )
+
+    # Do not count the (shared) infecting genome as part of the cells.
+    seen = set()
+    genome_size = deep_size(infecting_genome, seen)
+    if engine == "arrays":
+        pilot_molecules = cells.size
+        pilot_size = deep_size(cells, seen)
+    else:
+        (cell,) = cells
+        pilot_molecules = sum(count for _, count in cell.rna_counts())
+        pilot_size = deep_size(cell, seen)
+
+    per_molecule = pilot_size / pilot_molecules
+    molecules = expected_molecules(
+        steps, ratio, positive_decay, negative_decay, max_rnas
+    )
+    return int(genome_size + n_cells * per_molecule * molecules)
+
+
+def _mean(sizes: list[int]) -> float:
+    return sum(sizes) / len(sizes) if sizes else 0.0
+
+
+def object_sizes(cells: Cells) -> dict[str, float]:
+    """
+    Estimate the memory used by each type of object in some cells (see
+    deep_size).
+
+    @param cells: The cells to measure. These cannot be ResidentCells, whose
+        cells are held by worker processes.
+    @return: A dict with the mean bytes per Site (Site instances are only made
+        when a genome is iterated or indexed), per genome site (i.e., the
+        size of a genome divided by its length), per Genome, per RNA (including
+        its genome, but not the infecting genome that delta genomes refer to),
+        and per cell, and the total bytes for all cells. The Genome and RNA
+        sizes are found from (at most) the first SAMPLE molecules.
+    """
+    infecting_genome = cells.infecting_genome
+    shared = set()
+    genome_size = deep_size(infecting_genome, shared)
+    total = deep_size(cells)
+    genomes = []
+    rnas = []
+
+    # The cells of an ArrayCells instance are made afresh when they are
+    # iterated, so their sizes are those of equivalent Cell instances.
+    for cell in cells:
+        for rna in islice(cell, SAMPLE - len(rnas)):
+            # Do not count the store of a StoredRNA as part of it.
+            rnas.append(deep_size(rna, shared | {id(cell.rnas)}))
+            genomes.append(deep_size(rna.genome, shared | {id(cell.rnas)}))
+        if len(rnas) == SAMPLE:
+            break
+
+    genome_mean = _mean(genomes)
+    return {
+        "Site": float(deep_size(infecting_genome[0])),
+        "genome site": genome_mean / len(infecting_genome),
+        "Genome": genome_mean,
+        "RNA": _mean(rnas),
+        "cell": (total - genome_size) / len(cells),
+        "total": float(total),
+    }
+
+
+def memory_report(cells: Cells, projected: int | None = None) -> str:
+    """
+    Make a printable report of the memory used by some cells.
+
+    @param cells: The cells to report on.
+    @param projected: The memory projected for the run (see project_memory),
+        or None.
+    """
+    result = []
+    if projected is not None:
+        result.append(f"Projected memory: {format_bytes(projected)}")
+
+    if isinstance(cells, ResidentCells):
+        result.append(
+            "Object sizes are not available with the 'resident' engine, because "
+            "the cells are held by the worker processes."
+        )
+    else:
+        sizes = object_sizes(cells)
+        result.extend((
+            f"Bytes per Site instance: {sizes['Site']:.0f}",
+            f"Bytes per genome site: {sizes['genome site']:.2f}",
+            f"Bytes per Genome: {sizes['Genome']:.0f}",
+            f"Bytes per RNA: {sizes['RNA']:.0f}",
+            f"Bytes per cell: {format_bytes(sizes['cell'])}",
+            f"Total for all cells: {format_bytes(sizes['total'])}",
+        ))
+
+    return "\n".join(result)
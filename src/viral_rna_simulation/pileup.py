@@ -0,0 +1,340 @@
+from itertools import chain
+from typing import Sequence
+
+import numpy as np
+import polars as pl
+
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.utils import BASES, CODES
+
+# The kinds and source strands of pileup counts, in the order of the first two
+# axes of a pileup array.
+KINDS = ("apparent", "actual")
+STRANDS = ("+", "-")
+
+# The number of pending (index, weight) entries at which they are added into the
+# pileup array, to bound memory use.
+FLUSH = 1_000_000
+
+
+def plus_differences(
+    genome: Genome, infecting_genome: Genome
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find where a genome, read in (+) sense, differs from the infecting genome.
+
+    Only the sites with a mutation history are compared, because no other site
+    can differ from the infecting genome, so the cost does not depend on the
+    genome length.
+
+    @param genome: The genome, of either sense.
+    @param infecting_genome: The (+) infecting genome.
+    @return: A 2-tuple with an array of the (+) offsets of the differing sites
+        and an array of the (+) sense base codes at those offsets.
+    """
+    if isinstance(genome, DeltaGenome) and genome.reference is infecting_genome:
+        return (genome if genome.positive else genome.rc()).differences(
+            infecting_genome
+        )
+
+    offsets = np.fromiter(genome.history, dtype=np.intp, count=len(genome.history))
+    bases = genome.bases[offsets]
+    if not genome.positive:
+        offsets = len(genome) - 1 - offsets
+        bases = 3 - bases
+    different = infecting_genome.bases[offsets] != bases
+    return offsets[different], bases[different]
+
+
+def plus_mutations(genome: Genome) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the sites that were mutated when a genome was made (i.e., its 'mutant'
+    sites).
+
+    @param genome: The genome, of either sense.
+    @return: A 2-tuple with an array of the (+) offsets of the mutated sites and
+        an array of the (+) sense base codes they were mutated to.
+    """
+    offsets = np.fromiter(genome.mutant, dtype=np.intp, count=len(genome.mutant))
+    bases = np.array(
+        [CODES[genome.history[offset][-1][0][1]] for offset in offsets.tolist()],
+        dtype=np.uint8,
+    )
+    if not genome.positive:
+        bases = 3 - bases
+        # Delta genome offsets are already (+) reference offsets.
+        if not isinstance(genome, DeltaGenome):
+            offsets = len(genome) - 1 - offsets
+    return offsets, bases
+
+
+class Pileup:
+    """
+    Count the A/C/G/T bases at each site of RNA molecules, against the (+)
+    infecting genome, split by the kind of count and by source strand.
+
+    The 'apparent' counts are the bases that would be seen (in (+) sense) if
+    the molecules were sequenced, counted by the sense of the molecule they
+    are seen in, so the counts at each site add up to the number of (+) or (-)
+    molecules. The 'actual' counts are the mutations, counted by the (+) sense
+    base that each one produced and by the sense of the molecule it was made
+    in, so they add up to the mutation counts (see Cells.mutation_counts).
+
+    Molecules are not compared site by site. Each molecule only contributes its
+    differences from the infecting genome (see plus_differences). Delta genomes
+    of the infecting genome are collected and their changes are all read in
+    one pass (see add_deltas), with the differences of delta genomes that
+    share their changes found only once. All contributions are added up with
+    a few calls to np.bincount.
+
+    @param infecting_genome: The (+) genome of the infecting virus.
+    """
+
+    def __init__(self, infecting_genome: Genome) -> None:
+        self.infecting_genome = infecting_genome
+        self.length = len(infecting_genome)
+        # The number of (+) and (-) molecules.
+        self.depth = np.zeros(len(STRANDS), dtype=np.int64)
+        self._counts = np.zeros(
+            len(KINDS) * len(STRANDS) * self.length * len(BASES), dtype=np.int64
+        )
+        self._indices = []
+        self._weights = []
+        self._pending = 0
+        # Delta genomes (by the id of their changes) and their (+) and (-)
+        # molecule counts.
+        self._deltas: dict[int, tuple[DeltaGenome, list[int]]] = {}
+        # Delta genomes with mutant sites, their strands and molecule counts.
+        self._mutants: list[tuple[DeltaGenome, int, int]] = []
+
+    def add(self, genome: Genome, count: int = 1) -> None:
+        """
+        Add the genome of a molecule.
+
+        @param genome: The genome.
+        @param count: The number of molecules with this genome.
+        """
+        strand = 0 if genome.positive else 1
+        self.depth[strand] += count
+
+        if (
+            isinstance(genome, DeltaGenome)
+            and genome.reference is self.infecting_genome
+        ):
+            if genome.mutant:
+                self._mutants.append((genome, strand, count))
+            if genome.changes:
+                _, counts = self._deltas.setdefault(
+                    id(genome.changes), (genome, [0, 0])
+                )
+                counts[strand] += count
+        else:
+            if genome.mutant:
+                self.add_bases("actual", strand, *plus_mutations(genome), count)
+            offsets, bases = plus_differences(genome, self.infecting_genome)
+            self.add_differences(strand, offsets, bases, count)
+
+    def add_deltas(self, deltas: Sequence[DeltaGenome], counts: np.ndarray) -> None:
+        """
+        Add the apparent differences of molecules with delta genomes of the
+        infecting genome, reading the changes of all the genomes at once.
+
+        @param deltas: The delta genomes (of either sense, since their changes
+            are in (+) sense).
+        @param counts: An array of shape (2, len(deltas)) with the number of (+)
+            and (-) molecules that have each genome.
+        """
+        sizes = np.fromiter(
+            (len(delta.changes) for delta in deltas), dtype=np.intp, count=len(deltas)
+        )
+        total = int(sizes.sum())
+        offsets = np.fromiter(
+            chain.from_iterable(delta.changes for delta in deltas),
+            dtype=np.intp,
+            count=total,
+        )
+        bases = np.fromiter(
+            chain.from_iterable(delta.changes.values() for delta in deltas),
+            dtype=np.uint8,
+            count=total,
+        )
+        genomes = np.repeat(np.arange(len(deltas)), sizes)
+        # A site may have been mutated back to the reference base.
+        different = self.infecting_genome.bases[offsets] != bases
+        offsets, bases, genomes = (
+            offsets[different],
+            bases[different],
+            genomes[different],
+        )
+        for strand in range(len(STRANDS)):
+            weights = counts[strand][genomes]
+            self.add_differences(strand, offsets, bases, weights)
+
+    def add_mutants(
+        self, deltas: Sequence[DeltaGenome], strands: np.ndarray, counts: np.ndarray
+    ) -> None:
+        """
+        Add the actual mutations of molecules with delta genomes of the
+        infecting genome, reading the mutant sites of all the genomes at once.
+
+        @param deltas: The delta genomes. The (+) sense base made by each
+            mutation is the genome's change at the mutant site.
+        @param strands: The strand (0 for (+), 1 for (-)) of the molecules that
+            have each genome.
+        @param counts: The number of molecules that have each genome.
+        """
+        sizes = np.fromiter(
+            (len(delta.mutant) for delta in deltas), dtype=np.intp, count=len(deltas)
+        )
+        total = int(sizes.sum())
+        offsets = np.fromiter(
+            chain.from_iterable(delta.mutant for delta in deltas),
+            dtype=np.intp,
+            count=total,
+        )
+        bases = np.fromiter(
+            chain.from_iterable(
+                map(delta.changes.__getitem__, delta.mutant) for delta in deltas
+            ),
+            dtype=np.uint8,
+            count=total,
+        )
+        genomes = np.repeat(np.arange(len(deltas)), sizes)
+        for strand in range(len(STRANDS)):
+            wanted = strands[genomes] == strand
+            self.add_bases(
+                "actual",
+                strand,
+                offsets[wanted],
+                bases[wanted],
+                counts[genomes[wanted]],
+            )
+
+    def add_differences(
+        self,
+        strand: int,
+        offsets: np.ndarray,
+        bases: np.ndarray,
+        count: int | np.ndarray,
+    ) -> None:
+        """
+        Add the apparent differences of molecules from the infecting genome.
+        Each difference moves a count from the reference base to another base.
+
+        @param strand: 0 for (+) molecules, 1 for (-).
+        @param offsets: The (+) offsets of the differing sites.
+        @param bases: The (+) sense base codes at those offsets.
+        @param count: The number of molecules with these differences, either
+            for all of them or for each one.
+        """
+        self.add_bases("apparent", strand, offsets, bases, count)
+        self.add_bases(
+            "apparent",
+            strand,
+            offsets,
+            self.infecting_genome.bases[offsets],
+            -np.asarray(count),
+        )
+
+    def add_bases(
+        self,
+        kind: str,
+        strand: int,
+        offsets: np.ndarray,
+        bases: np.ndarray,
+        count: int | np.ndarray,
+    ) -> None:
+        """
+        Add to the counts of some bases at some sites.
+
+        @param kind: 'apparent' or 'actual'.
+        @param strand: 0 for (+), 1 for (-).
+        @param offsets: The (+) offsets of the sites.
+        @param bases: The base codes to count at those offsets.
+        @param count: The amount to add to each count, either for all of them
+            or for each one.
+        """
+        if len(offsets):
+            block = KINDS.index(kind) * len(STRANDS) + strand
+            self._indices.append((block * self.length + offsets) * len(BASES) + bases)
+            self._weights.append(
+                np.broadcast_to(np.asarray(count, dtype=np.float64), len(offsets))
+            )
+            self._pending += len(offsets)
+            if self._pending >= FLUSH:
+                self._flush()
+
+    def _flush(self) -> None:
+        """
+        Add the pending counts into the counts array.
+        """
+        if self._indices:
+            indices = np.concatenate(self._indices)
+            weights = np.concatenate(self._weights)
+            # The weights of bincount are floats, which hold integer counts
+            # exactly.
+            self._counts += np.rint(
+                np.bincount(indices, weights, minlength=len(self._counts))
+            ).astype(np.int64)
+            self._indices, self._weights, self._pending = [], [], 0
+
+    def counts(self) -> np.ndarray:
+        """
+        Get the pileup counts.
+
+        @return: An int64 array of shape (2, 2, L, 4), where L is the genome
+            length, indexed by kind (see KINDS), source strand (see STRANDS),
+            (+) offset, and base code (see utils.BASES).
+        """
+        if self._deltas:
+            deltas, counts = zip(*self._deltas.values())
+            self.add_deltas(deltas, np.array(counts, dtype=np.int64).T)
+            self._deltas = {}
+
+        if self._mutants:
+            deltas, strands, counts = zip(*self._mutants)
+            self.add_mutants(deltas, np.array(strands), np.array(counts))
+            self._mutants = []
+
+        self._flush()
+
+        result = self._counts.reshape(
+            len(KINDS), len(STRANDS), self.length, len(BASES)
+        ).copy()
+        # Every molecule starts out with the reference base at every site.
+        sites = np.arange(self.length)
+        for strand, depth in enumerate(self.depth.tolist()):
+            result[0, strand, sites, self.infecting_genome.bases] += depth
+        return result
+
+
+def pileup_frame(counts: np.ndarray, infecting_genome: Genome) -> pl.DataFrame:
+    """
+    Make a data frame from pileup counts (see Pileup.counts), with a row for
+    each kind, source strand, and site.
+
+    @param counts: The pileup counts.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @return: A data frame with columns 'position' (one-based), 'reference'
+        (the infecting genome base), 'kind' ('apparent' or 'actual'), 'strand'
+        ('+' or '-'), and a count column for each of A, C, G, and T.
+    """
+    length = len(infecting_genome)
+    positions = pl.Series("position", np.arange(1, length + 1, dtype=np.int64))
+    reference = pl.Series("reference", np.array(list(BASES))[infecting_genome.bases])
+    frames = []
+
+    for kind_index, kind in enumerate(KINDS):
+        for strand_index, strand in enumerate(STRANDS):
+            block = counts[kind_index, strand_index]
+            frames.append(
+                pl.DataFrame({
+                    "position": positions,
+                    "reference": reference,
+                    "kind": pl.Series([kind] * length),
+                    "strand": pl.Series([strand] * length),
+                    **{base: block[:, code] for code, base in enumerate(BASES)},
+                })
+            )
+
+    return pl.concat(frames)
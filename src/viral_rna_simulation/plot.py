@@ -3,45 +3,65 @@ import polars as pl
 import plotly.express as px
 
 from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.profiling import timed
+from viral_rna_simulation.trajectory import Trajectory
 
 
-def make_plot(cells: Cells, filename: str):
+TRANSITIONS = "AG", "GA", "CT", "TC"
+TRANSVERSIONS = "AT", "TA", "AC", "CA", "GT", "TG", "GC", "CG"
+
+BARCHART_CATEGORIES = [f"{t[0]}->{t[1]}" for t in TRANSITIONS] + [
+    f"{t[0]}->{t[1]}" for t in TRANSVERSIONS
+]
+
+
+def plot_data(cells: Cells) -> pl.DataFrame | None:
+    """
+    Make a data frame with the actual and apparent count of each change, for
+    plotting.
+
+    @param cells: The cells to count the changes in.
+    @return: A data frame with 'Change', 'Origin' and 'Count' columns, or None
+        if there are no changes.
+    """
     positive_changes, negative_changes = cells.mutation_counts()
     overall_changes = positive_changes + negative_changes
 
-    if overall_changes:
-        # title = cells.summary().replace("\n", "<br>")
+    if not overall_changes:
+        return None
+
+    from_positive, from_negative = cells.apparent_mutation_counts()
+    apparent_changes = from_positive + from_negative
+    assert apparent_changes
+
+    changes = []
+    origins = []
+    counts = []
 
-        from_positive, from_negative = cells.apparent_mutation_counts()
-        apparent_changes = from_positive + from_negative
-        assert apparent_changes
-
-        TRANSITIONS = "AG", "GA", "CT", "TC"
-        TRANSVERSIONS = "AT", "TA", "AC", "CA", "GT", "TG", "GC", "CG"
-
-        BARCHART_CATEGORIES = [f"{t[0]}->{t[1]}" for t in TRANSITIONS] + [
-            f"{t[0]}->{t[1]}" for t in TRANSVERSIONS
-        ]
-        changes = []
-        origins = []
-        counts = []
-
-        for change in TRANSITIONS + TRANSVERSIONS:
-            for origin, counter in (
-                    ("Actual overall", overall_changes),
-                    ("Actual (+) RNA", positive_changes),
-                    ("Actual (-) RNA", negative_changes),
-                    ("Apparent", apparent_changes),
-            ):
-                changes.append(f"{change[0]}->{change[1]}")
-                origins.append(origin)
-                counts.append(counter[change])
-
-        df = pl.DataFrame({
-            "Change": changes,
-            "Origin": origins,
-            "Count": counts,
-        })
+    for change in TRANSITIONS + TRANSVERSIONS:
+        for origin, counter in (
+                ("Actual overall", overall_changes),
+                ("Actual (+) RNA", positive_changes),
+                ("Actual (-) RNA", negative_changes),
+                ("Apparent", apparent_changes),
+        ):
+            changes.append(f"{change[0]}->{change[1]}")
+            origins.append(origin)
+            counts.append(counter[change])
+
+    return pl.DataFrame({
+        "Change": changes,
+        "Origin": origins,
+        "Count": counts,
+    })
+
+
+@timed("make_plot")
+def make_plot(cells: Cells, filename: str):
+    df = plot_data(cells)
+
+    if df is not None:
+        # title = cells.summary().replace("\n", "<br>")
 
         fig = px.bar(
             df,
@@ -62,3 +82,53 @@ def make_plot(cells: Cells, filename: str):
         print(f"Wrote plot to {filename!r}.", file=sys.stderr)
     else:
         print(f"No genetic changes found, not writing {filename!r}.", file=sys.stderr)
+
+
+# The trajectory totals to plot, and their names in the plot.
+TRAJECTORY_TOTALS = {
+    "positive_mutations": "Actual (+) RNA",
+    "negative_mutations": "Actual (-) RNA",
+    "from_positive": "Apparent from (+) RNA",
+    "from_negative": "Apparent from (-) RNA",
+}
+
+
+def trajectory_data(trajectory: Trajectory) -> pl.DataFrame:
+    """
+    Make a data frame with the actual and apparent change counts (summed over
+    all cells) at each recorded step of a trajectory, for plotting.
+
+    @param trajectory: The recorded trajectory.
+    @return: A data frame with 'Step', 'Origin' and 'Count' columns.
+    """
+    return (
+        trajectory.frame()
+        .group_by("step")
+        .agg(pl.col(list(TRAJECTORY_TOTALS)).sum())
+        .unpivot(index="step", variable_name="Origin", value_name="Count")
+        .with_columns(pl.col("Origin").replace_strict(TRAJECTORY_TOTALS))
+        .rename({"step": "Step"})
+        .sort("Origin", "Step")
+    )
+
+
+@timed("make_trajectory_plot")
+def make_trajectory_plot(trajectory: Trajectory, filename: str):
+    if len(trajectory):
+        fig = px.line(
+            trajectory_data(trajectory),
+            x="Step",
+            y="Count",
+            color="Origin",
+            category_orders={"Origin": list(TRAJECTORY_TOTALS.values())},
+            height=300,
+        )
+
+        if filename.endswith(".html"):
+            fig.write_html(filename)
+        else:
+            fig.write_image(filename)
+
+        print(f"Wrote trajectory plot to {filename!r}.", file=sys.stderr)
+    else:
+        print(f"No trajectory recorded, not writing {filename!r}.", file=sys.stderr)
@@ -0,0 +1,229 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Iterator
+
+
+MIB = 1024 * 1024
+
+
+class Profile:
+    """
+    Record the wall and CPU time, number of calls, and amount of work done (e.g.,
+    the number of replications or bytes) in named phases of a simulation.
+
+    @param memory: If True, also record the peak memory allocated (as traced by
+        tracemalloc, which must be tracing) during each phase, beyond what was
+        allocated when it started, and the peak resident memory of the process
+        so far (since it started, not just during the phase) at the end of the
+        phase. Only memory allocated by Python in this process is traced.
+    """
+
+    def __init__(self, memory: bool = False) -> None:
+        self.phases: dict[str, dict] = {}
+        self.memory = memory
+        # The traced memory at the start of each running phase, and the peak
+        # seen so far while it has been running.
+        self._traced: list[list[int]] = []
+
+    def add(
+        self,
+        name: str,
+        wall: float = 0.0,
+        cpu: float = 0.0,
+        calls: int = 1,
+        items: int = 0,
+        unit: str | None = None,
+    ) -> None:
+        """
+        Add to the totals for a phase.
+
+        @param name: The name of the phase.
+        @param wall: The wall clock time (in seconds).
+        @param cpu: The CPU time (in seconds).
+        @param calls: The number of calls.
+        @param items: The amount of work done, in 'unit's.
+        @param unit: The unit of 'items' (e.g., 'replications').
+        """
+        phase = self.phases.setdefault(
+            name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "items": 0, "unit": None}
+        )
+        phase["calls"] += calls
+        phase["wall"] += wall
+        phase["cpu"] += cpu
+        phase["items"] += items
+        if unit is not None:
+            phase["unit"] = unit
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        A context manager that times the code it runs as one call of a phase. The
+        CPU time is that of the whole process (including all its threads, but
+        not other processes).
+
+        @param name: The name of the phase.
+        """
+        if self.memory:
+            self._start_memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(
+                name, time.perf_counter() - wall, time.process_time() - cpu, calls=1
+            )
+            if self.memory:
+                self._end_memory(name)
+
+    def _start_memory(self) -> None:
+        """
+        Start tracking the peak traced memory of a phase. Because tracemalloc has
+        only one peak, the peak so far of any enclosing phase is saved first.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if self._traced:
+            self._traced[-1][1] = max(self._traced[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._traced.append([current, current])
+
+    def _end_memory(self, name: str) -> None:
+        """
+        Record the peak traced memory of a phase, and the peak resident memory
+        of the process so far.
+        """
+        start, peak = self._traced.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._traced:
+            self._traced[-1][1] = max(self._traced[-1][1], peak)
+        tracemalloc.reset_peak()
+        phase = self.phases[name]
+        phase["peak"] = max(phase.get("peak", 0), peak - start)
+        phase["process_max_rss"] = max_rss()
+
+    def to_dict(self) -> dict:
+        """
+        Get the phases as a JSON serializable dict, adding the throughput (items
+        per second of wall time) of phases with a unit.
+        """
+        result = {}
+        for name, phase in self.phases.items():
+            result[name] = dict(phase)
+            if phase["unit"] and phase["wall"] > 0.0:
+                result[name]["throughput"] = phase["items"] / phase["wall"]
+        return result
+
+    def format(self) -> str:
+        """
+        Make a printable table of the phases, in the order in which they were
+        first recorded.
+        """
+        width = max([len("Phase")] + [len(name) for name in self.phases])
+        header = f"{'Phase':{width}}  {'Calls':>7}  {'Wall (s)':>10}  {'CPU (s)':>10}"
+        if self.memory:
+            header += f"  {'Peak (MiB)':>10}  {'Process RSS so far (MiB)':>24}"
+        result = [header]
+        for name, phase in self.to_dict().items():
+            line = (
+                f"{name:{width}}  {phase['calls']:7d}  {phase['wall']:10.4f}  "
+                f"{phase['cpu']:10.4f}"
+            )
+            if self.memory:
+                if "peak" in phase:
+                    line += f"  {phase['peak'] / MIB:10.2f}"
+                else:
+                    line += f"  {'':10}"
+                rss = phase.get("process_max_rss")
+                line += f"  {'':24}" if rss is None else f"  {rss / MIB:24.1f}"
+            if "throughput" in phase:
+                line += f"  {phase['items']} {phase['unit']} "
+                line += f"({phase['throughput']:.4g}/s)"
+            result.append(line)
+        return "\n".join(result)
+
+
+# The profile being recorded, or None if profiling is off.
+PROFILE: Profile | None = None
+
+_NULL_CONTEXT = nullcontext()
+
+# True if tracemalloc was started by 'enable' (and so should be stopped by
+# 'disable').
+_STARTED_TRACING = False
+
+
+def max_rss() -> int | None:
+    """
+    Get the peak resident memory (in bytes) of this process so far.
+
+    @return: The peak, or None if it cannot be found (on Windows, which has no
+        'resource' module).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # This is in bytes on macOS, and in KiB elsewhere.
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def enable(memory: bool = False) -> Profile:
+    """
+    Turn on profiling, with a new Profile.
+
+    @param memory: If True, also record the memory used in each phase (see
+        Profile), starting tracemalloc if it is not already tracing. Tracing
+        makes Python code run noticeably slower.
+    """
+    global PROFILE, _STARTED_TRACING
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _STARTED_TRACING = True
+    PROFILE = Profile(memory)
+    return PROFILE
+
+
+def disable() -> None:
+    """
+    Turn off profiling (and memory tracing, if 'enable' started it).
+    """
+    global PROFILE, _STARTED_TRACING
+    PROFILE = None
+    if _STARTED_TRACING:
+        tracemalloc.stop()
+        _STARTED_TRACING = False
+
+
+def phase(name: str):
+    """
+    Get a context manager that times the code it runs as one call of a phase if
+    profiling is on, and does nothing otherwise.
+
+    @param name: The name of the phase.
+    """
+    return _NULL_CONTEXT if PROFILE is None else PROFILE.phase(name)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Make a decorator that times each call of a function as a phase, if profiling
+    is on. This is only meant for functions that do enough work that the cost
+    of the check is not noticeable.
+
+    @param name: The name of the phase.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILE is None:
+                return function(*args, **kwargs)
+            with PROFILE.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,310 @@
+import gzip
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator
+
+import numpy as np
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.utils import BASES, rc_codes
+
+# The name of the reference sequence (the infecting genome) in SAM output.
+REFERENCE_NAME = "infecting-genome"
+
+# The approximate number of reads made (and formatted and compressed) at once.
+# Memory use is proportional to this (times the number of workers), not to the
+# total number of reads.
+CHUNK_READS = 50_000
+
+# The gzip compression level for FASTQ output. Higher levels are several times
+# slower and save little space.
+COMPRESS_LEVEL = 1
+
+# The highest base quality written.
+MAX_QUALITY = 40
+
+_ASCII = np.frombuffer(BASES.encode(), dtype=np.uint8)
+
+# A chunk of work: the number of the first molecule in the chunk, and the cell
+# number, (+) sense base codes and number of copies of each molecule in it,
+# along with the number of its copies that were in earlier chunks (when the
+# copies of a haplotype are split over chunks).
+Chunk = tuple[int, list[tuple[int, np.ndarray, int, int]]]
+
+
+def quality(error_rate: float) -> int:
+    """
+    Get the Phred base quality corresponding to a sequencing error rate.
+    """
+    if error_rate <= 0.0:
+        return MAX_QUALITY
+    return min(MAX_QUALITY, round(-10.0 * math.log10(error_rate)))
+
+
+def reads_per_strand(genome_length: int, read_length: int, depth: float) -> int:
+    """
+    Get the number of reads to make from each DNA strand of a molecule so that
+    (on average) each site is covered 'depth' times per strand.
+    """
+    return math.ceil(depth * genome_length / min(read_length, genome_length))
+
+
+def molecule_chunks(
+    cells: Cells, read_length: int, depth: float, chunk_reads: int = CHUNK_READS
+) -> Iterator[Chunk]:
+    """
+    Split the RNA molecules of some cells into chunks of about 'chunk_reads'
+    reads, without making all the chunks at once. The copies of a haplotype
+    with many molecules are split over chunks, so no chunk has many more reads
+    than 'chunk_reads'.
+    """
+    per_molecule = 2 * reads_per_strand(len(cells.infecting_genome), read_length, depth)
+    # The most copies of a molecule to put in one chunk. This is enough to fill
+    # a chunk, so the copies of a molecule are never split within one.
+    most = max(1, math.ceil(chunk_reads / per_molecule))
+    molecules = []
+    first = number = reads = 0
+
+    for cell_number, cell in enumerate(cells):
+        for rna, count in cell.rna_counts():
+            genome = rna.genome
+            bases = genome.bases if genome.positive else rc_codes(genome.bases)
+            done = 0
+            while done < count:
+                copies = min(count - done, most)
+                molecules.append((cell_number, bases, copies, done))
+                done += copies
+                if done == count:
+                    number += 1
+                reads += copies * per_molecule
+                if reads >= chunk_reads:
+                    yield first, molecules
+                    molecules = []
+                    first, reads = number, 0
+
+    if molecules:
+        yield first, molecules
+
+
+def chunk_reads(
+    chunk: Chunk,
+    reference: np.ndarray,
+    read_length: int,
+    depth: float,
+    error_rate: float,
+    seed: np.random.SeedSequence,
+    fastq: bool = True,
+    sam: bool = True,
+) -> tuple[bytes, bytes, int]:
+    """
+    Make the reads for a chunk of molecules.
+
+    The library preparation makes two complementary DNA strands from each
+    molecule, and reads of 'read_length' are taken from uniformly random
+    places on each. Reads from the (-) strand are the reverse complement of
+    the (+) sequence they cover. Sequencing errors change a base to one of
+    the other three, with equal probability.
+
+    Reads are named CELL:MOLECULE:STRAND:N, where CELL and MOLECULE are (one-
+    based) numbers, STRAND is '+' or '-', and N numbers the reads of each
+    molecule. In the SAM output, each read is aligned (without gaps) to the
+    infecting genome where it was taken from, with its sequence given in (+)
+    sense and its number of mismatches in an NM tag.
+
+    @param chunk: The chunk of molecules, as made by 'molecule_chunks'.
+    @param reference: The base codes of the infecting genome.
+    @param read_length: The read length. Reads are no longer than the genome.
+    @param depth: The mean number of reads covering each site of each strand.
+    @param error_rate: The per-base sequencing error rate.
+    @param seed: The seed for the random number generator of this chunk.
+    @param fastq: If True, make (gzip compressed) FASTQ.
+    @param sam: If True, make SAM records (with no header).
+    @return: A 3-tuple with the compressed FASTQ (a complete gzip member, so the
+        output of successive chunks can just be concatenated), the SAM records,
+        and the number of reads.
+    """
+    rng = np.random.default_rng(seed)
+    length = len(reference)
+    read_length = min(read_length, length)
+    n_reads = reads_per_strand(length, read_length, depth)
+    window = np.arange(read_length)
+    qual = chr(33 + quality(error_rate)).encode() * read_length
+    cigar = b"%dM" % read_length
+    first, molecules = chunk
+    fastq_lines = []
+    sam_lines = []
+    count = 0
+
+    for number, (cell_number, bases, copies, done) in enumerate(
+        molecules, start=first
+    ):
+        # The reads from both strands, with those from the (-) strand last.
+        per_strand = copies * n_reads
+        reverse = np.arange(2 * per_strand) >= per_strand
+        starts = rng.integers(0, length - read_length + 1, 2 * per_strand)
+        sites = starts[:, None] + window
+        codes = bases[sites]
+        if error_rate:
+            errors = rng.random(codes.shape) < error_rate
+            codes[errors] = (
+                codes[errors] + rng.integers(1, 4, np.count_nonzero(errors))
+            ) % 4
+
+        # The sequences as read. Those from the (-) strand are reverse
+        # complemented.
+        read = codes.copy()
+        read[reverse] = 3 - read[reverse, ::-1]
+        prefix = b"%d:%d:" % (cell_number + 1, number + 1)
+        names = [
+            prefix + (b"-:%d" % index if is_reverse else b"+:%d" % index)
+            # Copies in earlier chunks had the earlier read numbers.
+            for index, is_reverse in enumerate(
+                reverse.tolist(), start=2 * done * n_reads + 1
+            )
+        ]
+
+        if fastq:
+            data = _ASCII[read].tobytes()
+            for index, name in enumerate(names):
+                offset = index * read_length
+                fastq_lines.append(
+                    b"@%s\n%s\n+\n%s\n"
+                    % (name, data[offset : offset + read_length], qual)
+                )
+
+        if sam:
+            data = _ASCII[codes].tobytes()
+            mismatches = (codes != reference[sites]).sum(axis=1).tolist()
+            for index, (name, is_reverse, start) in enumerate(
+                zip(names, reverse.tolist(), starts.tolist())
+            ):
+                offset = index * read_length
+                sam_lines.append(
+                    b"%s\t%d\t%s\t%d\t60\t%s\t*\t0\t0\t%s\t%s\tNM:i:%d\n"
+                    % (
+                        name,
+                        16 if is_reverse else 0,
+                        REFERENCE_NAME.encode(),
+                        start + 1,
+                        cigar,
+                        data[offset : offset + read_length],
+                        qual,
+                        mismatches[index],
+                    )
+                )
+
+        count += len(names)
+
+    return (
+        gzip.compress(b"".join(fastq_lines), COMPRESS_LEVEL, mtime=0) if fastq else b"",
+        b"".join(sam_lines),
+        count,
+    )
+
+
+def sam_header(length: int) -> bytes:
+    """
+    Make a SAM header for reads aligned to an infecting genome.
+
+    @param length: The length of the infecting genome.
+    """
+    return (
+        b"@HD\tVN:1.6\tSO:unsorted\n"
+        b"@SQ\tSN:%s\tLN:%d\n"
+        b"@PG\tID:viral-rna-simulation\tPN:viral-rna-simulation\n"
+        % (REFERENCE_NAME.encode(), length)
+    )
+
+
+def _bounded_map(
+    executor: ProcessPoolExecutor, function, tasks: Iterable[tuple], limit: int
+) -> Iterator:
+    """
+    Like executor.map, but with at most 'limit' tasks submitted (or finished but
+    not yet yielded) at once, so that tasks and results do not pile up in
+    memory.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(function, *task))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_reads(
+    cells: Cells,
+    fastq: IO[bytes] | None = None,
+    sam: IO[bytes] | None = None,
+    read_length: int = 150,
+    depth: float = 1.0,
+    error_rate: float = 0.0,
+    seed: int | np.random.SeedSequence | None = None,
+    workers: int | None = None,
+) -> int:
+    """
+    Sequence the RNA molecules in some cells, writing the reads as gzip
+    compressed FASTQ and/or as SAM (see 'chunk_reads'). The reads are made in
+    chunks, so memory use does not depend on the number of reads, and chunks
+    are made (and compressed) in parallel by worker processes. The output is
+    the same whatever the number of workers.
+
+    @param cells: The cells to sequence.
+    @param fastq: A file opened for binary writing, to write gzip FASTQ to, or
+        None.
+    @param sam: A file opened for binary writing, to write SAM to, or None.
+    @param read_length: The read length.
+    @param depth: The mean number of reads covering each site of each strand of
+        each molecule.
+    @param error_rate: The per-base sequencing error rate.
+    @param seed: The random seed. If None, results will not be reproducible.
+    @param workers: The number of worker processes. The default is the number of
+        CPUs. If there is only one, reads are made in this process.
+    @return: The number of reads.
+    """
+    reference = cells.infecting_genome.bases
+    if sam:
+        sam.write(sam_header(len(reference)))
+
+    seed_sequence = (
+        seed
+        if isinstance(seed, np.random.SeedSequence)
+        else np.random.SeedSequence(seed)
+    )
+    # Each chunk gets the next child seed, so results do not depend on how
+    # chunks are spread over workers.
+    tasks = (
+        (
+            chunk,
+            reference,
+            read_length,
+            depth,
+            error_rate,
+            seed_sequence.spawn(1)[0],
+            fastq is not None,
+            sam is not None,
+        )
+        for chunk in molecule_chunks(cells, read_length, depth)
+    )
+    workers = workers or os.cpu_count() or 1
+    count = 0
+
+    def write(results: Iterable[tuple[bytes, bytes, int]]) -> None:
+        nonlocal count
+        for fastq_data, sam_data, n_reads in results:
+            if fastq:
+                fastq.write(fastq_data)
+            if sam:
+                sam.write(sam_data)
+            count += n_reads
+
+    if workers == 1:
+        write(chunk_reads(*task) for task in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            write(_bounded_map(executor, chunk_reads, tasks, 2 * workers))
+
+    return count
@@ -0,0 +1,393 @@
+import multiprocessing
+import os
+import weakref
+from collections import Counter
+from multiprocessing.connection import Connection
+from typing import Iterator
+
+import numpy as np
+
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.cells import Cells, Seed, cell_seeds
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.profiling import timed
+from viral_rna_simulation.spectrum import MutationSpectrum
+
+# The aggregate counts returned by a worker. These are the results of the Cells
+# rna_count, replication_count, mutation_counts, and apparent_mutation_counts
+# methods.
+WorkerCounts = tuple[
+    tuple[int, int], tuple[int, int], tuple[Counter, Counter], tuple[Counter, Counter]
+]
+
+
+def worker_counts(cells: Cells) -> WorkerCounts:
+    """
+    Get the aggregate counts for some cells.
+    """
+    return (
+        cells.rna_count(),
+        cells.replication_count(),
+        cells.mutation_counts(),
+        cells.apparent_mutation_counts(),
+    )
+
+
+def serve(
+    connection: Connection,
+    seeds: list[np.random.SeedSequence],
+    infecting_genome: Genome,
+    delta: bool,
+    haplotypes: bool,
+    check: bool,
+    rna_directory: str | None,
+) -> None:
+    """
+    Make and hold some cells (one for each of the given seeds) in a worker
+    process, and respond to commands sent by a ResidentCells instance in the
+    parent process.
+
+    The commands are 'counts' (send the aggregate counts), 'replicate' (with a
+    dict of Cell.replicate_rnas keyword arguments, after which the counts are
+    sent), 'cells' (send the cells themselves), 'sizes' (send the number of
+    molecules in each cell), 'sample' (with a dict of Cells._sample keyword
+    arguments, after which its result is sent), 'pileup' (send the pileup
+    counts), 'snapshots' (send the totals recorded by each cell during the last
+    replication, see Cell.replicate_rnas), and 'stop'.
+    """
+    cells = Cells(
+        len(seeds),
+        infecting_genome,
+        delta=delta,
+        haplotypes=haplotypes,
+        check=check,
+        seed=seeds,
+        rna_directory=rna_directory,
+    )
+
+    while True:
+        command, kwargs = connection.recv()
+        try:
+            if command == "counts":
+                connection.send(worker_counts(cells))
+            elif command == "replicate":
+                for cell in cells:
+                    cell.replicate_rnas(**kwargs)
+                connection.send(worker_counts(cells))
+            elif command == "cells":
+                connection.send(cells.cells)
+            elif command == "sizes":
+                connection.send(cells.cell_sizes())
+            elif command == "sample":
+                connection.send(cells._sample(**kwargs))
+            elif command == "pileup":
+                connection.send(cells.pileup())
+            elif command == "snapshots":
+                connection.send([cell.snapshots for cell in cells])
+            else:
+                assert command == "stop"
+                break
+        except Exception as e:
+            connection.send(e)
+
+    connection.close()
+
+
+def stop(connections: list[Connection], processes: list) -> None:
+    """
+    Stop worker processes.
+    """
+    for connection in connections:
+        try:
+            connection.send(("stop", None))
+        except (BrokenPipeError, OSError):
+            pass
+        connection.close()
+
+    for process in processes:
+        process.join()
+
+
+class ResidentCells(Cells):
+    """
+    A collection of cells that are made and kept by long-lived worker processes.
+
+    Only the replication parameters are sent to the workers, and only the
+    aggregate counts come back, so (unlike Cells) no cell is pickled when
+    replicating. The counting methods return the counts from the most recent
+    replication. The cells themselves are only fetched from the workers if
+    they are iterated.
+
+    The workers are stopped by the close method, or when the instance is garbage
+    collected or the program exits.
+
+    @param n_cells: The number of cells.
+    @param infecting_genome: The (+) genome of the infecting virus.
+    @param workers: The number of worker processes. The default is the number
+        of CPUs. There will never be more workers than cells.
+    @param delta: If True, RNA genomes will only store their differences from
+        the infecting genome (see DeltaGenome).
+    @param haplotypes: If True, each cell will store identical RNA molecules just
+        once, along with their number (see Haplotypes).
+    @param check: If True, the workers will check the running totals of their
+        cells against a full recount (see Cells).
+    @param seed: The seed for the random number generators of the cells. Each
+        cell gets its own generator (see Cells), so results for a given seed do
+        not depend on the number of workers.
+    @param rna_directory: If not None, the workers will store the RNA molecules
+        of their cells in memory-mapped files (see Cells).
+    """
+
+    def __init__(
+        self,
+        n_cells: int,
+        infecting_genome: Genome,
+        workers: int | None = None,
+        delta: bool = False,
+        haplotypes: bool = False,
+        check: bool = False,
+        seed: Seed = None,
+        rna_directory: str | None = None,
+    ) -> None:
+        # Cells.__init__ is not called, because the cells are made by the
+        # workers, but the attributes its methods use must still be set. The
+        # workers make their own directories for any RNA files.
+        self.infecting_genome = infecting_genome
+        self.check = check
+        self.directory = None
+        self.n_cells = n_cells
+        workers = min(workers or os.cpu_count() or 1, n_cells)
+        seeds = cell_seeds(seed, n_cells)
+        self.connections = []
+        self.processes = []
+        # The number of cells held by each worker.
+        self.worker_cells = []
+        start = 0
+
+        for worker in range(workers):
+            # Spread the cells as evenly as possible over the workers.
+            end = start + n_cells // workers + (worker < n_cells % workers)
+            worker_seeds, start = seeds[start:end], end
+            self.worker_cells.append(len(worker_seeds))
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=serve,
+                args=(
+                    child_connection,
+                    worker_seeds,
+                    infecting_genome,
+                    delta,
+                    haplotypes,
+                    check,
+                    rna_directory,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        self._finalizer = weakref.finalize(self, stop, self.connections, self.processes)
+        self._counts = self._command("counts")
+        self.trajectory = None
+
+    def __iter__(self) -> Iterator[Cell]:
+        return iter(self.cells)
+
+    def __len__(self) -> int:
+        return self.n_cells
+
+    @property
+    def cells(self) -> list[Cell]:
+        """
+        Fetch the cells from the workers.
+        """
+        result = []
+        for cells in self._send("cells"):
+            result.extend(cells)
+        return result
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        self._finalizer()
+
+    def _send(self, command: str, kwargs: dict | list[dict] | None = None) -> list:
+        """
+        Send a command to all workers and collect their responses.
+
+        @param command: The command.
+        @param kwargs: The keyword arguments for the command, or a list with
+            different keyword arguments for each worker.
+        """
+        if not self._finalizer.alive:
+            raise RuntimeError("The worker processes have been stopped.")
+
+        if not isinstance(kwargs, list):
+            kwargs = [kwargs] * len(self.connections)
+
+        for connection, worker_kwargs in zip(self.connections, kwargs):
+            connection.send((command, worker_kwargs))
+
+        responses = [connection.recv() for connection in self.connections]
+
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+
+        return responses
+
+    def _command(self, command: str, kwargs: dict | None = None) -> WorkerCounts:
+        """
+        Send a command to all workers and add up the counts they return.
+        """
+        rna_positive = rna_negative = 0
+        replications_positive = replications_negative = 0
+        mutations_positive, mutations_negative = Counter(), Counter()
+        apparent_positive, apparent_negative = Counter(), Counter()
+
+        for rnas, replications, mutations, apparent in self._send(command, kwargs):
+            rna_positive += rnas[0]
+            rna_negative += rnas[1]
+            replications_positive += replications[0]
+            replications_negative += replications[1]
+            mutations_positive += mutations[0]
+            mutations_negative += mutations[1]
+            apparent_positive += apparent[0]
+            apparent_negative += apparent[1]
+
+        return (
+            (rna_positive, rna_negative),
+            (replications_positive, replications_negative),
+            (mutations_positive, mutations_negative),
+            (apparent_positive, apparent_negative),
+        )
+
+    def replicate(
+        self,
+        workers: int | None = None,
+        steps: int = 1,
+        mutate_in: str = "both",
+        mutation_rate: float = 0.0,
+        ratio: int = 1,
+        backend: str = "auto",
+        negative_propensity: float = 1.0,
+        positive_decay: float = 0.0,
+        negative_decay: float = 0.0,
+        max_rnas: int | None = None,
+        mutation_spectrum: MutationSpectrum | None = None,
+    ) -> None:
+        """
+        Replicate (in parallel) each cell for a given number of steps. See
+        Cells.replicate.
+
+        @param workers: Ignored. The number of workers is set when the instance is
+            made.
+        @param steps: The number of replication steps each cell should perform.
+        @param mutate_in: The type of RNA molecules to allow mutations in. If
+            'negative' or 'positive', mutations should only be allowed in those
+            molecules.
+        @param mutation_rate: The per-base mutation probability.
+        @param ratio: The number of +RNA molecules to make from a -RNA.
+        @param backend: Ignored. The cells are always replicated by the
+            worker processes.
+        @param negative_propensity: How likely a (-) molecule is to be chosen
+            for replication, relative to a (+) molecule.
+        @param positive_decay: The probability that each (+) molecule degrades
+            at the end of each step.
+        @param negative_decay: The probability that each (-) molecule degrades
+            at the end of each step.
+        @param max_rnas: If not None, the carrying capacity of each cell.
+        @param mutation_spectrum: If not None, the context-dependent mutation
+            rates and substitutions to use instead of 'mutation_rate'.
+        """
+        trajectory = self.trajectory
+        self._counts = self._command(
+            "replicate",
+            {
+                "steps": steps,
+                "mutate_in": mutate_in,
+                "mutation_rate": mutation_rate,
+                "ratio": ratio,
+                "record_every": None if trajectory is None else trajectory.every,
+                "start": 0 if trajectory is None else trajectory.step,
+                "negative_propensity": negative_propensity,
+                "positive_decay": positive_decay,
+                "negative_decay": negative_decay,
+                "max_rnas": max_rnas,
+                "mutation_spectrum": mutation_spectrum,
+            },
+        )
+        if trajectory is not None:
+            snapshots = self._send("snapshots")
+            trajectory.add(steps, [cell for worker in snapshots for cell in worker])
+
+    def cell_sizes(self) -> list[int]:
+        """
+        Get the number of RNA molecules in each cell.
+        """
+        return [size for sizes in self._send("sizes") for size in sizes]
+
+    def _sample(
+        self, allocation: list[int], seeds: list[np.random.SeedSequence]
+    ) -> tuple[Counter, Counter, np.ndarray]:
+        """
+        Have the workers sample the RNA molecules of their cells and find their
+        apparent changes. See Cells.sample_apparent_mutation_counts.
+        """
+        worker_kwargs = []
+        start = 0
+        for n_cells in self.worker_cells:
+            end = start + n_cells
+            worker_kwargs.append({
+                "allocation": allocation[start:end],
+                "seeds": seeds[start:end],
+            })
+            start = end
+
+        from_positive, from_negative, totals = Counter(), Counter(), []
+        for positive, negative, worker_totals in self._send("sample", worker_kwargs):
+            from_positive += positive
+            from_negative += negative
+            totals.append(worker_totals)
+
+        return from_positive, from_negative, np.concatenate(totals)
+
+    @timed("Cells.pileup")
+    def pileup(self) -> np.ndarray:
+        """
+        Have the workers make the pileup counts of their cells, and add them up.
+        See Cells.pileup.
+        """
+        return sum(self._send("pileup"))
+
+    @timed("Cells.rna_count")
+    def rna_count(self) -> tuple[int, int]:
+        """
+        Get the number of all (+/-) RNA molecules in all cells.
+        """
+        return self._counts[0]
+
+    @timed("Cells.replication_count")
+    def replication_count(self) -> tuple[int, int]:
+        """
+        Get the number of (+/-) RNA molecule replications that occurred.
+        """
+        return self._counts[1]
+
+    @timed("Cells.mutation_counts")
+    def mutation_counts(self) -> tuple[Counter, Counter]:
+        """
+        Add up all mutations in all (+/-) RNA molecules in all cells.
+        """
+        return self._counts[2]
+
+    @timed("Cells.apparent_mutation_counts")
+    def apparent_mutation_counts(self) -> tuple[Counter, Counter]:
+        """
+        Get the apparent changes. I.e., what it looks like happened, based on sample
+        preparation, sequencing, alignment to the (+) RNA reference (infecting) genome.
+        """
+        return self._counts[3]
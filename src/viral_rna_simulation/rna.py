@@ -1,7 +1,11 @@
 import sys
 from collections import defaultdict, Counter
 
+import numpy as np
+
 from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.spectrum import SpectrumIndex
+from viral_rna_simulation.utils import BASES
 
 # from viral_rna_simulation.genome import genomes_str
 
@@ -31,20 +35,40 @@ class RNA:
     def positive(self) -> bool:
         return self.genome.positive
 
-    def replicate(self, mutation_rate: float = 0.0) -> "RNA":
+    def replicate(
+        self,
+        mutation_rate: "float | SpectrumIndex" = 0.0,
+        rng: np.random.Generator | None = None,
+        count: int | None = None,
+    ) -> "RNA | list[RNA]":
         """
-        Make a reverse-complement copy of this RNA, perhaps with mutations.
+        Make reverse-complement copies of this RNA, perhaps with mutations.
+
+        @param mutation_rate: The per-base mutation probability, or a
+            SpectrumIndex (see Genome.replicate).
+        @param rng: The random number generator to use.
+        @param count: If not None, the number of copies to make, all in one call
+            to Genome.replicate.
+        @return: The new RNA or, if 'count' is not None, a list of them.
         """
-        self.replications += 1
-        return RNA(self.genome.replicate(mutation_rate))
+        if count is None:
+            self.replications += 1
+            return RNA(self.genome.replicate(mutation_rate, rng))
+
+        self.replications += count
+        genomes = self.genome.replicate(mutation_rate, rng, count)
+        return [RNA(genome) for genome in genomes]
 
     def sequencing_mutation_counts(
-        self, infecting_genome: Genome
+        self, infecting_genome: Genome, find_sources: bool = True
     ) -> tuple[dict[str, int], dict[str, dict[bool, Counter[str]]]]:
         """
         Return the mutation counts (relative to the infecting genome) that would be
         counted if this molecule were sequenced. The library preparation involves making
         two (complementary) DNA strands, both of which are assumed to be sequenced.
+
+        @param find_sources: If False, do not find the historical changes that
+            led to each apparent change (the returned sources will be empty).
         """
         genome = self.genome if self.positive else self.genome.rc()
         mutations = defaultdict(int)
@@ -60,23 +84,30 @@ class RNA:
         # )
         # print()
 
-        for a, b in zip(infecting_genome, genome):
-            if a != b:
-                change = a.base + b.base
-                if "pytest" not in sys.modules:
-                    # If the genome base does not match the infecting genome, the genome
-                    # site must have a mutation history.
-                    historical_change, historical_positive = b.mutation_history[-1]
-                    reasons = sources.setdefault(
-                        change,
-                        {
-                            True: Counter(),
-                            False: Counter(),
-                        },
-                    )
-                    reasons[historical_positive][historical_change] += 1
-
-                # TODO: We should perhaps add two here.
-                mutations[change] += 1
+        offsets, bases = genome.differences(infecting_genome)
+        reference = infecting_genome.bases[offsets]
+
+        # Count each from/to pair in a single pass by giving it a code in 0..15.
+        pairs = np.bincount(reference * 4 + bases, minlength=16)
+        for pair in np.flatnonzero(pairs).tolist():
+            # TODO: We should perhaps add two here.
+            mutations[BASES[pair // 4] + BASES[pair % 4]] += int(pairs[pair])
+
+        if find_sources and "pytest" not in sys.modules:
+            for offset, from_, to in zip(
+                offsets.tolist(), reference.tolist(), bases.tolist()
+            ):
+                change = BASES[from_] + BASES[to]
+                # If the genome base does not match the infecting genome, the genome
+                # site must have a mutation history.
+                historical_change, historical_positive = genome.history[offset][-1]
+                reasons = sources.setdefault(
+                    change,
+                    {
+                        True: Counter(),
+                        False: Counter(),
+                    },
+                )
+                reasons[historical_positive][historical_change] += 1
 
         return mutations, sources
@@ -0,0 +1,266 @@
+import os
+import tempfile
+from functools import cached_property
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from viral_rna_simulation.genome import DeltaGenome, Genome, History
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.utils import CHANGES, CODES, grow
+
+# The record type for the mutation history events of stored genomes. Each site
+# with a history has one record per event, in order, and 'mutant' is set on the
+# last record of a site that was mutated when its genome was made.
+EVENT = np.dtype([
+    ("offset", np.int32),
+    ("change", np.uint8),
+    ("positive", np.bool_),
+    ("mutant", np.bool_),
+])
+
+# The approximate number of bytes of genome bases to read at once when
+# iterating over all stored molecules.
+CHUNK_BYTES = 64 * 1024 * 1024
+
+# The initial number of molecules (and of history events) a store has room for.
+INITIAL_CAPACITY = 1024
+
+
+class StoredRNA(RNA):
+    """
+    An RNA molecule held in an RNAStore. Its genome is only read from the store
+    when it is needed, and changes to its replication count are written back to
+    the store.
+
+    @param store: The RNAStore holding the molecule.
+    @param index: The index of the molecule in the store.
+    """
+
+    def __init__(self, store: "RNAStore", index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @cached_property
+    def genome(self) -> Genome:
+        return self.store.genome(self.index)
+
+    @property
+    def positive(self) -> bool:
+        return bool(self.store.positive[self.index])
+
+    @property
+    def replications(self) -> int:
+        return int(self.store.replications[self.index])
+
+    @replications.setter
+    def replications(self, replications: int) -> None:
+        self.store.replications[self.index] = replications
+
+
+class RNAStore:
+    """
+    Hold a population of RNA molecules in memory-mapped files, so that its size
+    is limited by disk space rather than by memory.
+
+    The bases of each molecule (as a row of base codes, see utils.BASES) are
+    appended to one file, and its mutation history events to another. Only
+    small per-molecule arrays (the sense, replication count, and where the
+    history events of each molecule are) are kept in memory. The files grow by
+    doubling, and the operating system keeps only recently used pages in
+    memory.
+
+    Instances act as a sequence of RNA molecules (see StoredRNA), so can be
+    used as the 'rnas' of a Cell. Iterating reads the files sequentially, in
+    large chunks. Genomes are stored (and returned) as full Genome instances,
+    so delta genomes are converted when they are added.
+
+    Instances can be pickled (e.g., to send a cell to another process). Only
+    the names of the files and the in-memory arrays are pickled, so a store
+    should only be used by one process at a time.
+
+    @param directory: The directory to make the files in. They are not removed
+        by the store, so this should be a temporary directory.
+    @param length: The genome length.
+    @param rnas: RNA instances to add to the store.
+    """
+
+    def __init__(self, directory: str, length: int, rnas: Iterable[RNA] = ()) -> None:
+        self.length = length
+        fd, self.bases_filename = tempfile.mkstemp(
+            dir=directory, prefix="bases-", suffix=".u8"
+        )
+        os.close(fd)
+        fd, self.events_filename = tempfile.mkstemp(
+            dir=directory, prefix="events-", suffix=".bin"
+        )
+        os.close(fd)
+
+        self.size = 0
+        self.n_events = 0
+        self.positive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.replications = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.events_start = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.events_count = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._map(INITIAL_CAPACITY, INITIAL_CAPACITY)
+        self.extend(rnas)
+
+    def __getstate__(self) -> dict:
+        self.flush()
+        state = self.__dict__.copy()
+        del state["bases"], state["events"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._map(len(self.positive), self._events_capacity)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> StoredRNA:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return StoredRNA(self, index)
+
+    def __iter__(self) -> Iterator[RNA]:
+        rows = max(1, CHUNK_BYTES // max(1, self.length))
+        for start in range(0, self.size, rows):
+            end = min(start + rows, self.size)
+            bases = np.array(self.bases[start:end])
+            first = int(self.events_start[start])
+            last = int(self.events_start[end - 1] + self.events_count[end - 1])
+            events = np.array(self.events[first:last])
+            for index in range(start, end):
+                event_start = int(self.events_start[index]) - first
+                rna = RNA(
+                    self._genome(
+                        bases[index - start],
+                        bool(self.positive[index]),
+                        events[event_start : event_start + self.events_count[index]],
+                    )
+                )
+                rna.replications = int(self.replications[index])
+                yield rna
+
+    def _map(self, capacity: int, events_capacity: int) -> None:
+        """
+        Map the files, making them big enough for the given number of molecules
+        and history events.
+        """
+        self._events_capacity = events_capacity
+        for name, dtype, shape in (
+            ("bases", np.uint8, (capacity, self.length)),
+            ("events", EVENT, (events_capacity,)),
+        ):
+            filename = getattr(self, name + "_filename")
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if os.path.getsize(filename) < size:
+                with open(filename, "r+b") as fp:
+                    fp.truncate(size)
+            setattr(self, name, np.memmap(filename, dtype, "r+", shape=shape))
+
+    def _genome(self, bases: np.ndarray, positive: bool, events: np.ndarray) -> Genome:
+        """
+        Make a genome from its stored bases and history events.
+        """
+        history: dict[int, History] = {}
+        mutant = []
+        for offset, change, event_positive, event_mutant in events.tolist():
+            history[offset] = history.get(offset, ()) + (
+                (CHANGES[change], event_positive),
+            )
+            if event_mutant:
+                mutant.append(offset)
+        return Genome(
+            bases, positive=positive, history=history, mutant=frozenset(mutant)
+        )
+
+    def genome(self, index: int) -> Genome:
+        """
+        Read the genome of a stored molecule.
+
+        @param index: The index of the molecule.
+        """
+        start = int(self.events_start[index])
+        return self._genome(
+            np.array(self.bases[index]),
+            bool(self.positive[index]),
+            self.events[start : start + self.events_count[index]],
+        )
+
+    def append(self, rna: RNA) -> None:
+        """
+        Add an RNA molecule to the store.
+
+        @param rna: The RNA to add.
+        """
+        genome = rna.genome
+        assert len(genome) == self.length
+        history = genome.history
+        if isinstance(genome, DeltaGenome) and not genome.positive:
+            # Delta genome offsets are in the (+) reference, so convert them to
+            # offsets in this (-) genome.
+            last = self.length - 1
+            history = {last - offset: events for offset, events in history.items()}
+            mutant = frozenset(last - offset for offset in genome.mutant)
+        else:
+            mutant = genome.mutant
+
+        events = [
+            (
+                offset,
+                4 * CODES[change[0]] + CODES[change[1]],
+                positive,
+                offset in mutant and index == len(site_events) - 1,
+            )
+            for offset, site_events in history.items()
+            for index, (change, positive) in enumerate(site_events)
+        ]
+
+        index, n_events = self.size, self.n_events
+        if index == len(self.positive) or n_events + len(events) > len(self.events):
+            self.flush()
+            self.positive = grow(self.positive, index + 1)
+            self.replications = grow(self.replications, index + 1)
+            self.events_start = grow(self.events_start, index + 1)
+            self.events_count = grow(self.events_count, index + 1)
+            events_capacity = len(self.events)
+            while events_capacity < n_events + len(events):
+                events_capacity *= 2
+            self._map(len(self.positive), events_capacity)
+
+        self.bases[index] = genome.bases
+        self.events[n_events : n_events + len(events)] = events
+        self.positive[index] = genome.positive
+        self.replications[index] = rna.replications
+        self.events_start[index] = n_events
+        self.events_count[index] = len(events)
+        self.size += 1
+        self.n_events += len(events)
+
+    def extend(self, rnas: Iterable[RNA]) -> None:
+        """
+        Add RNA molecules to the store.
+
+        @param rnas: An iterable of RNA instances.
+        """
+        for rna in rnas:
+            self.append(rna)
+
+    def clear(self) -> None:
+        """
+        Remove all molecules from the store. The files are kept, and reused as
+        molecules are added again.
+        """
+        self.size = 0
+        self.n_events = 0
+
+    def flush(self) -> None:
+        """
+        Write any changes to the mapped files to disk.
+        """
+        self.bases.flush()
+        self.events.flush()
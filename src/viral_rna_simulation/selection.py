@@ -0,0 +1,138 @@
+from typing import Iterable
+
+import numpy as np
+
+
+class Selection:
+    """
+    Hold non-negative weights in a Fenwick (binary indexed) tree, so an index
+    can be chosen at random with probability proportional to its weight, and
+    weights can be changed or added, in O(log n) time.
+
+    A weight of zero (e.g., for a molecule that has been removed) means the
+    index is never chosen. An index can also be removed altogether (see
+    swap_remove) in O(log n) time. With integer weights, choosing is exact, so (as in
+    Haplotypes) the tree can be used to find which of a run of items an offset
+    falls in.
+
+    @param weights: The initial weights.
+    """
+
+    def __init__(self, weights: Iterable[float] = ()) -> None:
+        self.weights = list(weights)
+        n = len(self.weights)
+        # The tree is one-based: self._tree[i] holds the sum of the weights with
+        # (zero-based) indices from i - (i & -i) up to i - 1.
+        tree = [0, *self.weights]
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self.total = sum(self.weights)
+        # The largest power of two that is not more than the number of weights.
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def append(self, weight: float) -> None:
+        """
+        Add a weight, with the next index.
+
+        @param weight: The weight.
+        """
+        self.weights.append(weight)
+        i = len(self.weights)
+        # The new node covers the weights from i - (i & -i) to i - 1, so add the
+        # nodes that cover all but the last of those.
+        tree = self._tree
+        value = weight
+        j = i - 1
+        stop = i - (i & -i)
+        while j > stop:
+            value += tree[j]
+            j -= j & -j
+        tree.append(value)
+        self.total += weight
+        if i >= 2 * self._top:
+            self._top = i
+
+    def update(self, index: int, weight: float) -> None:
+        """
+        Change a weight.
+
+        @param index: The index of the weight.
+        @param weight: The new weight.
+        """
+        change = weight - self.weights[index]
+        self.weights[index] = weight
+        self.total += change
+        tree = self._tree
+        n = len(tree) - 1
+        i = index + 1
+        while i <= n:
+            tree[i] += change
+            i += i & -i
+
+    def remove(self, index: int) -> None:
+        """
+        Stop an index from being chosen, by setting its weight to zero.
+
+        @param index: The index to remove.
+        """
+        self.update(index, 0)
+
+    def swap_remove(self, index: int) -> None:
+        """
+        Remove an index altogether, by moving the last weight into its place
+        and dropping the last index.
+
+        @param index: The index to remove.
+        """
+        last = len(self.weights) - 1
+        if index != last:
+            self.update(index, self.weights[last])
+        # No other node includes the last one, so it can simply be dropped.
+        self.total -= self.weights.pop()
+        self._tree.pop()
+        if last < self._top:
+            self._top >>= 1
+
+    def find(self, value: float) -> int:
+        """
+        Find the index whose weight spans a value, i.e., the smallest index
+        whose cumulative weight (including its own) is greater than the value.
+
+        @param value: A value from zero up to (but not including) self.total.
+        @return: The index.
+        """
+        tree = self._tree
+        n = len(tree) - 1
+        position = 0
+        step = self._top
+        while step:
+            following = position + step
+            if following <= n and tree[following] <= value:
+                position = following
+                value -= tree[following]
+            step >>= 1
+
+        # Rounding in floating point sums can (very rarely) put a value just
+        # below the total past the last index, or on a weight of zero.
+        while position and (position == n or not self.weights[position]):
+            position -= 1
+
+        return position
+
+    def sample(self, rng: np.random.Generator) -> int:
+        """
+        Choose an index at random, with probability proportional to its weight.
+
+        @param rng: The random number generator to use.
+        @raise ValueError: If all the weights are zero.
+        @return: The chosen index.
+        """
+        if self.total <= 0:
+            raise ValueError("Cannot choose from weights that are all zero.")
+        return self.find(rng.random() * self.total)
@@ -1,5 +1,12 @@
+import numpy as np
+
+from viral_rna_simulation.array_cells import ArrayCells
 from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.checkpoint import load_checkpoint, save_checkpoint
 from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.profiling import phase
+from viral_rna_simulation.resident_cells import ResidentCells
+from viral_rna_simulation.spectrum import MutationSpectrum
 
 
 def run(
@@ -10,15 +17,246 @@ def run(
     mutation_rate: float,
     steps: int,
     ratio: int,
+    delta: bool = False,
+    haplotypes: bool = False,
+    engine: str = "cells",
+    backend: str = "auto",
+    check: bool = False,
+    seed: int | None = None,
+    checkpoint_every: int | None = None,
+    checkpoint_filename: str | None = None,
+    rna_directory: str | None = None,
+    record_every: int | None = None,
+    negative_propensity: float = 1.0,
+    positive_decay: float = 0.0,
+    negative_decay: float = 0.0,
+    max_rnas: int | None = None,
+    mutation_spectrum: MutationSpectrum | None = None,
 ) -> Cells:
     """
     Simulate a number of cells.
+
+    @param engine: Either 'cells', to replicate each cell with its own Cell
+        instance, 'resident', to have worker processes make and keep the cells
+        and only return aggregate counts (see ResidentCells), or 'arrays', to
+        replicate all cells at once with the molecules of all cells held in
+        shared arrays (see ArrayCells). The 'delta' and 'haplotypes' arguments
+        are ignored by the 'arrays' engine.
+    @param backend: How the 'cells' engine should run the replication of the
+        cells. See Cells.replicate.
+    @param check: If True, check the running totals kept by the cells against a
+        full recount of all RNA molecules. This is slow, and is for debugging.
+        It is ignored by the 'arrays' engine.
+    @param seed: The random seed. If None, results will not be reproducible.
+        Otherwise, the same seed (and arguments) will give the same results,
+        whatever the backend or number of workers.
+    @param checkpoint_every: If not None, save a checkpoint (see save_checkpoint)
+        to 'checkpoint_filename' after every this many replication steps. Only
+        the 'cells' engine can be checkpointed.
+    @param checkpoint_filename: The file to save checkpoints to.
+    @param rna_directory: If not None, store the RNA molecules of each cell in
+        memory-mapped files in (a temporary directory made in) this directory.
+        See RNAStore. It is ignored by the 'arrays' engine.
+    @param record_every: If not None, record the running totals of each cell
+        after every this many replication steps (see Cells.record_trajectory).
+        The 'arrays' engine cannot record them.
+    @param negative_propensity: How likely a (-) molecule is to be chosen for
+        replication, relative to a (+) molecule (see
+        Cell.set_negative_propensity). The 'arrays' engine only supports one.
+    @param positive_decay: The probability that each (+) molecule degrades at
+        the end of each replication step (see Cell.degrade).
+    @param negative_decay: The probability that each (-) molecule degrades at
+        the end of each replication step. Neither the 'arrays' engine nor
+        molecules stored in 'rna_directory' allow degradation.
+    @param max_rnas: If not None, the carrying capacity of each cell. A cell is
+        downsampled to half this many molecules when it reaches it, and the
+        reported totals are scaled up to match (see Cell.downsample). Not
+        allowed with the 'arrays' engine or 'rna_directory'.
+    @param mutation_spectrum: If not None, the context-dependent mutation rates
+        and substitutions to use instead of 'mutation_rate' (see
+        MutationSpectrum). Not allowed with the 'arrays' engine.
+    """
+    if checkpoint_every and engine != "cells":
+        raise ValueError(f"The {engine!r} engine cannot be checkpointed.")
+
+    if record_every and engine == "arrays":
+        raise ValueError("The 'arrays' engine cannot record trajectories.")
+
+    if negative_propensity != 1.0 and engine == "arrays":
+        raise ValueError("The 'arrays' engine can only choose molecules uniformly.")
+
+    if (positive_decay or negative_decay) and (
+        engine == "arrays" or rna_directory is not None
+    ):
+        raise ValueError(
+            "RNA molecules cannot degrade with the 'arrays' engine or when they "
+            "are stored on disk."
+        )
+
+    if max_rnas is not None and (engine == "arrays" or rna_directory is not None):
+        raise ValueError(
+            "Cells cannot be downsampled with the 'arrays' engine or when their "
+            "molecules are stored on disk."
+        )
+
+    if max_rnas is not None and max_rnas < 2:
+        raise ValueError(f"The carrying capacity must be at least 2 (not {max_rnas}).")
+
+    if mutation_spectrum is not None and engine == "arrays":
+        raise ValueError("The 'arrays' engine cannot use a mutation spectrum.")
+
+    # Use independent random number streams for making a random infecting genome
+    # and for the cells.
+    genome_seed, cells_seed = np.random.SeedSequence(seed).spawn(2)
+    with phase("Genome construction"):
+        infecting_genome = Genome(
+            genome, genome_length, rng=np.random.default_rng(genome_seed)
+        )
+    with phase("Cells construction"):
+        if engine == "arrays":
+            cells = ArrayCells(n_cells, infecting_genome, seed=cells_seed)
+        elif engine == "resident":
+            cells = ResidentCells(
+                n_cells,
+                infecting_genome,
+                delta=delta,
+                haplotypes=haplotypes,
+                check=check,
+                seed=cells_seed,
+                rna_directory=rna_directory,
+            )
+        else:
+            assert engine == "cells"
+            cells = Cells(
+                n_cells,
+                infecting_genome,
+                delta=delta,
+                haplotypes=haplotypes,
+                check=check,
+                seed=cells_seed,
+                rna_directory=rna_directory,
+            )
+
+    if record_every:
+        cells.record_trajectory(record_every, steps)
+
+    replicate(
+        cells,
+        {
+            "steps": steps,
+            "mutate_in": mutate_in,
+            "mutation_rate": mutation_rate,
+            "ratio": ratio,
+            "negative_propensity": negative_propensity,
+            "positive_decay": positive_decay,
+            "negative_decay": negative_decay,
+            "max_rnas": max_rnas,
+            "mutation_spectrum": (
+                None if mutation_spectrum is None else mutation_spectrum.to_list()
+            ),
+        },
+        backend=backend,
+        checkpoint_every=checkpoint_every,
+        checkpoint_filename=checkpoint_filename,
+    )
+
+    return cells
+
+
+def resume(
+    filename: str,
+    backend: str = "auto",
+    check: bool = False,
+    checkpoint_every: int | None = None,
+    checkpoint_filename: str | None = None,
+    rna_directory: str | None = None,
+    record_every: int | None = None,
+) -> Cells:
     """
-    infecting_genome = Genome(genome, genome_length)
-    cells = Cells(n_cells, infecting_genome)
+    Continue a simulation from a checkpoint, using the replication parameters
+    saved in it. The result is the same as if the simulation had not been
+    interrupted.
 
-    cells.replicate(
-        steps=steps, mutate_in=mutate_in, mutation_rate=mutation_rate, ratio=ratio
+    @param filename: The checkpoint file to resume from.
+    @param backend: How to run the replication of the cells. See Cells.replicate.
+    @param check: If True, check the running totals kept by the cells against a
+        full recount of all RNA molecules.
+    @param checkpoint_every: If not None, save a checkpoint after every this many
+        further replication steps.
+    @param checkpoint_filename: The file to save checkpoints to. If None, the
+        checkpoint being resumed from is overwritten.
+    @param rna_directory: If not None, store the RNA molecules of each cell in
+        memory-mapped files in (a temporary directory made in) this directory.
+    @param record_every: If not None, record the running totals of each cell
+        after every this many replication steps, from the checkpoint onwards.
+    """
+    with phase("load checkpoint"):
+        cells, step, parameters = load_checkpoint(
+            filename, check=check, rna_directory=rna_directory
+        )
+    if record_every:
+        cells.record_trajectory(record_every, parameters["steps"], step)
+    replicate(
+        cells,
+        parameters,
+        start=step,
+        backend=backend,
+        checkpoint_every=checkpoint_every,
+        checkpoint_filename=checkpoint_filename or filename,
     )
 
     return cells
+
+
+def replicate(
+    cells: Cells,
+    parameters: dict,
+    start: int = 0,
+    backend: str = "auto",
+    checkpoint_every: int | None = None,
+    checkpoint_filename: str | None = None,
+) -> None:
+    """
+    Replicate cells, perhaps saving checkpoints along the way.
+
+    @param cells: The cells to replicate.
+    @param parameters: A dict with the total number of replication 'steps' and
+        the 'mutate_in', 'mutation_rate', 'ratio' and (optionally, for
+        checkpoints saved before they existed) 'negative_propensity',
+        'positive_decay', 'negative_decay', 'max_rnas' and 'mutation_spectrum'
+        (as nested lists of rates, see MutationSpectrum.to_list) arguments
+        for Cells.replicate.
+        This is saved in each checkpoint.
+    @param start: The number of replication steps already done.
+    @param backend: How to run the replication of the cells. See Cells.replicate.
+    @param checkpoint_every: If not None, save a checkpoint to
+        'checkpoint_filename' after every this many replication steps.
+    @param checkpoint_filename: The file to save checkpoints to.
+    """
+    spectrum = parameters.get("mutation_spectrum")
+    kwargs = {
+        "mutate_in": parameters["mutate_in"],
+        "mutation_rate": parameters["mutation_rate"],
+        "ratio": parameters["ratio"],
+        "negative_propensity": parameters.get("negative_propensity", 1.0),
+        "positive_decay": parameters.get("positive_decay", 0.0),
+        "negative_decay": parameters.get("negative_decay", 0.0),
+        "max_rnas": parameters.get("max_rnas"),
+        "mutation_spectrum": None if spectrum is None else MutationSpectrum(spectrum),
+        "backend": backend,
+    }
+    steps = parameters["steps"]
+
+    if not checkpoint_every:
+        with phase("replicate"):
+            cells.replicate(steps=steps - start, **kwargs)
+        return
+
+    assert checkpoint_filename
+    while start < steps:
+        chunk = min(checkpoint_every, steps - start)
+        with phase("replicate"):
+            cells.replicate(steps=chunk, **kwargs)
+        start += chunk
+        with phase("save checkpoint"):
+            save_checkpoint(cells, checkpoint_filename, start, parameters)
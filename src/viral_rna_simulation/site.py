@@ -1,6 +1,6 @@
-from random import uniform
+import numpy as np
 
-from viral_rna_simulation.utils import mutate_base, rc1
+from viral_rna_simulation.utils import RNG, mutate_base, rc1
 
 
 class Site:
@@ -43,18 +43,25 @@ class Site:
             return self.base == other.base
         return NotImplemented
 
-    def replicate(self, positive: bool, mutation_rate: float = 0.0) -> "Site":
+    def replicate(
+        self,
+        positive: bool,
+        mutation_rate: float = 0.0,
+        rng: np.random.Generator | None = None,
+    ) -> "Site":
         """
         Make a replicate (in reverse complement) of this site.
 
         @param positive: The (+/-) state of the new site.
         @param mutation_rate: The mutation rate used to decide whether the new
             site should be a mutant.
+        @param rng: The random number generator to use.
         """
+        rng = RNG if rng is None else rng
         rc_base = rc1(self.base)
-        if mutation_rate > 0.0 and uniform(0.0, 1.0) <= mutation_rate:
+        if mutation_rate > 0.0 and rng.random() <= mutation_rate:
             mutant = True
-            new_base = mutate_base(rc_base)
+            new_base = mutate_base(rc_base, rng)
             change = rc_base + new_base
             # Or: change = self.base + new_base (depends on what we're saying changed).
             mutation_history = self.mutation_history + [(change, positive)]
@@ -69,4 +76,6 @@ class Site:
         """
         Return a reverse-complemented site.
         """
-        return Site(rc1(self.base), mutant=False, mutation_history=self.mutation_history[:])
+        return Site(
+            rc1(self.base), mutant=False, mutation_history=self.mutation_history[:]
+        )
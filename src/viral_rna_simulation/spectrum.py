@@ -0,0 +1,449 @@
+from typing import Callable, Collection
+
+import numpy as np
+
+from viral_rna_simulation.utils import BASES, CODES, RNG, rc_codes
+
+# The strands that can be made, in the order of the first axis of a rates array.
+STRANDS = ("+", "-")
+
+# The code of the (missing) neighbour of a site at either end of a genome.
+END = len(BASES)
+
+# The number of context classes in an index. A class is given by the code of
+# the base of a site and those of its neighbours (which may be END), as
+# 20 * left + 5 * middle + right.
+CLASSES = (END + 1) * len(BASES) * (END + 1)
+
+# The largest number of (copy, site) pairs of sites whose context has changed
+# for which to make a random draw for each pair, rather than group the sites by
+# context class (see SpectrumIndex.mutations).
+DIRECT = 1024
+
+# The number of spectrum indexes (one per infecting genome) to keep.
+CACHED_INDEXES = 4
+
+
+def context_classes(codes: np.ndarray) -> np.ndarray:
+    """
+    Find the context class of each site of a sequence.
+
+    @param codes: An array of base codes.
+    @return: An int array with the context class of each site.
+    """
+    codes = codes.astype(np.intp)
+    left = np.full(len(codes), END, dtype=np.intp)
+    right = left.copy()
+    left[1:] = codes[:-1]
+    right[:-1] = codes[1:]
+    return 5 * len(BASES) * left + 5 * codes + right
+
+
+def alias_table(probabilities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Make an alias table (by Vose's method) for choosing an outcome in O(1) time.
+
+    An outcome is chosen by picking a column i uniformly at random and then
+    taking i with probability 'accept[i]', or else 'alias[i]'.
+
+    @param probabilities: The (non-negative) probabilities of the outcomes. If
+        they are all zero, all outcomes are equally likely.
+    @return: A 2-tuple with the float array of acceptance probabilities and the
+        int array of aliases.
+    """
+    n = len(probabilities)
+    total = probabilities.sum()
+    scaled = (
+        np.ones(n) if total <= 0.0 else probabilities * (n / total)
+    ).tolist()
+    accept = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+
+    while small and large:
+        less, more = small.pop(), large.pop()
+        accept[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+
+    # Anything left over has a probability of (within rounding) one.
+    return accept, alias
+
+
+class MutationSpectrum:
+    """
+    Per-site substitution probabilities that depend on the strand being made
+    and on the trinucleotide context of the site.
+
+    The context of a site is read 5' to 3' on the strand being made, as it
+    would be if copied without error: the base before the site, the base of the
+    site, and the base after it. E.g., if the rate for strand 1, context TCA
+    (i.e., 16 * 3 + 4 * 1 + 0) and new base T (3) is 1e-4, the C of every TCA
+    made in (-) strand synthesis becomes a T with probability 1e-4. A site at
+    an end of a genome has a missing neighbour, and its rates are the average
+    of those of the four contexts with a base in the place of that neighbour.
+
+    @param rates: A float array of shape (2, 64, 4). The first axis is the strand
+        made (see STRANDS), the second is the context, as 16 * left + 4 * middle
+        + right base codes, and the third is the code of the new base. The rate
+        for a new base that is the same as the middle base is ignored (i.e.,
+        treated as zero).
+    @raise ValueError: If the rates have the wrong shape, are negative, or give a
+        total mutation probability of more than one for any context.
+    """
+
+    def __init__(self, rates: np.ndarray | list) -> None:
+        rates = np.array(rates, dtype=float)
+        if rates.shape != (len(STRANDS), 64, len(BASES)):
+            raise ValueError(
+                f"Mutation spectrum rates have shape {rates.shape}, not "
+                f"{(len(STRANDS), 64, len(BASES))}."
+            )
+        middle = (np.arange(64) // 4) % 4
+        rates[:, np.arange(64), middle] = 0.0
+        if (rates < 0.0).any():
+            raise ValueError("Mutation spectrum rates cannot be negative.")
+        if (rates.sum(axis=2) > 1.0).any():
+            raise ValueError(
+                "The total mutation rate of a context in a mutation spectrum "
+                "cannot be more than one."
+            )
+        self.rates = rates
+        self._indexes: dict[bytes, SpectrumIndex] = {}
+
+    def __eq__(self, other: object, /) -> bool:
+        if isinstance(other, MutationSpectrum):
+            return np.array_equal(self.rates, other.rates)
+        return NotImplemented
+
+    def __getstate__(self) -> dict:
+        # The indexes are big, and quick to rebuild, so they are not pickled
+        # (e.g., when cells are sent to other processes).
+        return {"rates": self.rates}
+
+    def __setstate__(self, state: dict) -> None:
+        self.rates = state["rates"]
+        self._indexes = {}
+
+    @classmethod
+    def uniform(cls, mutation_rate: float) -> "MutationSpectrum":
+        """
+        Make a spectrum with the same rate for all contexts and substitutions,
+        i.e., the usual uniform mutation model.
+
+        @param mutation_rate: The per-base mutation probability.
+        """
+        return cls(np.full((len(STRANDS), 64, len(BASES)), mutation_rate / 3))
+
+    def to_list(self) -> list:
+        """
+        Get the rates as (JSON serializable) nested lists.
+        """
+        return self.rates.tolist()
+
+    def index(self, codes: np.ndarray) -> "SpectrumIndex":
+        """
+        Get the index of the context positions of an (infecting) genome. Indexes
+        are kept for the most recently used genomes, so all the cells infected
+        with a genome share one.
+
+        @param codes: The base codes of the (+) genome that the molecules to be
+            copied descend from.
+        @return: A SpectrumIndex.
+        """
+        key = codes.tobytes()
+        index = self._indexes.pop(key, None)
+        if index is None:
+            index = SpectrumIndex(self, codes)
+            if len(self._indexes) >= CACHED_INDEXES:
+                del self._indexes[next(iter(self._indexes))]
+        # Re-insert, so the dict is in order of use.
+        self._indexes[key] = index
+        return index
+
+
+def read_spectrum(filename: str) -> MutationSpectrum:
+    """
+    Read a mutation spectrum from a file.
+
+    The file is tab-separated, with a header line and then lines with a strand
+    ('+', '-' or 'both'), a context (three of ACGTN, where N matches any
+    base), a new base and a per-site rate. E.g.,
+
+        strand  context  to  rate
+        both    NNN      A   3e-5
+        -       TCN      T   1e-4
+
+    Each line sets the rate of changing the middle base of each matching
+    context to the new base, and later lines override earlier ones. Rates that
+    are not set are zero. Blank lines and lines starting with '#' are ignored.
+
+    @param filename: The file to read.
+    @raise ValueError: If a line cannot be understood, or the rates are not
+        valid (see MutationSpectrum).
+    @return: A MutationSpectrum.
+    """
+    rates = np.zeros((len(STRANDS), 64, len(BASES)))
+    header = True
+
+    with open(filename) as fp:
+        for number, line in enumerate(fp, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if header:
+                header = False
+                continue
+            fields = line.split()
+            try:
+                strand, context, to, rate = fields
+                if len(context) != 3:
+                    raise ValueError()
+                strands = [0, 1] if strand == "both" else [STRANDS.index(strand)]
+                contexts = [
+                    (CODES[b1] * 16 + CODES[b2] * 4 + CODES[b3])
+                    for b1 in _matching(context[0])
+                    for b2 in _matching(context[1])
+                    for b3 in _matching(context[2])
+                ]
+                rates[np.ix_(strands, contexts, [CODES[to]])] = float(rate)
+            except (IndexError, KeyError, ValueError):
+                raise ValueError(
+                    f"Could not understand line {number} of mutation spectrum "
+                    f"file {filename!r}: {line!r}."
+                )
+
+    return MutationSpectrum(rates)
+
+
+def _matching(base: str) -> str:
+    """
+    Get the bases matched by a context base.
+    """
+    if base == "N":
+        return BASES
+    if base in CODES:
+        return base
+    raise ValueError(f"Unknown context base {base!r}.")
+
+
+class SpectrumIndex:
+    """
+    A mutation spectrum together with a precomputed index of the positions of
+    each context in a genome, in both senses, for choosing the mutations of
+    copies of that genome (and of genomes that descend from it).
+
+    The sites of a genome are grouped by context class, so the number of
+    mutated sites in each class can be drawn with one (vectorized) binomial
+    draw, and those sites chosen uniformly from the sites of the class. The
+    new bases are chosen with alias tables. Only the sites next to (or at) a
+    site where the genome being copied may differ from the indexed one have a
+    context that needs to be found as they are copied.
+
+    @param spectrum: The MutationSpectrum.
+    @param codes: The base codes of the (+) genome to index.
+    """
+
+    def __init__(self, spectrum: MutationSpectrum, codes: np.ndarray) -> None:
+        self.length = len(codes)
+
+        # Expand the rates to all context classes, averaging over the missing
+        # neighbours of the sites at the ends.
+        rates = np.zeros((len(STRANDS), CLASSES, len(BASES)))
+        for left in range(END + 1):
+            for middle in range(len(BASES)):
+                for right in range(END + 1):
+                    contexts = [
+                        16 * b1 + 4 * middle + b3
+                        for b1 in (range(END) if left == END else (left,))
+                        for b3 in (range(END) if right == END else (right,))
+                    ]
+                    rates[:, 20 * left + 5 * middle + right] = spectrum.rates[
+                        :, contexts
+                    ].mean(axis=1)
+
+        self.totals = rates.sum(axis=2)
+        self.accept = np.empty_like(rates)
+        self.alias = np.empty(rates.shape, dtype=np.intp)
+        for strand in range(len(STRANDS)):
+            for context in range(CLASSES):
+                self.accept[strand, context], self.alias[strand, context] = (
+                    alias_table(rates[strand, context])
+                )
+
+        # For each sense: the class of each site, and the sites grouped by
+        # class (see group).
+        self.site_classes: list[np.ndarray] = []
+        self.groups: list[tuple] = []
+        for strand, sense in enumerate((codes, rc_codes(codes))):
+            classes = context_classes(sense)
+            self.site_classes.append(classes)
+            self.groups.append(self.group(strand, np.arange(len(classes)), classes))
+
+    def group(self, strand: int, sites: np.ndarray, classes: np.ndarray) -> tuple:
+        """
+        Group sites by context class, for choosing the mutated ones (see
+        choose).
+
+        @param strand: The index (in STRANDS) of the strand being made.
+        @param sites: An int array of site offsets.
+        @param classes: An int array with the context class of each site.
+        @return: A 5-tuple with the sites ordered by class, the index in that
+            order of the first site of each class, the number of sites of each
+            class, and the classes that have sites and a non-zero rate, with
+            their rates.
+        """
+        sizes = np.bincount(classes, minlength=CLASSES)
+        active = np.flatnonzero((sizes > 0) & (self.totals[strand] > 0.0))
+        return (
+            sites[np.argsort(classes, kind="stable")],
+            np.cumsum(sizes) - sizes,
+            sizes,
+            active,
+            self.totals[strand, active],
+        )
+
+    def choose(
+        self, group: tuple, count: int, rng: np.random.Generator
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Choose the mutated sites of copies, from grouped sites.
+
+        The number of mutated sites of each class in each copy is drawn with
+        one binomial draw, and the sites are chosen uniformly from those of
+        their class.
+
+        @param group: The grouped sites (see group).
+        @param count: The number of copies.
+        @param rng: The random number generator to use.
+        @return: A 3-tuple of int arrays with the copy, offset and class of each
+            mutated site.
+        """
+        order, starts, sizes, classes, rates = group
+        drawn = rng.binomial(sizes[classes], rates, (count, len(classes)))
+        rows, columns = np.nonzero(drawn)
+        repeats = drawn[rows, columns]
+        copies = np.repeat(rows, repeats)
+        site_classes = np.repeat(classes[columns], repeats)
+
+        # Choose again any site that was chosen twice for a copy (which is
+        # rare).
+        sites = np.empty(len(copies), dtype=np.intp)
+        redo = slice(None)
+        while True:
+            chosen = site_classes[redo]
+            within = (rng.random(len(chosen)) * sizes[chosen]).astype(np.intp)
+            sites[redo] = order[starts[chosen] + within]
+            if len(sites) < 2 or repeats.max() < 2:
+                break
+            _, first = np.unique(copies * self.length + sites, return_index=True)
+            if len(first) == len(sites):
+                break
+            redo = np.setdiff1d(np.arange(len(sites)), first)
+
+        return copies, sites, site_classes
+
+    def substitutions(
+        self, strand: int, classes: np.ndarray, rng: np.random.Generator
+    ) -> np.ndarray:
+        """
+        Choose the new bases of mutated sites.
+
+        @param strand: The index (in STRANDS) of the strand being made.
+        @param classes: An int array with the context class of each site.
+        @param rng: The random number generator to use.
+        @return: An int array with the code of the new base of each site.
+        """
+        uniform = rng.random(len(classes)) * len(BASES)
+        columns = uniform.astype(np.intp)
+        accepted = uniform - columns < self.accept[strand, classes, columns]
+        return np.where(accepted, columns, self.alias[strand, classes, columns])
+
+    def mutations(
+        self,
+        positive: bool,
+        different: Collection[int],
+        read: Callable[[np.ndarray], np.ndarray] | None,
+        count: int,
+        rng: np.random.Generator | None = None,
+    ) -> list[dict[int, int]]:
+        """
+        Choose the mutations of copies of a genome.
+
+        @param positive: True if the copies are (+) sense.
+        @param different: The offsets (in the copies) of all sites where the
+            copies (without their mutations) may differ from the indexed genome
+            (in the same sense). It does no harm to include other sites.
+        @param read: A function that takes an array of offsets and returns the
+            codes of the bases of the copies (without their mutations) at them.
+            This is only called if 'different' is not empty.
+        @param count: The number of copies.
+        @param rng: The random number generator to use.
+        @return: A list with a dict for each copy, mapping the offsets of its
+            mutated sites to their new base codes.
+        """
+        rng = RNG if rng is None else rng
+        strand = 0 if positive else 1
+        copies, sites, site_classes = self.choose(self.groups[strand], count, rng)
+
+        if different:
+            # Find the sites whose context may not be the indexed one (those
+            # next to or at a different site), by marking them (with a margin,
+            # for the ends).
+            offsets = np.fromiter(different, dtype=np.intp, count=len(different))
+            marked = np.zeros(self.length + 2, dtype=bool)
+            for shift in range(3):
+                marked[offsets + shift] = True
+            nearby = np.flatnonzero(marked[1:-1])
+
+            # Only the first and last of the (sorted) sites can be at an end.
+            last = self.length - 1
+            window = np.add.outer((-1, 0, 1), nearby)
+            codes = read(np.clip(window, 0, last).ravel()).reshape(window.shape)
+            codes = codes.astype(np.intp)
+            if nearby[0] == 0:
+                codes[0, 0] = END
+            if nearby[-1] == last:
+                codes[2, -1] = END
+            nearby_classes = 20 * codes[0] + 5 * codes[1] + codes[2]
+            changed = nearby_classes != self.site_classes[strand][nearby]
+
+            if changed.any():
+                # The sites whose context has changed are chosen separately,
+                # with the rates for their contexts, in place of any chosen
+                # with the indexed contexts.
+                marked[:] = False
+                nearby = nearby[changed]
+                nearby_classes = nearby_classes[changed]
+                marked[nearby] = True
+                keep = ~marked[sites]
+                if count * len(nearby) <= DIRECT:
+                    rows, columns = np.nonzero(
+                        rng.random((count, len(nearby)))
+                        < self.totals[strand, nearby_classes]
+                    )
+                    more = rows, nearby[columns], nearby_classes[columns]
+                else:
+                    more = self.choose(
+                        self.group(strand, nearby, nearby_classes), count, rng
+                    )
+                copies = np.concatenate((copies[keep], more[0]))
+                sites = np.concatenate((sites[keep], more[1]))
+                site_classes = np.concatenate((site_classes[keep], more[2]))
+
+        new = self.substitutions(strand, site_classes, rng)
+
+        if count == 1:
+            return [dict(zip(sites.tolist(), new.tolist()))]
+
+        # Group the mutations by copy.
+        order = np.argsort(copies, kind="stable")
+        bounds = np.searchsorted(copies[order], np.arange(count + 1)).tolist()
+        sites = sites[order].tolist()
+        new = new[order].tolist()
+        return [
+            dict(zip(sites[start:end], new[start:end]))
+            for start, end in zip(bounds, bounds[1:])
+        ]
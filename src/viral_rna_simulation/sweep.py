@@ -0,0 +1,208 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from typing import IO, Iterator, Sequence
+
+import numpy as np
+
+from viral_rna_simulation.simulate import run
+
+# The columns of a sweep result row. The first seven describe the job, and the
+# rest are its results.
+COLUMNS = (
+    "job",
+    "replicate",
+    "seed",
+    "genome_length",
+    "mutation_rate",
+    "ratio",
+    "mutate_in",
+    "positive_rnas",
+    "negative_rnas",
+    "positive_replications",
+    "negative_replications",
+    "positive_mutations",
+    "negative_mutations",
+    "apparent_from_positive",
+    "apparent_from_negative",
+    "actual_rate",
+    "apparent_rate",
+)
+
+
+def sweep_jobs(
+    mutation_rates: Sequence[float] = (0.001,),
+    ratios: Sequence[int] = (1,),
+    mutate_ins: Sequence[str] = ("both",),
+    genome_lengths: Sequence[int] = (1000,),
+    replicates: int = 1,
+    seed: int | None = None,
+) -> list[dict]:
+    """
+    Make a job for every replicate of every combination of parameter values.
+
+    @param mutation_rates: The per-base mutation rates.
+    @param ratios: The numbers of +RNA molecules to make from a -RNA.
+    @param mutate_ins: The types of RNA molecules to allow mutations in.
+    @param genome_lengths: The lengths of the (random) infecting genomes.
+    @param replicates: The number of times to run each combination.
+    @param seed: The random seed from which the (integer) seed of each job is
+        made. If None, fresh OS entropy is used. A job can be re-run on its own
+        by giving its seed (and parameters) to 'run' or the simulation CLI.
+    @return: A list of job dicts, with keys given by the first seven COLUMNS.
+    """
+    combinations = list(product(genome_lengths, mutation_rates, ratios, mutate_ins))
+    seeds = np.random.SeedSequence(seed).generate_state(
+        len(combinations) * replicates, dtype=np.uint64
+    )
+    jobs = []
+
+    for (genome_length, mutation_rate, ratio, mutate_in), replicate in product(
+        combinations, range(replicates)
+    ):
+        jobs.append({
+            "job": len(jobs),
+            "replicate": replicate,
+            "seed": int(seeds[len(jobs)]),
+            "genome_length": genome_length,
+            "mutation_rate": mutation_rate,
+            "ratio": ratio,
+            "mutate_in": mutate_in,
+        })
+
+    return jobs
+
+
+def run_job(
+    job: dict,
+    n_cells: int = 1,
+    steps: int = 1000,
+    delta: bool = False,
+    haplotypes: bool = False,
+    engine: str = "cells",
+) -> dict:
+    """
+    Run the simulation for one sweep job.
+
+    The cells are replicated serially, since sweep jobs are themselves run in
+    parallel.
+
+    @param job: A job dict, as made by 'sweep_jobs'.
+    @return: A result row dict, with keys given by COLUMNS.
+    """
+    cells = run(
+        n_cells,
+        None,
+        job["genome_length"],
+        job["mutate_in"],
+        job["mutation_rate"],
+        steps,
+        job["ratio"],
+        delta=delta,
+        haplotypes=haplotypes,
+        engine=engine,
+        backend="serial",
+        seed=job["seed"],
+    )
+
+    positive_rnas, negative_rnas = cells.rna_count()
+    positive_replications, negative_replications = cells.replication_count()
+    positive_mutations, negative_mutations = (
+        sum(counts.values()) for counts in cells.mutation_counts()
+    )
+    from_positive, from_negative = (
+        sum(counts.values()) for counts in cells.apparent_mutation_counts()
+    )
+    length = job["genome_length"]
+    replications = positive_replications + negative_replications
+    rnas = positive_rnas + negative_rnas
+
+    return job | {
+        "positive_rnas": positive_rnas,
+        "negative_rnas": negative_rnas,
+        "positive_replications": positive_replications,
+        "negative_replications": negative_replications,
+        "positive_mutations": positive_mutations,
+        "negative_mutations": negative_mutations,
+        "apparent_from_positive": from_positive,
+        "apparent_from_negative": from_negative,
+        # Actual mutations per replicated site (as in Cells.summary) and
+        # apparent mutations per sequenced site.
+        "actual_rate": (
+            (positive_mutations + negative_mutations) / (replications * length)
+            if replications
+            else 0.0
+        ),
+        "apparent_rate": (from_positive + from_negative) / (rnas * length),
+    }
+
+
+def sweep(
+    jobs: Sequence[dict],
+    n_cells: int = 1,
+    steps: int = 1000,
+    delta: bool = False,
+    haplotypes: bool = False,
+    engine: str = "cells",
+    workers: int | None = None,
+) -> Iterator[dict]:
+    """
+    Run sweep jobs over one shared pool of worker processes, so the cost of
+    starting processes (and importing this package) is paid once per worker
+    rather than once per job.
+
+    @param jobs: The job dicts to run, as made by 'sweep_jobs'.
+    @param n_cells: The number of cells to simulate in each job.
+    @param steps: The number of replication steps in each job.
+    @param delta: If True, RNA genomes will only store their differences from
+        the infecting genome (see DeltaGenome).
+    @param haplotypes: If True, each cell will store identical RNA molecules just
+        once, along with their number (see Haplotypes).
+    @param engine: Either 'cells' or 'arrays' (see simulate.run). The
+        'resident' engine starts its own worker processes, so cannot be used.
+    @param workers: The number of worker processes. The default is the number of
+        CPUs. If there is only one worker (or job), jobs are run in this process.
+    @return: A generator yielding a result row dict (see 'run_job') for each job,
+        in the order in which the jobs finish.
+    """
+    if engine not in ("cells", "arrays"):
+        raise ValueError(f"Unknown or unsupported sweep engine {engine!r}.")
+
+    kwargs = {
+        "n_cells": n_cells,
+        "steps": steps,
+        "delta": delta,
+        "haplotypes": haplotypes,
+        "engine": engine,
+    }
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+
+    if workers <= 1:
+        for job in jobs:
+            yield run_job(job, **kwargs)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_job, job, **kwargs) for job in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def write_rows(rows: Iterator[dict], fp: IO[str]) -> int:
+    """
+    Write result rows as TSV, flushing after each so results can be watched (or
+    used) while a sweep is still running.
+
+    @param rows: An iterable of result row dicts, as yielded by 'sweep'.
+    @param fp: An open file to write to.
+    @return: The number of rows written.
+    """
+    writer = csv.DictWriter(fp, COLUMNS, delimiter="\t", lineterminator="\n")
+    writer.writeheader()
+    count = 0
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        fp.flush()
+
+    return count
@@ -0,0 +1,86 @@
+import numpy as np
+import polars as pl
+
+from viral_rna_simulation.counts import TOTALS
+
+
+class Trajectory:
+    """
+    Hold the running totals (see Counts.totals) of each cell, recorded every
+    'every' replication steps.
+
+    The totals are recorded by the cells as they replicate (see
+    Cell.replicate_rnas), from their running totals, so recording does not
+    look at any RNA molecules. They are kept in an array that is allocated for
+    all the steps expected, and is only grown if more steps are replicated.
+
+    @param n_cells: The number of cells.
+    @param every: The number of replication steps between recordings.
+    @param steps: The total number of replication steps expected (including
+        the 'start' steps), used to allocate the array of totals.
+    @param start: The number of replication steps already done.
+    @raise ValueError: If 'every' is not positive.
+    """
+
+    def __init__(
+        self, n_cells: int, every: int, steps: int = 0, start: int = 0
+    ) -> None:
+        if every < 1:
+            raise ValueError(
+                f"The trajectory recording interval ({every}) must be positive."
+            )
+        self.n_cells = n_cells
+        self.every = every
+        self.step = start
+        self.first = start // every + 1
+        self.totals = np.zeros(
+            (max(steps // every - start // every, 0), n_cells, len(TOTALS)),
+            dtype=np.int64,
+        )
+        self.recorded = 0
+
+    def __len__(self) -> int:
+        return self.recorded
+
+    def add(self, steps: int, snapshots: list[np.ndarray]) -> None:
+        """
+        Add the totals recorded by each cell while replicating.
+
+        @param steps: The number of replication steps done.
+        @param snapshots: The snapshots array of each cell (see Cell.snapshots).
+        """
+        assert len(snapshots) == self.n_cells
+        count = (self.step + steps) // self.every - self.step // self.every
+        end = self.recorded + count
+        if end > len(self.totals):
+            totals = np.zeros(
+                (max(end, 2 * len(self.totals)), self.n_cells, len(TOTALS)),
+                dtype=np.int64,
+            )
+            totals[: self.recorded] = self.totals[: self.recorded]
+            self.totals = totals
+        if count:
+            self.totals[self.recorded : end] = np.stack(snapshots, axis=1)
+        self.recorded = end
+        self.step += steps
+
+    @property
+    def steps(self) -> np.ndarray:
+        """
+        Get the replication step at which each set of totals was recorded.
+        """
+        return (self.first + np.arange(self.recorded)) * self.every
+
+    def frame(self) -> pl.DataFrame:
+        """
+        Make a data frame of the recorded totals.
+
+        @return: A data frame with a row for each recording and cell, and
+            columns 'step', 'cell' (zero-based), and one for each of TOTALS.
+        """
+        totals = self.totals[: self.recorded].reshape(-1, len(TOTALS))
+        return pl.DataFrame({
+            "step": np.repeat(self.steps, self.n_cells),
+            "cell": np.tile(np.arange(self.n_cells), self.recorded),
+            **{name: totals[:, index] for index, name in enumerate(TOTALS)},
+        })
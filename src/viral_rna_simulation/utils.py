@@ -1,5 +1,6 @@
 from functools import cache
-from random import choice
+
+import numpy as np
 
 
 COMPLEMENT = {
@@ -16,6 +17,23 @@ MUTANTS = {
     "T": "ACG",
 }
 
+# The random number generator to use when none is given. Pass a generator
+# explicitly (e.g., one made by numpy.random.default_rng with a seed) for
+# reproducible results.
+RNG = np.random.default_rng()
+
+# Genomes hold their bases as small integer codes. The order of BASES is chosen
+# so that the code of the complement of the base with code c is 3 - c.
+BASES = "ACGT"
+CODES = {base: code for code, base in enumerate(BASES)}
+
+# All 16 from/to base pairs, indexed by 4 * from code + to code.
+CHANGES = tuple(a + b for a in BASES for b in BASES)
+
+_ASCII = np.frombuffer(BASES.encode(), dtype=np.uint8)
+_ENCODE = np.full(256, 255, dtype=np.uint8)
+_ENCODE[_ASCII] = np.arange(len(BASES), dtype=np.uint8)
+
 
 @cache
 def rc(s: str) -> str:
@@ -26,11 +44,49 @@ def rc1(base: str) -> str:
     return COMPLEMENT[base]
 
 
-def mutate_base(base: str) -> str:
-    return choice(MUTANTS[base])
+def mutate_base(base: str, rng: np.random.Generator | None = None) -> str:
+    mutants = MUTANTS[base]
+    return mutants[(RNG if rng is None else rng).integers(len(mutants))]
 
 
 def mutations_str(mutations: dict[str, int]) -> str:
     return ", ".join(
         f"{mutation}:{count}" for mutation, count in sorted(mutations.items())
     )
+
+
+def encode(s: str) -> np.ndarray:
+    """
+    Convert a string of nucleotides into an array of base codes.
+    """
+    codes = _ENCODE[np.frombuffer(s.encode(), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError(f"Genome {s!r} contains a character other than {BASES}.")
+    return codes
+
+
+def decode(codes: np.ndarray) -> str:
+    """
+    Convert an array of base codes into a string of nucleotides.
+    """
+    return _ASCII[codes].tobytes().decode()
+
+
+def rc_codes(codes: np.ndarray) -> np.ndarray:
+    """
+    Get a (new) reverse-complemented array of base codes.
+    """
+    return 3 - codes[::-1]
+
+
+def grow(array: np.ndarray, size: int) -> np.ndarray:
+    """
+    Return an in-memory array at least 'size' long (along its first axis, with
+    the same trailing shape), holding the contents of the given array. Capacity
+    is doubled, to keep appending cheap.
+    """
+    if len(array) >= size:
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
@@ -0,0 +1,42 @@
+from typing import Callable
+
+import pytest
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+
+
+@pytest.fixture
+def replicated() -> Callable[..., Cells]:
+    """
+    Get a function that makes some cells and replicates them with mutations.
+    """
+
+    def replicated(
+        cls: type = Cells,
+        genome: str = "ACGTTGCAAC" * 6,
+        seed: int = 4,
+        steps: int = 40,
+        ratio: int = 3,
+        record_every: int | None = None,
+        **kwargs,
+    ) -> Cells:
+        """
+        Make three cells and replicate them with mutations.
+
+        @param cls: The class of the cells.
+        @param genome: The infecting genome.
+        @param seed: The seed for the cells.
+        @param steps: The number of replication steps.
+        @param ratio: The number of (+) RNAs to make from a (-) RNA.
+        @param record_every: If not None, record the totals of each cell after
+            every this many steps (see Cells.record_trajectory).
+        @param kwargs: Other keyword arguments for 'cls'.
+        """
+        cells = cls(3, Genome(genome), seed=seed, **kwargs)
+        if record_every:
+            cells.record_trajectory(record_every, steps)
+        cells.replicate(steps=steps, mutation_rate=0.05, ratio=ratio)
+        return cells
+
+    return replicated
@@ -0,0 +1,190 @@
+import pytest
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.spectrum import MutationSpectrum
+
+
+class Test_array_cells:
+    """
+    Test the ArrayCells class.
+    """
+
+    def test_length(self) -> None:
+        """
+        The __len__ method must give the number of cells.
+        """
+        assert len(ArrayCells(5, Genome("ATTC"))) == 5
+
+    def test_initial(self) -> None:
+        """
+        New cells must each hold one (+) RNA with the infecting genome.
+        """
+        cells = ArrayCells(3, Genome("ATTC"))
+        assert cells.rna_count() == (3, 0)
+        assert cells.replication_count() == (0, 0)
+        assert cells.mutation_counts() == ({}, {})
+        assert [str(rna.genome) for cell in cells for rna in cell] == ["ATTC"] * 3
+
+    def test_replicate(self) -> None:
+        """
+        Each step must replicate one RNA in each cell.
+        """
+        cells = ArrayCells(2, Genome("A"))
+        cells.replicate(steps=1)
+        assert cells.rna_count() == (2, 2)
+        assert cells.replication_count() == (2, 0)
+
+        cells.replicate(steps=3)
+        assert sum(cells.rna_count()) == 10
+        assert sum(cells.replication_count()) == 8
+        assert [len(cell) for cell in cells] == [5, 5]
+
+    def test_replicate_is_reverse_complement(self) -> None:
+        """
+        Replication without mutation must make the reverse complement.
+        """
+        cells = ArrayCells(1, Genome("AACG"))
+        cells.replicate(steps=1)
+        ((first, second),) = [list(cell) for cell in cells]
+        assert str(second.genome) == "CGTT"
+        assert not second.positive
+
+    def test_ratio(self) -> None:
+        """
+        Replicating a (-) RNA must make 'ratio' (+) RNAs, and the replication
+        counts must match the number of RNAs made.
+        """
+        cells = ArrayCells(4, Genome("AACG"))
+        cells.replicate(steps=20, ratio=5)
+        positive, negative = cells.rna_count()
+        assert cells.replication_count() == (negative, positive - 4)
+        assert [rna.positive for rna in next(iter(cells))][:2] == [True, False]
+
+    def test_counts_match_cells_methods(self) -> None:
+        """
+        The array-based counts must match those that Cells finds by looking at
+        every RNA in every cell.
+        """
+        cells = ArrayCells(3, Genome(length=100))
+        cells.replicate(steps=50, mutation_rate=0.02, ratio=3)
+        recount = Cells.recount(cells)
+        assert cells.rna_count() == (recount.positive_rnas, recount.negative_rnas)
+        assert cells.replication_count() == (
+            recount.positive_replications,
+            recount.negative_replications,
+        )
+        assert cells.mutation_counts() == (
+            recount.positive_mutations,
+            recount.negative_mutations,
+        )
+        assert cells.apparent_mutation_counts() == (
+            recount.from_positive,
+            recount.from_negative,
+        )
+        assert cells.counts() == recount
+        assert cells.summary()
+
+    def test_mutation_history(self) -> None:
+        """
+        The mutation history of each site must be a chain of changes that ends
+        with the site's base, and a molecule made with mutations must have its
+        new mutations as its mutant sites.
+        """
+        cells = ArrayCells(2, Genome("ACGTTGCAAC"), seed=3)
+        cells.replicate(steps=30, mutation_rate=0.3, ratio=2)
+        complement = str.maketrans("ACGT", "TGCA")
+        histories = 0
+        for cell in cells:
+            for rna in cell:
+                genome = rna.genome if rna.positive else rna.genome.rc()
+                for offset, history in genome.history.items():
+                    histories += 1
+                    # Bring each change into (+) sense.
+                    changes = [
+                        change if positive else change.translate(complement)
+                        for change, positive in history
+                    ]
+                    assert changes[0][0] == str(cells.infecting_genome)[offset]
+                    for first, second in zip(changes, changes[1:]):
+                        assert first[1] == second[0]
+                    assert changes[-1][1] == str(genome)[offset]
+                for offset in rna.genome.mutant:
+                    assert rna.genome.history[offset][-1][1] == rna.positive
+        assert histories
+
+    def test_mutation_rate(self) -> None:
+        """
+        The actual mutation rate must be close to the requested one.
+        """
+        cells = ArrayCells(20, Genome(length=1000))
+        cells.replicate(steps=100, mutation_rate=0.01)
+        positive, negative = cells.mutation_counts()
+        mutations = sum(positive.values()) + sum(negative.values())
+        replications = sum(cells.replication_count())
+        # The expected number of mutations is 20,000 (standard deviation ~140).
+        assert abs(mutations / (replications * 1000) - 0.01) < 0.0005
+
+    def test_mutation_rate_above_one(self) -> None:
+        """
+        A mutation rate of more than one must mutate every site.
+        """
+        cells = ArrayCells(2, Genome("ACGT"), seed=5)
+        cells.replicate(steps=3, mutation_rate=2.0)
+        positive, negative = cells.mutation_counts()
+        mutations = sum(positive.values()) + sum(negative.values())
+        assert mutations == 4 * sum(cells.replication_count())
+
+    def test_mutate_in_negative(self) -> None:
+        """
+        If mutations are only allowed in (-) RNA, there must be none in (+) RNA.
+        """
+        cells = ArrayCells(3, Genome(length=100))
+        cells.replicate(steps=30, mutate_in="negative", mutation_rate=0.05)
+        positive, negative = cells.mutation_counts()
+        assert not positive
+        assert negative
+
+    def test_seed(self) -> None:
+        """
+        The same seed must give the same results.
+        """
+        results = []
+        for _ in range(2):
+            cells = ArrayCells(3, Genome("ACGTTGCAAC"), seed=5)
+            cells.replicate(steps=30, mutation_rate=0.05, ratio=2)
+            results.append(cells.summary())
+        assert results[0] == results[1]
+
+    @pytest.mark.parametrize(
+        "options",
+        (
+            {"negative_propensity": 2.0},
+            {"positive_decay": 0.1},
+            {"max_rnas": 10},
+            {"mutation_spectrum": MutationSpectrum.uniform(0.1)},
+        ),
+    )
+    def test_unsupported_options(self, options) -> None:
+        """
+        Replication parameters that ArrayCells does not support must raise a
+        ValueError.
+        """
+        cells = ArrayCells(3, Genome("ACGTTGCAAC"), seed=5)
+        with pytest.raises(ValueError):
+            cells.replicate(steps=3, **options)
+
+    def test_sample(self) -> None:
+        """
+        The mean number of apparent changes per sampled molecule must be close
+        to the mean for all molecules.
+        """
+        cells = ArrayCells(3, Genome("ACGTTGCAAC" * 10), seed=5)
+        cells.replicate(steps=100, mutation_rate=0.01, ratio=3)
+        positive, negative = cells.apparent_mutation_counts()
+        mean = (sum(positive.values()) + sum(negative.values())) / sum(
+            cells.rna_count()
+        )
+        _, _, totals = cells.sample_apparent_mutation_counts(5000, seed=2)
+        assert totals.mean() == pytest.approx(mean, rel=0.1)
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from viral_rna_simulation.benchmark import (
+    VERSION,
+    benchmark_cases,
+    case_key,
+    compare,
+    load,
+    run_benchmarks,
+)
+
+
+def results(**best: float) -> dict:
+    """
+    Make benchmark results with the given best times.
+    """
+    return {
+        "version": VERSION,
+        "machine": {},
+        "results": {key: {"best": seconds} for key, seconds in best.items()},
+    }
+
+
+class Test_benchmark:
+    """
+    Test the benchmark functions.
+    """
+
+    def test_case_key(self) -> None:
+        """
+        A case key must have the name and the parameters.
+        """
+        assert case_key("Genome.rc", {"genome_length": 100, "x": 1}) == (
+            "Genome.rc[genome_length=100,x=1]"
+        )
+
+    def test_keys_are_unique(self) -> None:
+        """
+        Every benchmark case must have a different key.
+        """
+        keys = [case_key(name, params) for name, params, *_ in benchmark_cases()]
+        assert len(keys) == len(set(keys))
+
+    def test_run(self) -> None:
+        """
+        Running the matching benchmarks must give a result for each.
+        """
+        result = run_benchmarks(
+            quick=True, match="Genome.rc", repeat=2, min_seconds=0.001
+        )
+        assert result["version"] == VERSION
+        assert set(result["results"]) == {
+            "Genome.rc[genome_length=100]",
+            "Genome.rc[genome_length=1000]",
+        }
+        for value in result["results"].values():
+            assert 0.0 < value["best"] <= value["median"]
+            assert value["repeat"] == 2
+
+    def test_run_stateful(self) -> None:
+        """
+        A benchmark that changes its state must be timed once per repeat.
+        """
+        result = run_benchmarks(
+            quick=True,
+            match="Cell.replicate_rnas[genome_length=100,mutation_rate=0.0,ratio=1,",
+            repeat=2,
+        )
+        (value,) = result["results"].values()
+        assert value["number"] == 1
+
+    def test_compare(self) -> None:
+        """
+        Cases must be compared using the threshold, and cases not in the
+        baseline must be skipped.
+        """
+        baseline = results(a=1.0, b=1.0, c=1.0)
+        current = results(a=1.5, b=0.5, c=1.1, d=1.0)
+        assert compare(baseline, current, threshold=0.2) == [
+            ("a", 1.0, 1.5, "slower"),
+            ("b", 1.0, 0.5, "faster"),
+            ("c", 1.0, 1.1, "same"),
+        ]
+
+    def test_load_unknown_version(self, tmp_path) -> None:
+        """
+        Results with an unknown version must not be loaded.
+        """
+        filename = tmp_path / "results.json"
+        filename.write_text(json.dumps({"version": VERSION + 1}))
+        with pytest.raises(ValueError, match="version"):
+            load(str(filename))
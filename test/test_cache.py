@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cache import CachedCells, ResultCache, cache_key
+from viral_rna_simulation.cells import Cells
+
+
+class Test_cache_key:
+    """
+    Test the cache_key function.
+    """
+
+    def test_same(self) -> None:
+        """
+        The same parameters, in any order, must give the same key.
+        """
+        first = cache_key({"seed": 1, "steps": 10})
+        assert first == cache_key({"steps": 10, "seed": 1})
+
+    def test_different(self) -> None:
+        """
+        Different parameters must give different keys.
+        """
+        first = cache_key({"seed": 1, "steps": 10})
+        assert first != cache_key({"seed": 2, "steps": 10})
+
+
+class Test_result_cache:
+    """
+    Test the ResultCache class.
+    """
+
+    def test_miss(self, tmp_path) -> None:
+        """
+        Getting an unknown key must return None.
+        """
+        assert ResultCache(str(tmp_path)).get("missing") is None
+
+    def test_counts(self, tmp_path, replicated) -> None:
+        """
+        Cached results must give the same summary as the simulated cells, but
+        not their molecules.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated()
+        cache.put("key", cells)
+        cached = cache.get("key")
+        assert isinstance(cached, CachedCells)
+        assert len(cached) == 3
+        assert cached.summary() == cells.summary()
+        with pytest.raises(ValueError):
+            cached.pileup()
+
+    def test_array_cells(self, tmp_path, replicated) -> None:
+        """
+        The results of ArrayCells must be cached, but not their molecules.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated(ArrayCells)
+        cache.put("key", cells)
+        assert cache.get("key").summary() == cells.summary()
+        with pytest.raises(ValueError):
+            cache.put("key", cells, population=True)
+
+    def test_population(self, tmp_path, replicated) -> None:
+        """
+        If the molecules are needed, only an entry with them must be a hit, and
+        it must give the same sample as the simulated cells.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated()
+        cache.put("key", cells)
+        assert cache.get("key", population=True) is None
+
+        cache.put("key", cells, population=True)
+        cached = cache.get("key", population=True)
+        assert type(cached) is Cells
+        assert cached.summary(sequencing_depth=20, seed=1) == cells.summary(
+            sequencing_depth=20, seed=1
+        )
+
+    def test_trajectory(self, tmp_path, replicated) -> None:
+        """
+        A recorded trajectory must be cached.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated(record_every=4)
+        cache.put("key", cells)
+        expected = cells.trajectory.frame()
+        assert cache.get("key").trajectory.frame().equals(expected)
+        cache.put("key", cells, population=True)
+        assert cache.get("key", population=True).trajectory.frame().equals(expected)
+
+    def test_eviction(self, tmp_path, replicated) -> None:
+        """
+        When the cache is too big, the least recently used entries must be
+        removed.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated()
+        for key in "abc":
+            cache.put(key, cells)
+        size = os.path.getsize(tmp_path / "a.npz")
+        # Make 'a' the most recently used entry.
+        for key, used in zip("bca", (1, 2, 3)):
+            os.utime(tmp_path / f"{key}.npz", (used, used))
+
+        cache.max_bytes = 2 * size
+        cache.evict()
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+        assert cache.get("a") is not None
+
+    def test_get_marks_used(self, tmp_path, replicated) -> None:
+        """
+        Getting an entry must make it the most recently used.
+        """
+        cache = ResultCache(str(tmp_path))
+        cells = replicated()
+        for key in "ab":
+            cache.put(key, cells)
+        os.utime(tmp_path / "a.npz", (1, 1))
+        os.utime(tmp_path / "b.npz", (2, 2))
+        cache.get("a")
+        ((_, _, filenames), _) = cache.entries()
+        assert filenames == [str(tmp_path / "b.npz")]
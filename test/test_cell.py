@@ -1,8 +1,11 @@
+import numpy as np
 import pytest
 
 from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.counts import TOTALS
 from viral_rna_simulation.genome import Genome
 from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.spectrum import MutationSpectrum
 
 
 class Test_basic:
@@ -82,3 +85,362 @@ class Test_replicate:
         cell.replicate_rnas(1)
         rna1, rna2 = cell
         assert rna1.genome == rna2.genome.rc()
+
+
+class Test_sample:
+    """
+    Test sampling the RNA molecules of a cell.
+    """
+
+    def test_number(self) -> None:
+        """
+        The requested number of molecules must be sampled.
+        """
+        cell = Cell(Genome("ACGT"), rng=np.random.default_rng(1))
+        cell.replicate_rnas(5)
+        assert len(cell.sample_rnas(20, np.random.default_rng(2))) == 20
+
+    def test_haplotypes(self) -> None:
+        """
+        Haplotypes must be sampled in proportion to their number of molecules.
+        """
+        cell = Cell(Genome("ACGT"), haplotypes=True)
+        cell.rnas.append(RNA(Genome("TTTT")), 99)
+        sample = cell.sample_rnas(1000, np.random.default_rng(2))
+        common = sum(str(rna.genome) == "TTTT" for rna in sample)
+        assert 950 < common < 1000
+
+    def test_cell_rng_unused(self) -> None:
+        """
+        Sampling must not use the cell's random number generator.
+        """
+        cell = Cell(Genome("ACGT"), rng=np.random.default_rng(1))
+        state = cell.rng.bit_generator.state
+        cell.sample_rnas(10, np.random.default_rng(2))
+        assert cell.rng.bit_generator.state == state
+
+
+class Test_snapshots:
+    """
+    Test recording the totals of a cell during replication.
+    """
+
+    def test_no_recording(self) -> None:
+        """
+        Without 'record_every', no snapshots must be recorded.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(5)
+        assert cell.snapshots is None
+
+    def test_recording(self) -> None:
+        """
+        The totals must be recorded at every multiple of 'record_every' steps,
+        and the last recording must match the final totals.
+        """
+        cell = Cell(Genome("ACGTTGCAAC"), rng=np.random.default_rng(1))
+        cell.replicate_rnas(10, mutation_rate=0.1, record_every=5)
+        assert cell.snapshots.shape == (2, len(TOTALS))
+        assert tuple(cell.snapshots[-1].tolist()) == cell.counts.totals()
+        # Each step adds one molecule (with a ratio of one).
+        assert cell.snapshots[:, :2].sum(axis=1).tolist() == [6, 11]
+
+    def test_start(self) -> None:
+        """
+        Recordings must be made at multiples of 'record_every' counted from the
+        steps already done.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(4, record_every=3, start=5)
+        # Steps 6 and 9 are recorded.
+        assert cell.snapshots[:, :2].sum(axis=1).tolist() == [2, 5]
+
+
+class Test_negative_propensity:
+    """
+    Test choosing molecules with a (-) molecule propensity.
+    """
+
+    def test_uniform(self) -> None:
+        """
+        A propensity of one must not use a weighted selection.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(5)
+        assert cell.selection is None
+
+    def test_not_positive(self) -> None:
+        """
+        A propensity that is not positive must raise a ValueError.
+        """
+        with pytest.raises(ValueError):
+            Cell(Genome("ACGT")).set_negative_propensity(0.0)
+
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_weights(self, haplotypes) -> None:
+        """
+        The selection must have the propensity of each molecule (times the
+        number of molecules, for haplotypes), and the selection must be
+        dropped when the propensity goes back to one.
+        """
+        cell = Cell(Genome("ACGT"), haplotypes=haplotypes)
+        cell.replicate_rnas(20, ratio=3, negative_propensity=2.5)
+        expected = [
+            count * (1.0 if rna.positive else 2.5) for rna, count in cell.rna_counts()
+        ]
+        assert cell.selection.weights == expected
+        assert cell.selection.total == pytest.approx(sum(expected))
+
+        cell.replicate_rnas(1)
+        assert cell.selection is None
+
+    def test_choices(self) -> None:
+        """
+        With a very high propensity, (-) molecules must almost always be the
+        ones replicated, so many more (+) molecules must be made.
+        """
+        rng = np.random.default_rng(4)
+        uniform = Cell(Genome("ACGT"), rng=rng)
+        weighted = Cell(Genome("ACGT"), rng=rng)
+        uniform.replicate_rnas(200)
+        weighted.replicate_rnas(200, negative_propensity=1000.0)
+        assert uniform.counts.negative_replications < 130
+        assert weighted.counts.negative_replications > 160
+
+
+class Test_degrade:
+    """
+    Test the degradation of RNA molecules.
+    """
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    @pytest.mark.parametrize("negative_propensity", (1.0, 3.0))
+    def test_counts_match_recount(self, delta, haplotypes, negative_propensity) -> None:
+        """
+        The running totals must match a recount after molecules have degraded,
+        and the weights of a weighted selection must be kept up to date.
+        """
+        cell = Cell(
+            Genome("ACGTTGCAAC" * 3),
+            delta=delta,
+            haplotypes=haplotypes,
+            rng=np.random.default_rng(5),
+        )
+        cell.replicate_rnas(
+            300,
+            mutation_rate=0.05,
+            ratio=3,
+            negative_propensity=negative_propensity,
+            positive_decay=0.02,
+            negative_decay=0.01,
+        )
+        assert cell.counts == cell.recount()
+        assert len(cell) == cell.counts.positive_rnas + cell.counts.negative_rnas
+        assert sum(cell.degraded_replications)
+        if negative_propensity != 1.0:
+            assert cell.selection.weights == [
+                count * (1.0 if rna.positive else negative_propensity)
+                for rna, count in cell.rna_counts()
+            ]
+
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_senses(self, haplotypes) -> None:
+        """
+        The index of the molecules of each sense must be kept up to date as
+        molecules are added, degrade and are downsampled.
+        """
+        cell = Cell(
+            Genome("ACGTTGCAAC" * 3),
+            haplotypes=haplotypes,
+            rng=np.random.default_rng(7),
+        )
+        cell.replicate_rnas(
+            300,
+            mutation_rate=0.05,
+            ratio=10,
+            positive_decay=0.001,
+            negative_decay=0.02,
+            max_rnas=500,
+        )
+        if haplotypes:
+            for positive, sense in zip((True, False), cell.senses):
+                assert sense.weights == [
+                    count if rna.positive is positive else 0
+                    for rna, count in cell.rna_counts()
+                ]
+        else:
+            for positive, sense in zip((True, False), cell.senses):
+                assert sorted(sense) == [
+                    offset
+                    for offset, rna in enumerate(cell.rnas)
+                    if rna.positive is positive
+                ]
+                assert [cell._slots[offset] for offset in sense] == list(
+                    range(len(sense))
+                )
+
+    def test_steady_state(self) -> None:
+        """
+        With degradation, the number of molecules must stop growing.
+        """
+        cell = Cell(Genome("ACGT"), rng=np.random.default_rng(6))
+        sizes = []
+        for _ in range(4):
+            cell.replicate_rnas(1000, ratio=3, positive_decay=0.01, negative_decay=0.01)
+            sizes.append(len(cell))
+        # Two molecules are made per step, on average, and one in a hundred
+        # degrades, so the cell holds about 200 molecules.
+        assert all(100 < size < 300 for size in sizes)
+
+    def test_extinction(self) -> None:
+        """
+        If every molecule degrades, the cell must stay empty.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(3, positive_decay=1.0, negative_decay=1.0)
+        assert len(cell) == 0
+        assert cell.counts.positive_rnas == cell.counts.negative_rnas == 0
+        assert cell.counts == cell.recount()
+
+    def test_rna_store(self, tmp_path) -> None:
+        """
+        Molecules stored on disk must not be allowed to degrade.
+        """
+        cell = Cell(Genome("ACGT"), directory=str(tmp_path))
+        with pytest.raises(ValueError):
+            cell.replicate_rnas(3, positive_decay=0.5)
+
+
+class Test_downsample:
+    """
+    Test downsampling a cell to a carrying capacity.
+    """
+
+    def test_not_downsampled(self) -> None:
+        """
+        The estimated totals of a cell that was never downsampled must be its
+        running totals.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(10, max_rnas=100)
+        assert cell.scale == 1.0
+        assert cell.estimated_counts() is cell.counts
+
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_downsample(self, haplotypes) -> None:
+        """
+        Downsampling must leave the given number of molecules, scale up the
+        molecule and mutation totals, and keep the running totals correct.
+        """
+        cell = Cell(
+            Genome("ACGTTGCAAC" * 3),
+            haplotypes=haplotypes,
+            rng=np.random.default_rng(7),
+        )
+        cell.replicate_rnas(100, mutation_rate=0.05, ratio=3)
+        n = len(cell)
+        replications = cell.counts.positive_replications
+        cell.downsample(n // 4)
+        assert len(cell) == n // 4
+        assert cell.scale == n / (n // 4)
+        assert cell.counts == cell.recount()
+
+        estimated = cell.estimated_counts()
+        assert estimated.positive_replications == replications
+        assert estimated.positive_rnas == round(cell.counts.positive_rnas * cell.scale)
+        assert estimated.from_positive.keys() == cell.counts.from_positive.keys()
+
+    def test_capacity(self) -> None:
+        """
+        With a carrying capacity, a cell must stay smaller than it, while its
+        estimated totals stay close to those of a cell without one.
+        """
+        uncapped = Cell(Genome("ACGT"), rng=np.random.default_rng(8))
+        capped = Cell(Genome("ACGT"), rng=np.random.default_rng(8))
+        uncapped.replicate_rnas(3000, ratio=5)
+        for _ in range(3):
+            capped.replicate_rnas(1000, ratio=5, max_rnas=400)
+            assert len(capped) < 400
+        assert capped.scale > 1.0
+        assert capped.counts == capped.recount()
+
+        expected = uncapped.counts.positive_rnas + uncapped.counts.negative_rnas
+        estimated = capped.estimated_counts()
+        assert abs(estimated.positive_rnas + estimated.negative_rnas - expected) < (
+            0.1 * expected
+        )
+        assert estimated.positive_replications + estimated.negative_replications == (
+            capped.counts.positive_replications + capped.counts.negative_replications
+        )
+
+    @pytest.mark.parametrize("max_rnas", (0, 1))
+    def test_capacity_too_small(self, max_rnas) -> None:
+        """
+        A carrying capacity of less than two, which would downsample a cell to
+        no molecules, must raise a ValueError.
+        """
+        cell = Cell(Genome("ACGT"))
+        with pytest.raises(ValueError):
+            cell.replicate_rnas(3, max_rnas=max_rnas)
+
+    def test_downsample_to_nothing(self) -> None:
+        """
+        Downsampling a cell to no molecules must raise a ValueError.
+        """
+        cell = Cell(Genome("ACGT"))
+        cell.replicate_rnas(3)
+        with pytest.raises(ValueError):
+            cell.downsample(0)
+
+    def test_rna_store(self, tmp_path) -> None:
+        """
+        Molecules stored on disk must not be downsampled.
+        """
+        cell = Cell(Genome("ACGT"), directory=str(tmp_path))
+        cell.replicate_rnas(3)
+        with pytest.raises(ValueError):
+            cell.downsample(1)
+
+
+class Test_mutation_spectrum:
+    """
+    Test replication with a mutation spectrum.
+    """
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_negative_synthesis_only(self, delta, haplotypes) -> None:
+        """
+        With rates only for (-) strand synthesis, all mutations must have been
+        made in (-) molecules, and the running totals must match a recount.
+        """
+        rates = np.zeros((2, 64, 4))
+        rates[1] = 0.01
+        cell = Cell(
+            Genome("ACGTTGCAAC" * 3),
+            delta=delta,
+            haplotypes=haplotypes,
+            rng=np.random.default_rng(5),
+        )
+        cell.replicate_rnas(300, ratio=3, mutation_spectrum=MutationSpectrum(rates))
+        assert cell.counts == cell.recount()
+        assert sum(cell.counts.negative_mutations.values())
+        for rna in cell:
+            for history in rna.genome.history.values():
+                assert not any(positive for _, positive in history)
+
+    def test_rna_store(self, tmp_path) -> None:
+        """
+        Molecules stored on disk must be replicated with a mutation spectrum.
+        """
+        cell = Cell(
+            Genome("ACGTTGCAAC" * 3),
+            directory=str(tmp_path),
+            rng=np.random.default_rng(5),
+        )
+        cell.replicate_rnas(
+            100, ratio=2, mutation_spectrum=MutationSpectrum.uniform(0.02)
+        )
+        assert cell.counts == cell.recount()
+        assert sum(cell.counts.positive_mutations.values())
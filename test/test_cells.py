@@ -1,5 +1,9 @@
-from viral_rna_simulation.cells import Cells
-from viral_rna_simulation.genome import Genome
+from collections import Counter
+
+import pytest
+
+from viral_rna_simulation.cells import BACKENDS, Cells, cell_seeds, choose_backend
+from viral_rna_simulation.genome import DeltaGenome, Genome
 
 
 class Test_cells:
@@ -61,14 +65,15 @@ class Test_cells:
         assert isinstance(summary, str)
         assert summary
 
-    def test_replicate(self) -> None:
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_replicate(self, backend) -> None:
         """
         Test replication does not fail.
         """
         cells = Cells(2, Genome("A"))
         assert len(cells) == 2
 
-        cells.replicate(steps=1)
+        cells.replicate(steps=1, backend=backend)
         assert cells.rna_count() == (2, 2)
         assert cells.replication_count() == (2, 0)
 
@@ -76,11 +81,11 @@ class Test_cells:
         # to replicated, the overall number of RNA molecules (i.e., summed
         # over all cells) goes up by the product of the number of workers and
         # the number of steps (2 x 3 = 6, in this call).
-        cells.replicate(steps=3)
+        cells.replicate(steps=3, backend=backend)
         assert sum(cells.rna_count()) == 10
         assert sum(cells.replication_count()) == 8
 
-        cells.replicate(steps=1)
+        cells.replicate(steps=1, backend=backend)
         assert sum(cells.rna_count()) == 12
         assert sum(cells.replication_count()) == 10
 
@@ -93,3 +98,269 @@ class Test_cells:
         # With the expected number of RNA molecules in each.
         assert [len(cell) for cell in cells] == [6, 6]
 
+    def test_delta_genomes(self) -> None:
+        """
+        Cells whose RNA genomes are stored as deltas must replicate and give a
+        summary.
+        """
+        cells = Cells(2, Genome(length=50), delta=True)
+        cells.replicate(steps=10, mutation_rate=0.1, ratio=2)
+        assert all(
+            isinstance(rna.genome, DeltaGenome) for cell in cells for rna in cell
+        )
+        positive_counts, negative_counts = cells.mutation_counts()
+        assert sum(positive_counts.values()) + sum(negative_counts.values()) == sum(
+            sum(rna.genome.mutations().values()) for cell in cells for rna in cell
+        )
+        assert cells.summary()
+
+    def test_haplotypes(self) -> None:
+        """
+        Cells storing haplotypes must give the same counts as cells storing lists
+        when there are no mutations.
+        """
+        cells = Cells(2, Genome(length=50), haplotypes=True)
+        cells.replicate(steps=10, ratio=3)
+        positive, negative = cells.rna_count()
+        assert positive + negative == sum(len(cell) for cell in cells)
+        # Each (-) RNA was made by replicating a (+) RNA, and each (+) RNA apart
+        # from the infecting one was made by replicating a (-) RNA.
+        assert cells.replication_count() == (negative, positive - 2)
+        assert cells.mutation_counts() == ({}, {})
+        assert cells.apparent_mutation_counts() == ({}, {})
+        # With no mutations, there can only be one (+) and one (-) haplotype.
+        assert all(len(cell.rnas.rnas) == 2 for cell in cells)
+
+    def test_haplotypes_with_mutations(self) -> None:
+        """
+        Cells storing haplotypes must count mutations once per molecule.
+        """
+        cells = Cells(2, Genome(length=50), haplotypes=True)
+        cells.replicate(steps=20, mutation_rate=0.05, ratio=3)
+        positive_counts, negative_counts = cells.mutation_counts()
+        expected = Counter()
+        for cell in cells:
+            for rna in cell:
+                expected.update(rna.genome.mutations())
+        assert positive_counts + negative_counts == expected
+        assert cells.summary()
+
+
+class Test_choose_backend:
+    """
+    Test the choose_backend function.
+    """
+
+    def test_one_cell(self) -> None:
+        """
+        A single cell must be replicated serially.
+        """
+        assert choose_backend(1, 10**6, 30000, 100) == "serial"
+
+    def test_one_worker(self) -> None:
+        """
+        A single worker must mean serial replication.
+        """
+        assert choose_backend(100, 10**6, 30000, 100, workers=1) == "serial"
+
+    def test_little_work(self) -> None:
+        """
+        A small amount of work must be done serially.
+        """
+        assert choose_backend(4, 10, 100, 1) == "serial"
+
+    def test_lots_of_work(self, monkeypatch) -> None:
+        """
+        A large amount of work on several CPUs must use a pool.
+        """
+        monkeypatch.setattr("os.cpu_count", lambda: 8)
+        assert choose_backend(8, 10**5, 30000, 10) in ("threads", "processes")
+
+
+class Test_counts:
+    """
+    Test the running totals kept by the cells.
+    """
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_counts_match_recount(self, delta, haplotypes) -> None:
+        """
+        The running totals must match a full recount after replication with
+        mutations.
+        """
+        cells = Cells(
+            3, Genome(length=60), delta=delta, haplotypes=haplotypes, check=True
+        )
+        cells.replicate(
+            steps=30, mutation_rate=0.05, ratio=3, mutate_in="both", backend="serial"
+        )
+        assert cells.counts() == cells.recount()
+        assert cells.summary()
+
+    def test_downsampled(self) -> None:
+        """
+        The totals of downsampled cells must be scaled up, while the check
+        against a recount uses their unscaled running totals.
+        """
+        cells = Cells(2, Genome("ACGTTGCAAC"), seed=3, check=True)
+        cells.replicate(steps=200, ratio=3, backend="serial", max_rnas=50)
+        positive, negative = cells.rna_count()
+        assert positive + negative > sum(len(cell) for cell in cells)
+        assert cells.cell_sizes() == [round(len(cell) * cell.scale) for cell in cells]
+        assert cells.summary()
+
+    def test_check_fails(self) -> None:
+        """
+        If the running totals are wrong, checking them must raise an
+        AssertionError.
+        """
+        cells = Cells(2, Genome("ACGT"), check=True)
+        cells.replicate(steps=3, backend="serial")
+        next(iter(cells)).counts.positive_rnas += 1
+        with pytest.raises(AssertionError):
+            cells.rna_count()
+
+
+class Test_seed:
+    """
+    Test the reproducibility of Cells made with a random seed.
+    """
+
+    def summary(self, backend: str, seed: int, workers: int | None = None) -> str:
+        """
+        Replicate some cells with mutations and return their summary.
+        """
+        cells = Cells(4, Genome("ACGTTGCAAC"), seed=seed)
+        cells.replicate(
+            workers=workers,
+            steps=50,
+            mutation_rate=0.05,
+            ratio=3,
+            backend=backend,
+        )
+        return cells.summary()
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_same_seed(self, backend) -> None:
+        """
+        The same seed must give the same results whatever the backend.
+        """
+        assert self.summary(backend, 17) == self.summary("serial", 17)
+
+    def test_same_seed_different_workers(self) -> None:
+        """
+        The same seed must give the same results whatever the number of workers.
+        """
+        assert self.summary("processes", 17, workers=1) == self.summary(
+            "processes", 17, workers=3
+        )
+
+    def test_different_seeds(self) -> None:
+        """
+        Different seeds must (almost certainly) give different results.
+        """
+        assert self.summary("serial", 17) != self.summary("serial", 18)
+
+    def test_seed_per_cell(self) -> None:
+        """
+        A sequence of seeds must be used one per cell.
+        """
+        seeds = cell_seeds(17, 3)
+        cells = Cells(3, Genome("ACGTTGCAAC"), seed=seeds)
+        one = Cells(1, Genome("ACGTTGCAAC"), seed=seeds[1:2])
+        cells.replicate(steps=20, mutation_rate=0.1, backend="serial")
+        one.replicate(steps=20, mutation_rate=0.1, backend="serial")
+        assert [str(rna.genome) for rna in cells.cells[1].rnas] == [
+            str(rna.genome) for rna in one.cells[0].rnas
+        ]
+
+
+class Test_sample:
+    """
+    Test finding the apparent changes in a sample of RNA molecules.
+    """
+
+    def cells(self, **kwargs) -> Cells:
+        """
+        Make some cells with mutations in them.
+        """
+        cells = Cells(3, Genome("ACGTTGCAAC" * 10), seed=1, **kwargs)
+        cells.replicate(steps=100, mutation_rate=0.01, ratio=3, backend="serial")
+        return cells
+
+    def test_number(self) -> None:
+        """
+        The requested number of molecules must be sampled.
+        """
+        _, _, totals = self.cells().sample_apparent_mutation_counts(50, seed=2)
+        assert len(totals) == 50
+
+    def test_totals(self) -> None:
+        """
+        The per-molecule totals must add up to the apparent changes.
+        """
+        positive, negative, totals = self.cells().sample_apparent_mutation_counts(
+            50, seed=2
+        )
+        assert sum(positive.values()) + sum(negative.values()) == totals.sum()
+
+    def test_same_seed(self) -> None:
+        """
+        The same seed must give the same sample.
+        """
+        cells = self.cells()
+        first = cells.sample_apparent_mutation_counts(50, seed=2)
+        second = cells.sample_apparent_mutation_counts(50, seed=2)
+        assert first[:2] == second[:2]
+        assert (first[2] == second[2]).all()
+
+    def test_simulation_unchanged(self) -> None:
+        """
+        Sampling must not change the rest of a simulation.
+        """
+        sampled, unsampled = self.cells(), self.cells()
+        sampled.sample_apparent_mutation_counts(50, seed=2)
+        for cells in sampled, unsampled:
+            cells.replicate(steps=20, mutation_rate=0.01, backend="serial")
+        assert sampled.summary() == unsampled.summary()
+
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_mean(self, haplotypes) -> None:
+        """
+        The mean number of apparent changes per sampled molecule must be close
+        to the mean for all molecules.
+        """
+        cells = self.cells(haplotypes=haplotypes)
+        positive, negative = cells.apparent_mutation_counts()
+        mean = (sum(positive.values()) + sum(negative.values())) / sum(
+            cells.rna_count()
+        )
+        _, _, totals = cells.sample_apparent_mutation_counts(5000, seed=2)
+        assert totals.mean() == pytest.approx(mean, rel=0.1)
+
+    def test_summary(self) -> None:
+        """
+        A summary with a sequencing depth must give the sampled changes, with
+        the standard error of their mean.
+        """
+        summary = self.cells().summary(sequencing_depth=50, seed=2)
+        assert "Apparent mutations (in 50 sampled molecules):" in summary
+        assert "(SE)" in summary
+
+    def test_decayed(self) -> None:
+        """
+        If every molecule has decayed, nothing must be sampled.
+        """
+        cells = Cells(3, Genome("ACGTTGCAAC" * 10), seed=1)
+        cells.replicate(
+            steps=10, positive_decay=1.0, negative_decay=1.0, backend="serial"
+        )
+        assert sum(cells.rna_count()) == 0
+        positive, negative, totals = cells.sample_apparent_mutation_counts(
+            50, seed=2
+        )
+        assert positive == negative == Counter()
+        assert len(totals) == 0
+        summary = cells.summary(sequencing_depth=50, seed=2)
+        assert "Apparent mutations (in 50 sampled molecules): None" in summary
@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.checkpoint import load_checkpoint, save_checkpoint
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.rna_store import RNAStore
+from viral_rna_simulation.simulate import resume, run
+from viral_rna_simulation.spectrum import MutationSpectrum
+
+
+class Test_checkpoint:
+    """
+    Test the save_checkpoint and load_checkpoint functions.
+    """
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_round_trip(self, tmp_path, delta, haplotypes, replicated) -> None:
+        """
+        Loaded cells must have the same RNA molecules and running totals as the
+        saved cells, and must replicate in exactly the same way.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        cells = replicated(delta=delta, haplotypes=haplotypes)
+        save_checkpoint(cells, filename, 40, {"ratio": 3})
+        loaded, step, parameters = load_checkpoint(filename)
+
+        assert step == 40
+        assert parameters == {"ratio": 3}
+        loaded.check_counts()
+        for cell, loaded_cell in zip(cells, loaded):
+            assert list(cell.rna_counts()) == list(loaded_cell.rna_counts())
+            for rna, loaded_rna in zip(cell, loaded_cell):
+                assert rna.replications == loaded_rna.replications
+                assert rna.genome.history == loaded_rna.genome.history
+                assert rna.genome.mutant == loaded_rna.genome.mutant
+
+        for c in cells, loaded:
+            c.replicate(steps=20, mutation_rate=0.05, ratio=3, backend="serial")
+        assert cells.summary() == loaded.summary()
+        loaded.check_counts()
+
+    def test_shared_delta_genomes(self, tmp_path) -> None:
+        """
+        Delta genomes that shared their changes when saved must share them when
+        loaded.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        cells = Cells(1, Genome("ACGT"), delta=True)
+        cells.replicate(steps=10, backend="serial")
+        save_checkpoint(cells, filename)
+        (cell,) = load_checkpoint(filename)[0]
+        assert len({id(rna.genome.changes) for rna in cell}) == 1
+
+    def test_rna_directory(self, tmp_path) -> None:
+        """
+        Cells with RNA molecules stored on disk must be saved, and must be loaded
+        into cells with molecules stored on disk.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        cells = Cells(2, Genome("ACGTTGCAAC"), seed=3, rna_directory=str(tmp_path))
+        cells.replicate(steps=30, mutation_rate=0.05, ratio=3, backend="serial")
+        save_checkpoint(cells, filename)
+        loaded, _, _ = load_checkpoint(filename, rna_directory=str(tmp_path))
+        assert all(isinstance(cell.rnas, RNAStore) for cell in loaded)
+        # Each cell has just the two files of its store.
+        assert len(os.listdir(loaded.directory.name)) == 4
+        loaded.check_counts()
+
+        for c in cells, loaded:
+            c.replicate(steps=20, mutation_rate=0.05, ratio=3, backend="serial")
+        assert cells.summary() == loaded.summary()
+
+    def test_unknown_version(self, tmp_path) -> None:
+        """
+        A checkpoint with an unknown version must not be loaded.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        save_checkpoint(Cells(1, Genome("ACGT")), filename)
+        with np.load(filename) as data:
+            arrays = {name: data[name] for name in data.files}
+        metadata = json.loads(arrays["metadata"].item())
+        metadata["version"] += 1
+        arrays["metadata"] = np.array(json.dumps(metadata))
+        with open(filename, "wb") as fp:
+            np.savez(fp, **arrays)
+
+        with pytest.raises(ValueError, match="version"):
+            load_checkpoint(filename)
+
+
+class Test_resume:
+    """
+    Test checkpointing and resuming a simulation.
+    """
+
+    def test_checkpoints_do_not_change_results(self, tmp_path) -> None:
+        """
+        Saving checkpoints must not change the result of a run, and the last
+        checkpoint must be of the final state.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        args = (2, None, 30, "both", 0.02, 25, 2)
+        expected = run(*args, seed=1).summary()
+        cells = run(*args, seed=1, checkpoint_every=10, checkpoint_filename=filename)
+        assert cells.summary() == expected
+        loaded, step, _ = load_checkpoint(filename)
+        assert step == 25
+        assert loaded.summary() == expected
+
+    def test_resume(self, tmp_path) -> None:
+        """
+        Resuming from a checkpoint must give the same result as an uninterrupted
+        run.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        expected = run(2, None, 30, "both", 0.02, 25, 2, seed=1).summary()
+        cells = run(2, None, 30, "both", 0.02, 10, 2, seed=1)
+        save_checkpoint(
+            cells,
+            filename,
+            10,
+            {"steps": 25, "mutate_in": "both", "mutation_rate": 0.02, "ratio": 2},
+        )
+        assert resume(filename).summary() == expected
+
+    @pytest.mark.parametrize(
+        "options",
+        (
+            {"negative_propensity": 2.0},
+            {"positive_decay": 0.05, "negative_decay": 0.02},
+            {"positive_decay": 0.05, "negative_decay": 0.02, "haplotypes": True},
+            {"max_rnas": 40},
+            {"mutation_spectrum": MutationSpectrum.uniform(0.05)},
+        ),
+    )
+    def test_resume_options(self, tmp_path, options) -> None:
+        """
+        Resuming from a checkpoint written by a run with optional replication
+        parameters must give the same result as an uninterrupted run, which
+        must differ from a run without them.
+        """
+        filename = str(tmp_path / "checkpoint.npz")
+        args = (2, None, 30, "both", 0.02)
+        expected = run(*args, 100, 3, seed=1, **options).summary()
+        assert run(*args, 100, 3, seed=1).summary() != expected
+
+        run(
+            *args,
+            40,
+            3,
+            seed=1,
+            **options,
+            checkpoint_every=40,
+            checkpoint_filename=filename,
+        )
+        cells, step, parameters = load_checkpoint(filename)
+        assert step == 40
+        save_checkpoint(cells, filename, step, {**parameters, "steps": 100})
+        assert resume(filename, check=True).summary() == expected
+
+    def test_arrays_engine(self) -> None:
+        """
+        Asking to checkpoint the 'arrays' engine must raise a ValueError.
+        """
+        with pytest.raises(ValueError, match="cannot be checkpointed"):
+            run(1, "ACGT", 0, "both", 0.0, 1, 1, engine="arrays", checkpoint_every=1)
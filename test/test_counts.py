@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from viral_rna_simulation.counts import Counts
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.rna import RNA
+
+
+class Test_counts:
+    """
+    Test the Counts class.
+    """
+
+    def test_empty(self) -> None:
+        """
+        New counts must be zero and equal to one another.
+        """
+        counts = Counts()
+        assert counts.positive_rnas == counts.negative_rnas == 0
+        assert counts == Counts()
+
+    def test_add_rna(self) -> None:
+        """
+        Adding an RNA must count it, and its actual and apparent mutations.
+        """
+        infecting_genome = Genome("AC")
+        rna = RNA(infecting_genome.replicate(1.0))
+        counts = Counts()
+        counts.add_rna(rna, infecting_genome, count=3)
+        assert counts.negative_rnas == 3
+        assert counts.positive_rnas == 0
+        assert sum(counts.negative_mutations.values()) == 6
+        assert sum(counts.from_negative.values()) == 6
+        assert not counts.from_positive
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("positive", (False, True))
+    def test_add_copies(self, delta, positive) -> None:
+        """
+        Adding copies of a mutated RNA must give the same counts as adding each
+        of them with add_rna.
+        """
+        rng = np.random.default_rng(8)
+        infecting_genome = Genome("ACGTTGCAAC" * 5)
+        genome = DeltaGenome(infecting_genome) if delta else infecting_genome
+        parent = RNA(genome.replicate(0.1, rng))
+        if not positive:
+            parent = RNA(parent.genome.replicate(0.1, rng))
+        copies = parent.replicate(0.1, rng, count=5)
+        assert copies[0].positive is not parent.positive
+
+        expected = Counts()
+        for copy in copies:
+            expected.add_rna(copy, infecting_genome)
+        counts = Counts()
+        counts.add_copies(parent, copies, infecting_genome)
+        assert counts == expected
+        assert vars(counts) == vars(expected)
+
+    def test_remove_rna(self) -> None:
+        """
+        Removing RNA molecules must undo adding them, except for their
+        replications.
+        """
+        infecting_genome = Genome("ACGT")
+        first = RNA(infecting_genome.replicate(1.0))
+        second = RNA(infecting_genome.replicate(0.5, np.random.default_rng(1)))
+        second.replications = 2
+        counts = Counts()
+        counts.add_rna(first, infecting_genome)
+        expected = Counts()
+        expected.add_rna(first, infecting_genome)
+        expected.negative_replications = 2
+        counts.add_rna(second, infecting_genome, count=2)
+        counts.remove_rna(second, infecting_genome, count=2)
+        assert counts == expected
+        assert vars(counts) == vars(expected)
+
+    def test_add_replications(self) -> None:
+        """
+        Adding replications must count them by sense.
+        """
+        counts = Counts()
+        counts.add_replications(True, 2)
+        counts.add_replications(False)
+        assert counts.positive_replications == 2
+        assert counts.negative_replications == 1
+
+    def test_iadd(self) -> None:
+        """
+        Adding counts must add all their totals.
+        """
+        infecting_genome = Genome("AC")
+        one, two = Counts(), Counts()
+        one.add_rna(RNA(infecting_genome), infecting_genome)
+        two.add_rna(RNA(infecting_genome.replicate(1.0)), infecting_genome)
+        two.add_replications(True)
+        one += two
+        assert (one.positive_rnas, one.negative_rnas) == (1, 1)
+        assert one.positive_replications == 1
+        assert one.negative_mutations == two.negative_mutations
+        assert one != Counts()
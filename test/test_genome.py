@@ -1,4 +1,17 @@
-from viral_rna_simulation.genome import Genome
+from math import sqrt
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation.genome import (
+    DeltaGenome,
+    Genome,
+    copy_mutation_offsets,
+    mutation_offsets,
+    sample_copy_offsets,
+)
+from viral_rna_simulation.site import Site
+from viral_rna_simulation.utils import CODES
 
 
 class Test_basic:
@@ -44,3 +57,372 @@ class Test_basic:
         print(repr(Genome("AG")))
         assert Genome("AG")[0].base == "A"
         assert Genome("AG")[1].base == "G"
+
+    def test_getitem_negative_offset(self) -> None:
+        """
+        The __getitem__ method must work with a negative offset.
+        """
+        assert Genome("AG")[-1].base == "G"
+
+    def test_bases_are_uint8(self) -> None:
+        """
+        The genome bases must be held in a uint8 array.
+        """
+        assert Genome("ACGT").bases.dtype == np.uint8
+
+    def test_random_genome(self) -> None:
+        """
+        A genome made with a length must have that length and only valid bases.
+        """
+        genome = Genome(length=1000)
+        assert len(genome) == 1000
+        assert set(str(genome)) <= set("ACGT")
+
+    def test_invalid_base(self) -> None:
+        """
+        A genome with an invalid nucleotide must raise a ValueError.
+        """
+        with pytest.raises(ValueError):
+            Genome("ACXT")
+
+    def test_from_sites(self) -> None:
+        """
+        A genome made from a list of sites must keep their mutation history.
+        """
+        genome = Genome([
+            Site("A"),
+            Site("C", mutant=True, mutation_history=[("GC", True)]),
+        ])
+        assert str(genome) == "AC"
+        assert not genome[0].mutant
+        assert genome[1].mutant
+        assert genome[1].mutation_history == [("GC", True)]
+        assert genome.mutations() == {"GC": 1}
+
+
+class Test_replicate:
+    """
+    Test replication of the Genome class.
+    """
+
+    def test_no_mutations(self) -> None:
+        """
+        Replication with no mutation rate must make the reverse complement.
+        """
+        genome = Genome("AACG")
+        copy = genome.replicate()
+        assert str(copy) == "CGTT"
+        assert not copy.positive
+        assert copy.mutations() == {}
+
+    def test_all_mutated(self) -> None:
+        """
+        Replication with a mutation rate of one must mutate every site, and the
+        changes must be recorded against the reverse complement bases.
+        """
+        genome = Genome("AACG")
+        copy = genome.replicate(1.0)
+        assert all(a != b for a, b in zip(str(copy), "CGTT"))
+        assert sum(copy.mutations().values()) == 4
+        for site, expected in zip(copy, "CGTT"):
+            assert site.mutant
+            ((change, positive),) = site.mutation_history
+            assert change == expected + site.base
+            assert positive is False
+
+    def test_history_follows_rc(self) -> None:
+        """
+        The mutation history must move with its site when a genome is reverse
+        complemented, and the copy must not be marked as mutant.
+        """
+        genome = Genome("AACG").replicate(1.0)
+        rc = genome.rc()
+        assert rc.mutations() == {}
+        for offset, site in enumerate(genome):
+            assert rc[len(genome) - 1 - offset].mutation_history == (
+                site.mutation_history
+            )
+
+    def test_history_accumulates(self) -> None:
+        """
+        Replicating a mutated genome must extend the history of its sites.
+        """
+        genome = Genome("AACG").replicate(1.0).replicate(1.0)
+        assert all(len(site.mutation_history) == 2 for site in genome)
+        assert sum(genome.mutations().values()) == 4
+
+    def test_count_no_mutations(self) -> None:
+        """
+        Replicating with a count and no mutation rate must make that many
+        reverse complements, sharing one base array.
+        """
+        copies = Genome("AACG").replicate(count=3)
+        assert len(copies) == 3
+        assert all(str(copy) == "CGTT" and not copy.positive for copy in copies)
+        assert all(copy.bases is copies[0].bases for copy in copies)
+
+    def test_count_mutated_copies_independent(self) -> None:
+        """
+        Mutated copies made with a count must each have their own bases and
+        history, with the template left unchanged.
+        """
+        genome = Genome("AACGTTGCA")
+        copies = genome.replicate(1.0, count=3)
+        for copy in copies:
+            assert len(copy.mutant) == 9
+            assert all(a != b for a, b in zip(str(copy), "TGCAACGTT"))
+            assert all(len(site.mutation_history) == 1 for site in copy)
+        assert copies[0].bases is not copies[1].bases
+        assert str(genome) == "AACGTTGCA"
+
+    @pytest.mark.parametrize("delta", (False, True))
+    def test_count_one(self, delta) -> None:
+        """
+        Replicating with a count of one must give a list with the genome that
+        replicating without a count would make from the same random state.
+        """
+        genome = Genome("AACGTTGCA" * 10)
+        if delta:
+            genome = DeltaGenome(genome)
+        (copy,) = genome.replicate(0.1, np.random.default_rng(3), count=1)
+        assert copy == genome.replicate(0.1, np.random.default_rng(3))
+
+
+class Test_delta:
+    """
+    Test the DeltaGenome class.
+    """
+
+    def test_initial(self) -> None:
+        """
+        A new delta genome must be the same as its reference.
+        """
+        reference = Genome("AACG")
+        genome = DeltaGenome(reference)
+        assert genome == reference
+        assert str(genome) == "AACG"
+        assert len(genome) == 4
+
+    @pytest.mark.parametrize("positive", (True, False))
+    def test_codes(self, positive) -> None:
+        """
+        The codes looked up at some offsets must be those of the whole array.
+        """
+        genome = DeltaGenome(
+            Genome("AACGTTGCA"), positive, changes={1: CODES["T"], 6: CODES["A"]}
+        )
+        offsets = np.array([0, 1, 2, 6, 6, 8])
+        assert (genome.codes(offsets) == genome.bases[offsets]).all()
+
+    def test_replicate_no_mutations(self) -> None:
+        """
+        Replication with no mutations must make the reverse complement and share
+        the (empty) changes.
+        """
+        genome = DeltaGenome(Genome("AACG"))
+        copy = genome.replicate()
+        assert str(copy) == "CGTT"
+        assert not copy.positive
+        assert copy.changes is genome.changes
+        assert copy.mutations() == {}
+
+    def test_replicate_all_mutated(self) -> None:
+        """
+        Replication with a mutation rate of one must mutate every site, and the
+        changes must be recorded against the reverse complement bases.
+        """
+        genome = DeltaGenome(Genome("AACG"))
+        copy = genome.replicate(1.0)
+        assert all(a != b for a, b in zip(str(copy), "CGTT"))
+        assert sum(copy.mutations().values()) == 4
+        for site, expected in zip(copy, "CGTT"):
+            assert site.mutant
+            ((change, positive),) = site.mutation_history
+            assert change == expected + site.base
+            assert positive is False
+
+    def test_parent_unchanged(self) -> None:
+        """
+        Replication with mutations must not change the genome being copied.
+        """
+        genome = DeltaGenome(Genome("AACG")).replicate(1.0)
+        before = str(genome)
+        genome.replicate(1.0)
+        assert str(genome) == before
+        assert all(len(site.mutation_history) == 1 for site in genome)
+
+    def test_rc(self) -> None:
+        """
+        The reverse complement must match that of an array genome and share the
+        changes of the original.
+        """
+        genome = DeltaGenome(Genome("AACG")).replicate(1.0)
+        rc = genome.rc()
+        assert rc == Genome(genome.bases, positive=False).rc()
+        assert rc.changes is genome.changes
+        assert rc.mutations() == {}
+
+    def test_history_accumulates(self) -> None:
+        """
+        Replicating a mutated genome must extend the history of its sites.
+        """
+        genome = DeltaGenome(Genome("AACG")).replicate(1.0).replicate(1.0)
+        assert genome.positive
+        assert all(len(site.mutation_history) == 2 for site in genome)
+        assert sum(genome.mutations().values()) == 4
+
+    def test_count(self) -> None:
+        """
+        Replicating with a count must make that many copies, each with its own
+        mutations.
+        """
+        genome = DeltaGenome(Genome("AACGTTGCA"))
+        copies = genome.replicate(1.0, count=3)
+        assert len(copies) == 3
+        for copy in copies:
+            assert not copy.positive
+            assert len(copy.mutant) == 9
+            assert all(a != b for a, b in zip(str(copy), "TGCAACGTT"))
+        assert str(genome) == "AACGTTGCA"
+
+    def test_differences(self) -> None:
+        """
+        The differences from the reference must be read from the changes and must
+        agree with those found by comparing the full sequences.
+        """
+        reference = Genome(length=200)
+        genome = DeltaGenome(reference)
+        for _ in range(4):
+            genome = genome.replicate(0.1).replicate(0.1)
+
+        offsets, bases = genome.differences(reference)
+        expected_offsets, expected_bases = Genome(genome.bases).differences(reference)
+        assert offsets.tolist() == expected_offsets.tolist()
+        assert bases.tolist() == expected_bases.tolist()
+
+
+class Test_copy_mutation_offsets:
+    """
+    Test the copy_mutation_offsets function.
+    """
+
+    def test_rate_one(self) -> None:
+        """
+        A mutation rate of one must give every offset of every copy.
+        """
+        assert copy_mutation_offsets(4, 3, 1.0) == [list(range(4))] * 3
+
+    def test_statistics(self) -> None:
+        """
+        The number of mutations per copy must have a binomial mean, and the
+        offsets must be within the genome.
+        """
+        rng = np.random.default_rng(5)
+        length, rate = 100, 0.05
+        copies = copy_mutation_offsets(length, 10000, rate, rng)
+        assert len(copies) == 10000
+        assert all(0 <= offset < length for offsets in copies for offset in offsets)
+        counts = np.array([len(offsets) for offsets in copies])
+        # The standard error of the mean is sqrt(4.75 / 10000) ~= 0.022.
+        assert abs(counts.mean() - length * rate) < 0.1
+
+
+class Test_sample_copy_offsets:
+    """
+    Test the sample_copy_offsets function.
+    """
+
+    def test_counts(self) -> None:
+        """
+        Each copy must get the requested number of distinct offsets, sorted by
+        copy and then by offset.
+        """
+        counts = np.array([3, 0, 10, 1, 7])
+        copies, offsets = sample_copy_offsets(10, counts, np.random.default_rng(3))
+        assert np.bincount(copies, minlength=len(counts)).tolist() == counts.tolist()
+        keys = copies * 10 + offsets
+        assert (np.diff(keys) > 0).all()
+        assert ((offsets >= 0) & (offsets < 10)).all()
+
+    def test_every_offset(self) -> None:
+        """
+        A copy that needs every offset must get all of them.
+        """
+        copies, offsets = sample_copy_offsets(4, np.array([4, 4]))
+        assert copies.tolist() == [0] * 4 + [1] * 4
+        assert offsets.tolist() == list(range(4)) * 2
+
+    def test_uniform(self) -> None:
+        """
+        The offsets must be spread uniformly over the genome.
+        """
+        length = 20
+        _, offsets = sample_copy_offsets(
+            length, np.full(10000, 5), np.random.default_rng(4)
+        )
+        per_offset = np.bincount(offsets, minlength=length)
+        # Each offset is expected 2,500 times (standard deviation ~43).
+        assert (abs(per_offset - 2500) < 250).all()
+
+
+class Test_mutation_offsets:
+    """
+    Test the mutation_offsets function.
+    """
+
+    def test_zero_rate(self) -> None:
+        """
+        A zero mutation rate must give no offsets.
+        """
+        assert mutation_offsets(1000, 0.0) == []
+
+    def test_rate_one(self) -> None:
+        """
+        A mutation rate of one must give every offset.
+        """
+        assert mutation_offsets(10, 1.0) == list(range(10))
+
+    def test_rate_above_one(self) -> None:
+        """
+        A mutation rate of more than one must give every offset, as for one.
+        """
+        assert mutation_offsets(10, 2.5) == list(range(10))
+
+    def test_offsets_increasing_and_in_range(self) -> None:
+        """
+        The offsets must be strictly increasing and within the genome.
+        """
+        for _ in range(100):
+            offsets = mutation_offsets(50, 0.2)
+            assert all(0 <= offset < 50 for offset in offsets)
+            assert offsets == sorted(set(offsets))
+
+    def test_statistics(self) -> None:
+        """
+        The number of mutations per copy must have the mean and variance of the
+        binomial distribution given by an independent test at each site, and the
+        mutated offsets must be uniformly spread over the genome.
+        """
+        rng = np.random.default_rng(17)
+        length, rate, copies = 1000, 0.01, 5000
+        counts = np.zeros(copies)
+        per_offset = np.zeros(length)
+
+        for copy in range(copies):
+            offsets = mutation_offsets(length, rate, rng)
+            counts[copy] = len(offsets)
+            per_offset[offsets] += 1
+
+        mean = length * rate
+        variance = length * rate * (1.0 - rate)
+        # The standard error of the mean is sqrt(10 / 5000) ~= 0.045.
+        assert abs(counts.mean() - mean) < 0.2
+        assert abs(counts.var() - variance) < 1.0
+        # Compare the first and second halves of the genome, and check the
+        # per-site frequencies (expected 0.01 each) with a chi-squared statistic.
+        first, second = per_offset[: length // 2].sum(), per_offset[length // 2 :].sum()
+        assert abs(first - second) < 4 * sqrt(first + second)
+        expected = copies * rate
+        chi2 = ((per_offset - expected) ** 2 / expected).sum()
+        # For 999 degrees of freedom, the 99.99th percentile is about 1178.
+        assert chi2 < 1178
@@ -0,0 +1,154 @@
+from collections import Counter
+
+import pytest
+
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.haplotypes import Haplotypes
+from viral_rna_simulation.rna import RNA
+
+
+class Test_haplotypes:
+    """
+    Test the Haplotypes class.
+    """
+
+    def test_empty(self) -> None:
+        """
+        A new Haplotypes with no RNA must be empty.
+        """
+        haplotypes = Haplotypes()
+        assert len(haplotypes) == 0
+        assert list(haplotypes) == []
+
+    def test_identical_are_collapsed(self) -> None:
+        """
+        Identical RNA molecules must be stored once, with a count.
+        """
+        haplotypes = Haplotypes(RNA(Genome("ACG")) for _ in range(5))
+        assert len(haplotypes) == 5
+        assert len(haplotypes.rnas) == 1
+        assert list(haplotypes.items()) == [(RNA(Genome("ACG")), 5)]
+
+    def test_strands_are_not_collapsed(self) -> None:
+        """
+        RNA molecules with the same bases but different sense must be kept apart.
+        """
+        haplotypes = Haplotypes([
+            RNA(Genome("ACG")),
+            RNA(Genome("ACG", positive=False)),
+        ])
+        assert len(haplotypes.rnas) == 2
+
+    def test_mutant_is_not_collapsed(self) -> None:
+        """
+        An RNA whose site was made by a mutation must not be collapsed with one
+        that has the same bases but no mutation.
+        """
+        mutant = Genome("A").replicate(1.0)
+        plain = Genome(str(mutant), positive=False)
+        haplotypes = Haplotypes([RNA(mutant), RNA(plain)])
+        assert len(haplotypes.rnas) == 2
+
+    def test_delta_genomes_collapsed(self) -> None:
+        """
+        Identical delta genomes must be collapsed.
+        """
+        reference = Genome("ACGT")
+        haplotypes = Haplotypes(
+            RNA(DeltaGenome(reference).replicate()) for _ in range(3)
+        )
+        assert len(haplotypes.rnas) == 1
+
+    def test_replications_are_summed(self) -> None:
+        """
+        The replications of molecules added to an existing haplotype must be
+        added to its total.
+        """
+        rna1, rna2 = RNA(Genome("A")), RNA(Genome("A"))
+        rna1.replications = 2
+        rna2.replications = 3
+        haplotypes = Haplotypes([rna1, rna2])
+        (rna,) = haplotypes.rnas
+        assert rna.replications == 5
+
+    def test_getitem(self) -> None:
+        """
+        Indexing must treat the haplotypes as a sequence of molecules.
+        """
+        haplotypes = Haplotypes()
+        haplotypes.append(RNA(Genome("A")), 2)
+        haplotypes.append(RNA(Genome("C")), 3)
+        assert [str(rna.genome) for rna in haplotypes] == ["A"] * 2 + ["C"] * 3
+        assert [str(haplotypes[i].genome) for i in range(5)] == ["A"] * 2 + ["C"] * 3
+        assert str(haplotypes[-1].genome) == "C"
+        with pytest.raises(IndexError):
+            haplotypes[5]
+
+    def test_getitem_after_append(self) -> None:
+        """
+        Indexing must reflect molecules added after a previous index.
+        """
+        haplotypes = Haplotypes([RNA(Genome("A"))])
+        assert str(haplotypes[0].genome) == "A"
+        haplotypes.append(RNA(Genome("C")))
+        assert str(haplotypes[1].genome) == "C"
+
+    def test_remove(self) -> None:
+        """
+        Removing molecules must reduce the count of their distinct RNA, and
+        removing its last molecule must move the last distinct RNA into its
+        place.
+        """
+        haplotypes = Haplotypes([RNA(Genome("A")), RNA(Genome("A")), RNA(Genome("C"))])
+        haplotypes.append(RNA(Genome("G")))
+        assert not haplotypes.remove(0)
+        assert haplotypes.remove(0)
+        assert len(haplotypes) == 2
+        assert [str(rna.genome) for rna in haplotypes] == ["G", "C"]
+        assert haplotypes.find(0) == 0
+        # The moved RNA must still be found when it is added again.
+        assert haplotypes.append(RNA(Genome("G"))) == 0
+        assert haplotypes.append(RNA(Genome("A"))) == 2
+
+    def test_append_index(self) -> None:
+        """
+        Appending must return the index of the distinct RNA added to.
+        """
+        haplotypes = Haplotypes([RNA(Genome("A"))])
+        assert haplotypes.append(RNA(Genome("C")), 2) == 1
+        assert haplotypes.append(RNA(Genome("A"))) == 0
+        assert [str(rna.genome) for rna in haplotypes] == ["A", "A", "C", "C"]
+
+
+class Test_cell:
+    """
+    Test a Cell that stores haplotypes.
+    """
+
+    def test_counts_match_list_cell(self) -> None:
+        """
+        A cell storing haplotypes must have the same molecule counts as one
+        storing a list, when the same choices are made.
+        """
+        genome = Genome("ACGTAC")
+        ratio = 10
+
+        def choose_negative(rnas):
+            # Choose a (-) RNA if there is one.
+            for rna in rnas:
+                if not rna.positive:
+                    return rna
+            return rnas[0]
+
+        for haplotypes in False, True:
+            cell = Cell(genome, haplotypes=haplotypes)
+            cell.replicate_rnas(3, ratio=ratio, chooser=choose_negative)
+            counts = Counter()
+            for rna, count in cell.rna_counts():
+                counts[rna.positive] += count
+            assert len(cell) == 2 + 2 * ratio
+            assert counts == {True: 1 + 2 * ratio, False: 1}
+
+        # All the (+) RNAs are identical, as are the (-).
+        assert len(cell.rnas.rnas) == 2
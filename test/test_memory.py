@@ -0,0 +1,250 @@
+import sys
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation import profiling
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.memory import (
+    deep_size,
+    expected_molecules,
+    format_bytes,
+    memory_report,
+    object_sizes,
+    parse_bytes,
+    project_memory,
+)
+
+
+class Test_bytes:
+    """
+    Test parsing and formatting numbers of bytes.
+    """
+
+    @pytest.mark.parametrize(
+        "value,expected",
+        (
+            ("100", 100),
+            ("1K", 1024),
+            ("1.5k", 1536),
+            ("2M", 2 * 1024**2),
+            ("8G", 8 * 1024**3),
+            ("8GiB", 8 * 1024**3),
+            ("1T", 1024**4),
+        ),
+    )
+    def test_parse(self, value: str, expected: int) -> None:
+        """
+        Numbers of bytes, with or without a unit, must be parsed.
+        """
+        assert parse_bytes(value) == expected
+
+    def test_parse_invalid(self) -> None:
+        """
+        An unparseable value must raise ValueError.
+        """
+        with pytest.raises(ValueError, match="^Could not parse 'lots' as a"):
+            parse_bytes("lots")
+
+    @pytest.mark.parametrize(
+        "size,expected",
+        ((100, "100 B"), (1536, "1.5 KiB"), (3 * 1024**3, "3.0 GiB")),
+    )
+    def test_format(self, size: int, expected: str) -> None:
+        """
+        Numbers of bytes must be formatted with a suitable unit.
+        """
+        assert format_bytes(size) == expected
+
+
+class Test_deep_size:
+    """
+    Test the deep_size function.
+    """
+
+    def test_array(self) -> None:
+        """
+        The size of an array must include its data.
+        """
+        assert deep_size(np.zeros(10_000, dtype=np.uint8)) > 10_000
+
+    def test_view(self) -> None:
+        """
+        A view must be counted as the data it exposes, not as the array it is
+        a view of.
+        """
+        array = np.zeros(10_000, dtype=np.uint8)
+        assert deep_size(array[:10]) < 1000
+
+    def test_shared(self) -> None:
+        """
+        An object referred to twice must only be counted once.
+        """
+        array = np.zeros(10_000, dtype=np.uint8)
+        assert deep_size([array, array]) < deep_size([array, array.copy()])
+
+    def test_seen(self) -> None:
+        """
+        Objects already seen must not be counted again.
+        """
+        array = np.zeros(10_000, dtype=np.uint8)
+        seen = set()
+        deep_size(array, seen)
+        assert deep_size({"a": array}, seen) < 10_000
+
+
+class Test_expected_molecules:
+    """
+    Test the expected_molecules function.
+    """
+
+    def test_ratio_one(self) -> None:
+        """
+        With a ratio of one, each step must add one molecule.
+        """
+        assert expected_molecules(100, 1) == pytest.approx(101)
+
+    def test_ratio(self) -> None:
+        """
+        The expected number of molecules must be close to that of a simulation.
+        """
+        cells = Cells(20, Genome("ACGT" * 5), seed=1)
+        cells.replicate(steps=500, ratio=10, backend="serial")
+        rnas = sum(cells.rna_count()) / 20
+        assert expected_molecules(500, 10) == pytest.approx(rnas, rel=0.1)
+
+    def test_decay(self) -> None:
+        """
+        Decay must reduce the expected number of molecules.
+        """
+        assert expected_molecules(500, 10, 0.01, 0.01) < expected_molecules(500, 10)
+
+    def test_full_decay(self) -> None:
+        """
+        If all molecules decay, the peak must be the single infecting molecule.
+        """
+        assert expected_molecules(100, 10, 1.0, 1.0) == 1.0
+
+    def test_max_rnas(self) -> None:
+        """
+        The expected number of molecules must not exceed the carrying capacity.
+        """
+        assert expected_molecules(500, 10, max_rnas=100) == 100.0
+
+
+class Test_project_memory:
+    """
+    Test the project_memory function.
+    """
+
+    def test_cells(self) -> None:
+        """
+        The projected memory must grow with the number of cells.
+        """
+        args = (None, 1000, "both", 0.001, 500, 10)
+        assert project_memory(2, *args) > 1.5 * project_memory(1, *args)
+
+    @pytest.mark.parametrize("engine", ("cells", "arrays", "resident"))
+    def test_close(self, engine: str) -> None:
+        """
+        The projected memory must be close to that used by the cells.
+        """
+        projected = project_memory(2, None, 1000, "both", 0.001, 200, 10, engine=engine)
+        cells = Cells(2, Genome(length=1000, rng=np.random.default_rng(0)), seed=0)
+        cells.replicate(steps=200, mutation_rate=0.001, ratio=10, backend="serial")
+        if engine == "arrays":
+            # Arrays use less memory than RNA instances.
+            assert 0 < projected < deep_size(cells)
+        else:
+            assert projected == pytest.approx(deep_size(cells), rel=0.25)
+
+    def test_delta(self) -> None:
+        """
+        Delta genomes must be projected to use less memory than full genomes.
+        """
+        args = (1, None, 10_000, "both", 0.001, 200, 10)
+        assert project_memory(*args, delta=True) < project_memory(*args)
+
+    def test_max_rnas(self) -> None:
+        """
+        A run with a carrying capacity must be projected below a budget that the
+        same run without one exceeds.
+        """
+        args = (100, None, 1000, "both", 0.001, 2000, 10)
+        budget = 50 * 1024**2
+        assert project_memory(*args) > budget
+        assert project_memory(*args, max_rnas=100) < budget
+
+
+class Test_object_sizes:
+    """
+    Test the object_sizes and memory_report functions.
+    """
+
+    def test_sizes(self) -> None:
+        """
+        The sizes must be positive and consistent.
+        """
+        cells = Cells(2, Genome(length=1000, rng=np.random.default_rng(0)), seed=0)
+        cells.replicate(steps=50, mutation_rate=0.01, ratio=2, backend="serial")
+        sizes = object_sizes(cells)
+        assert sizes["Site"] > 0
+        assert sizes["Genome"] > 1000
+        assert sizes["genome site"] == sizes["Genome"] / 1000
+        assert sizes["RNA"] > sizes["Genome"]
+        assert sizes["total"] > 2 * sizes["cell"] > 0
+
+    def test_report(self) -> None:
+        """
+        The report must include the projected memory and the object sizes.
+        """
+        cells = Cells(1, Genome("ACGT" * 10), seed=0)
+        report = memory_report(cells, 2048)
+        assert report.startswith("Projected memory: 2.0 KiB\nBytes per Site")
+        assert "Bytes per RNA:" in report
+
+
+class Test_memory_profile:
+    """
+    Test the recording of memory use in profile phases.
+    """
+
+    def test_peak(self) -> None:
+        """
+        The peak memory allocated in a phase, including in a phase within it,
+        must be recorded.
+        """
+        profile = profiling.enable(memory=True)
+        try:
+            with profiling.phase("outer"):
+                with profiling.phase("inner"):
+                    data = np.zeros(1_000_000, dtype=np.uint8)
+                    del data
+                with profiling.phase("after"):
+                    pass
+        finally:
+            profiling.disable()
+
+        assert profile.phases["inner"]["peak"] >= 1_000_000
+        assert profile.phases["outer"]["peak"] >= 1_000_000
+        assert profile.phases["after"]["peak"] < 100_000
+        assert profile.phases["outer"]["process_max_rss"] > 0
+        assert "Peak (MiB)" in profile.format()
+        assert "Process RSS so far (MiB)" in profile.format()
+
+    def test_no_resource(self, monkeypatch) -> None:
+        """
+        Without the 'resource' module (as on Windows), the resident memory must
+        be left out, and the profile must still be formatted.
+        """
+        monkeypatch.setitem(sys.modules, "resource", None)
+        assert profiling.max_rss() is None
+        profile = profiling.enable(memory=True)
+        try:
+            with profiling.phase("phase"):
+                pass
+        finally:
+            profiling.disable()
+        assert profile.phases["phase"]["process_max_rss"] is None
+        assert "phase" in profile.format()
@@ -0,0 +1,168 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.pileup import Pileup, pileup_frame
+from viral_rna_simulation.resident_cells import ResidentCells
+from viral_rna_simulation.utils import BASES, CODES
+
+
+def apparent(cells: Cells) -> np.ndarray:
+    """
+    Find the apparent pileup counts by reading every site of every molecule.
+    """
+    length = len(cells.infecting_genome)
+    result = np.zeros((2, length, 4), dtype=np.int64)
+    sites = np.arange(length)
+    for cell in cells:
+        for rna in cell:
+            bases = np.array([CODES[site.base] for site in rna.genome])
+            if rna.genome.positive:
+                np.add.at(result[0], (sites, bases), 1)
+            else:
+                np.add.at(result[1], (sites, 3 - bases[::-1]), 1)
+    return result
+
+
+def actual(cells: Cells) -> np.ndarray:
+    """
+    Find the (+) sense base totals of the mutations made in (+) and (-)
+    molecules from the mutation counts.
+    """
+    result = np.zeros((2, 4), dtype=np.int64)
+    for strand, counts in enumerate(cells.mutation_counts()):
+        for change, count in counts.items():
+            code = CODES[change[1]]
+            result[strand, code if strand == 0 else 3 - code] += count
+    return result
+
+
+class Test_pileup:
+    """
+    Test the Pileup class.
+    """
+
+    def test_initial(self) -> None:
+        """
+        With no molecules, all counts must be zero.
+        """
+        counts = Pileup(Genome("ACGT")).counts()
+        assert counts.shape == (2, 2, 4, 4)
+        assert not counts.any()
+
+    def test_reference(self) -> None:
+        """
+        Unmutated (+) and (-) molecules must be counted at the reference base.
+        """
+        genome = Genome("ACGT")
+        pileup = Pileup(genome)
+        pileup.add(genome, 3)
+        pileup.add(genome.rc(), 2)
+        counts = pileup.counts()
+        assert (counts[0, 0] == 3 * np.eye(4, dtype=np.int64)).all()
+        assert (counts[0, 1] == 2 * np.eye(4, dtype=np.int64)).all()
+        assert not counts[1].any()
+
+    def test_small_flush(self, monkeypatch, replicated) -> None:
+        """
+        Flushing pending counts often must not change the result.
+        """
+        cells = replicated(delta=True)
+        expected = cells.pileup()
+        monkeypatch.setattr("viral_rna_simulation.pileup.FLUSH", 1)
+        assert (cells.pileup() == expected).all()
+
+
+class Test_cells_pileup:
+    """
+    Test the pileups of the cells classes.
+    """
+
+    @pytest.mark.parametrize("delta", (False, True))
+    @pytest.mark.parametrize("haplotypes", (False, True))
+    def test_cells(self, delta, haplotypes, replicated) -> None:
+        """
+        The Cells pileup must match the bases of every molecule and the
+        mutation counts.
+        """
+        cells = replicated(delta=delta, haplotypes=haplotypes)
+        counts = cells.pileup()
+        assert (counts[0] == apparent(cells)).all()
+        assert (counts[1].sum(axis=1) == actual(cells)).all()
+
+    def test_depth(self, replicated) -> None:
+        """
+        The apparent counts at each site must add up to the number of (+) and
+        (-) molecules.
+        """
+        cells = replicated()
+        depth = cells.pileup()[0].sum(axis=2)
+        positive, negative = cells.rna_count()
+        assert (depth[0] == positive).all()
+        assert (depth[1] == negative).all()
+
+    def test_downsampled(self) -> None:
+        """
+        A pileup of cells that have been downsampled must raise a ValueError,
+        but one of cells that never reached their carrying capacity must not.
+        """
+        cells = Cells(2, Genome("ACGTTGCAAC" * 6), seed=4)
+        cells.replicate(steps=300, mutation_rate=0.05, ratio=3, max_rnas=50)
+        with pytest.raises(ValueError, match="downsampled"):
+            cells.pileup()
+
+        cells = Cells(2, Genome("ACGTTGCAAC" * 6), seed=4)
+        cells.replicate(steps=10, mutation_rate=0.05, ratio=3, max_rnas=50)
+        depth = cells.pileup()[0].sum(axis=2)
+        assert (depth[0] == cells.rna_count()[0]).all()
+
+    def test_array_cells(self, replicated) -> None:
+        """
+        The ArrayCells pileup must match that of Cells.
+        """
+        cells = replicated(ArrayCells)
+        counts = cells.pileup()
+        assert (counts == Cells.pileup(cells)).all()
+        assert (counts[0] == apparent(cells)).all()
+        assert (counts[1].sum(axis=1) == actual(cells)).all()
+
+    def test_resident_cells(self, replicated) -> None:
+        """
+        The ResidentCells pileup must match that of Cells with the same seed.
+        """
+        cells = replicated(ResidentCells, workers=2)
+        counts = cells.pileup()
+        cells.close()
+        assert (counts == replicated().pileup()).all()
+
+
+class Test_pileup_frame:
+    """
+    Test the pileup_frame function.
+    """
+
+    def test_frame(self, tmp_path, replicated) -> None:
+        """
+        The data frame must have a row for each kind, strand, and site, and
+        must survive a Parquet round trip.
+        """
+        cells = replicated()
+        counts = cells.pileup()
+        frame = pileup_frame(counts, cells.infecting_genome)
+        assert frame.columns == ["position", "reference", "kind", "strand", *BASES]
+        assert len(frame) == 4 * 60
+
+        row = frame.filter(
+            (pl.col("kind") == "apparent")
+            & (pl.col("strand") == "-")
+            & (pl.col("position") == 7)
+        )
+        assert row.select(list(BASES)).row(0) == tuple(counts[0, 1, 6].tolist())
+        assert row["reference"][0] == str(cells.infecting_genome)[6]
+
+        filename = tmp_path / "pileup.parquet"
+        frame.write_parquet(filename)
+        assert pl.read_parquet(filename).equals(frame)
@@ -0,0 +1,54 @@
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.plot import (
+    BARCHART_CATEGORIES,
+    TRAJECTORY_TOTALS,
+    plot_data,
+    trajectory_data,
+)
+
+
+class Test_plot_data:
+    """
+    Test the plot_data function.
+    """
+
+    def test_no_changes(self) -> None:
+        """
+        There must be no data if there are no changes.
+        """
+        assert plot_data(Cells(1, Genome("ACGT"))) is None
+
+    def test_changes(self) -> None:
+        """
+        There must be a count for every change and origin.
+        """
+        cells = Cells(1, Genome("ACGTTGCAAC"), seed=1)
+        cells.replicate(steps=20, mutation_rate=0.1, backend="serial")
+        df = plot_data(cells)
+        assert df.columns == ["Change", "Origin", "Count"]
+        assert len(df) == 4 * len(BARCHART_CATEGORIES)
+        overall = df.filter(df["Origin"] == "Actual overall")["Count"].sum()
+        assert overall == sum(
+            sum(counts.values()) for counts in cells.mutation_counts()
+        )
+
+
+class Test_trajectory_data:
+    """
+    Test the trajectory_data function.
+    """
+
+    def test_totals(self) -> None:
+        """
+        There must be a summed count for every recorded step and origin.
+        """
+        cells = Cells(2, Genome("ACGTTGCAAC"), seed=1)
+        cells.record_trajectory(5, 20)
+        cells.replicate(steps=20, mutation_rate=0.1, backend="serial")
+        df = trajectory_data(cells.trajectory)
+        assert df.columns == ["Step", "Origin", "Count"]
+        assert len(df) == 4 * len(TRAJECTORY_TOTALS)
+        last = df.filter((df["Origin"] == "Actual (+) RNA") & (df["Step"] == 20))
+        positive, _ = cells.mutation_counts()
+        assert last["Count"].to_list() == [positive.total()]
@@ -0,0 +1,178 @@
+import pytest
+
+from viral_rna_simulation import profiling
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.profiling import Profile, phase, timed
+from viral_rna_simulation.simulate import run
+
+
+@pytest.fixture
+def profile():
+    """
+    Turn on profiling for a test, and off again afterwards.
+    """
+    yield profiling.enable()
+    profiling.disable()
+
+
+class Test_Profile:
+    """
+    Test the Profile class.
+    """
+
+    def test_add(self) -> None:
+        """
+        Adding to a phase must add to its totals.
+        """
+        profile = Profile()
+        profile.add("x", 1.0, 0.5, items=10, unit="things")
+        profile.add("x", 2.0, 1.5, items=20)
+        assert profile.phases == {
+            "x": {"calls": 2, "wall": 3.0, "cpu": 2.0, "items": 30, "unit": "things"}
+        }
+
+    def test_phase(self) -> None:
+        """
+        Running code in a phase must record a call.
+        """
+        profile = Profile()
+        with profile.phase("x"):
+            sum(range(1000))
+        assert profile.phases["x"]["calls"] == 1
+        assert profile.phases["x"]["wall"] > 0.0
+
+    def test_to_dict_throughput(self) -> None:
+        """
+        A phase with a unit must have its throughput in the dict, and one
+        without a unit must not.
+        """
+        profile = Profile()
+        profile.add("x", 2.0, items=10, unit="things")
+        profile.add("y", 2.0)
+        result = profile.to_dict()
+        assert result["x"]["throughput"] == 5.0
+        assert "throughput" not in result["y"]
+
+    def test_format(self) -> None:
+        """
+        The formatted table must have a header and a line for each phase, in
+        the order in which they were first recorded.
+        """
+        profile = Profile()
+        profile.add("second", 1.0)
+        profile.add("first", 2.0, items=4, unit="things")
+        lines = profile.format().split("\n")
+        assert len(lines) == 3
+        assert lines[0].startswith("Phase")
+        assert lines[1].startswith("second")
+        assert lines[2].startswith("first")
+        assert lines[2].endswith("4 things (2/s)")
+
+
+class Test_profiling:
+    """
+    Test turning profiling on and off.
+    """
+
+    def test_off_by_default(self) -> None:
+        """
+        Profiling must be off unless it is turned on.
+        """
+        assert profiling.PROFILE is None
+
+    def test_phase_when_off(self) -> None:
+        """
+        The phase function must do nothing when profiling is off.
+        """
+        with phase("x"):
+            pass
+        assert profiling.PROFILE is None
+
+    def test_timed_when_off(self) -> None:
+        """
+        A timed function must return its result when profiling is off.
+        """
+
+        @timed("x")
+        def double(n: int) -> int:
+            return 2 * n
+
+        assert double(3) == 6
+
+    def test_timed(self, profile) -> None:
+        """
+        A timed function must return its result and record a call when
+        profiling is on.
+        """
+
+        @timed("x")
+        def double(n: int) -> int:
+            return 2 * n
+
+        assert double(3) == 6
+        assert double(4) == 8
+        assert profile.phases["x"]["calls"] == 2
+
+    def test_disable(self) -> None:
+        """
+        Disabling profiling must stop recording.
+        """
+        profile = profiling.enable()
+        profiling.disable()
+        with phase("x"):
+            pass
+        assert profile.phases == {}
+
+
+class Test_profiled_replicate:
+    """
+    Test replicating cells with profiling on.
+    """
+
+    @pytest.mark.parametrize("backend", ("serial", "threads", "processes"))
+    def test_same_result(self, profile, backend: str) -> None:
+        """
+        Profiling must not change the result of replicating cells, and must
+        record the replication of each cell.
+        """
+        genome = Genome("ACGTTGCAAC" * 10)
+        profiled = Cells(3, genome, seed=1)
+        profiled.replicate(steps=20, mutation_rate=0.01, ratio=2, backend=backend)
+
+        profiling.disable()
+        unprofiled = Cells(3, genome, seed=1)
+        unprofiled.replicate(steps=20, mutation_rate=0.01, ratio=2, backend=backend)
+
+        assert profiled.summary() == unprofiled.summary()
+        phase = profile.phases["replicate_rnas"]
+        assert phase["calls"] == 3
+        assert phase["unit"] == "replications"
+        assert phase["items"] == sum(profiled.replication_count())
+
+    def test_transfer(self, profile) -> None:
+        """
+        With the 'processes' backend, the transfer of cells to and from the
+        workers must be recorded.
+        """
+        cells = Cells(2, Genome("ACGTTGCAAC" * 10), seed=1)
+        cells.replicate(steps=10, backend="processes")
+        assert profile.phases["pool startup"]["calls"] == 1
+        for name in "cell transfer", "result transfer":
+            assert profile.phases[name]["calls"] == 2
+            assert profile.phases[name]["items"] > 0
+
+    def test_run(self, profile) -> None:
+        """
+        Running a simulation must record its phases.
+        """
+        cells = run(2, None, 100, "both", 0.01, 10, 1, seed=1, backend="serial")
+        cells.summary()
+        assert {
+            "Genome construction",
+            "Cells construction",
+            "replicate_rnas",
+            "replicate",
+            "Cells.summary",
+            "Cells.mutation_counts",
+        } <= set(profile.phases)
@@ -0,0 +1,178 @@
+import gzip
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.reads import (
+    REFERENCE_NAME,
+    chunk_reads,
+    molecule_chunks,
+    quality,
+    reads_per_strand,
+    write_reads,
+)
+from viral_rna_simulation.utils import rc
+
+
+def fastq_records(data: bytes) -> list[tuple[str, str, str]]:
+    """
+    Get the (name, sequence, quality) records from gzip compressed FASTQ.
+    """
+    lines = gzip.decompress(data).decode().splitlines()
+    return [
+        (lines[index][1:], lines[index + 1], lines[index + 3])
+        for index in range(0, len(lines), 4)
+    ]
+
+
+def sam_records(data: bytes) -> list[list[str]]:
+    """
+    Get the fields of the (non-header) SAM records.
+    """
+    return [
+        line.split("\t")
+        for line in data.decode().splitlines()
+        if not line.startswith("@")
+    ]
+
+
+def sequence(cells: Cells, **kwargs) -> tuple[bytes, bytes, int]:
+    """
+    Sequence some cells, returning the FASTQ, the SAM and the number of reads.
+    """
+    fastq, sam = BytesIO(), BytesIO()
+    count = write_reads(cells, fastq, sam, **kwargs)
+    return fastq.getvalue(), sam.getvalue(), count
+
+
+class Test_reads:
+    """
+    Test the read simulation functions.
+    """
+
+    def test_quality(self) -> None:
+        """
+        The base quality must match the error rate, up to a maximum.
+        """
+        assert quality(0.001) == 30
+        assert quality(0.0) == 40
+        assert quality(1e-9) == 40
+
+    def test_reads_per_strand(self) -> None:
+        """
+        There must be enough reads to cover the genome to the given depth.
+        """
+        assert reads_per_strand(1000, 100, 1.0) == 10
+        assert reads_per_strand(1000, 300, 2.0) == 7
+        # Reads are no longer than the genome.
+        assert reads_per_strand(50, 100, 1.0) == 1
+
+    def test_chunks(self) -> None:
+        """
+        All molecules must be put into chunks of about the given size.
+        """
+        cells = Cells(2, Genome("ACGT" * 25), seed=1)
+        cells.replicate(steps=10, backend="serial")
+        chunks = list(molecule_chunks(cells, 50, 1.0, chunk_reads=10))
+        # There are 22 molecules, each with 2 reads per strand.
+        assert [len(molecules) for _, molecules in chunks] == [3] * 7 + [1]
+        assert [first for first, _ in chunks] == [0, 3, 6, 9, 12, 15, 18, 21]
+
+    def test_split_haplotype(self) -> None:
+        """
+        The copies of a haplotype with many molecules must be split over
+        chunks, and their reads must still have distinct names.
+        """
+        cells = Cells(1, Genome("ACGT" * 25), haplotypes=True, seed=1)
+        cells.replicate(steps=10, ratio=5, backend="serial")
+        # Without mutations, there are just two haplotypes.
+        counts = [count for _, count in cells.cells[0].rna_counts()]
+        chunks = list(molecule_chunks(cells, 50, 1.0, chunk_reads=10))
+        # Each molecule has 4 reads, so there are at most 3 copies per part.
+        parts = [part for _, molecules in chunks for part in molecules]
+        assert max(copies for _, _, copies, _ in parts) == 3
+        assert sum(copies for _, _, copies, _ in parts) == sum(counts)
+
+        names = []
+        for chunk in chunks:
+            seed = np.random.SeedSequence(1)
+            fastq, _, _ = chunk_reads(
+                chunk, cells.infecting_genome.bases, 50, 1.0, 0.0, seed
+            )
+            names.extend(name for name, _, _ in fastq_records(fastq))
+        assert len(names) == 4 * sum(counts)
+        assert len(set(names)) == len(names)
+        assert {name.split(":")[1] for name in names} == {"1", "2"}
+
+    def test_count(self) -> None:
+        """
+        The FASTQ and SAM must have the expected number of reads.
+        """
+        cells = Cells(2, Genome("ACGT" * 25), seed=1)
+        cells.replicate(steps=10, backend="serial")
+        fastq, sam, count = sequence(cells, read_length=20, depth=2.0, workers=1)
+        # 22 molecules, two strands, 10 reads per strand.
+        assert count == 22 * 2 * 10
+        assert len(fastq_records(fastq)) == count
+        assert len(sam_records(sam)) == count
+
+    def test_header(self) -> None:
+        """
+        The SAM header must give the reference name and length.
+        """
+        _, sam, _ = sequence(Cells(1, Genome("ACGT" * 25), seed=1), workers=1)
+        assert f"@SQ\tSN:{REFERENCE_NAME}\tLN:100\n" in sam.decode()
+
+    def test_aligned(self) -> None:
+        """
+        Without mutations or errors, each SAM record must match the reference
+        at its position, and (-) strand reads must be reverse complemented in
+        the FASTQ.
+        """
+        reference = "AACGTTTGCAGGCATTACGA" * 5
+        cells = Cells(1, Genome(reference), seed=1)
+        cells.replicate(steps=5, backend="serial")
+        fastq, sam, _ = sequence(cells, read_length=30, seed=2, workers=1)
+        for (name, read, qual), record in zip(fastq_records(fastq), sam_records(sam)):
+            qname, flag, rname, pos, _, cigar, *_, seq, sam_qual, nm = record
+            assert qname == name
+            assert rname == REFERENCE_NAME
+            assert cigar == "30M"
+            start = int(pos) - 1
+            assert seq == reference[start : start + 30]
+            assert read == (rc(seq) if flag == "16" else seq)
+            assert name.split(":")[2] == ("-" if flag == "16" else "+")
+            assert qual == sam_qual == "I" * 30
+            assert nm == "NM:i:0"
+
+    def test_errors(self) -> None:
+        """
+        Sequencing errors must give mismatches at about the error rate.
+        """
+        cells = Cells(1, Genome("ACGT" * 250), seed=1)
+        _, sam, count = sequence(
+            cells, read_length=100, depth=50.0, error_rate=0.01, workers=1
+        )
+        mismatches = sum(int(record[-1][5:]) for record in sam_records(sam))
+        assert mismatches / (count * 100) == pytest.approx(0.01, rel=0.2)
+
+    def test_seed(self) -> None:
+        """
+        The same seed must give the same reads, whatever the number of workers.
+        """
+        cells = Cells(2, Genome("ACGT" * 25), seed=1)
+        cells.replicate(steps=10, mutation_rate=0.05, backend="serial")
+        assert sequence(cells, seed=3, error_rate=0.01, workers=1) == sequence(
+            cells, seed=3, error_rate=0.01, workers=2
+        )
+
+    def test_fastq_only(self) -> None:
+        """
+        It must be possible to write only FASTQ.
+        """
+        fastq = BytesIO()
+        count = write_reads(Cells(1, Genome("ACGT" * 25), seed=1), fastq, workers=1)
+        assert len(fastq_records(fastq.getvalue())) == count == 2
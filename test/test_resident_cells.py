@@ -0,0 +1,166 @@
+import pytest
+
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.resident_cells import ResidentCells
+from viral_rna_simulation.spectrum import MutationSpectrum
+
+
+def counts(cells: Cells) -> tuple:
+    """
+    Get the molecule, replication and mutation counts and the cell sizes of some
+    cells.
+    """
+    return (
+        cells.rna_count(),
+        cells.replication_count(),
+        cells.mutation_counts(),
+        cells.cell_sizes(),
+    )
+
+
+class Test_resident_cells:
+    """
+    Test the ResidentCells class.
+    """
+
+    def test_length(self) -> None:
+        """
+        The __len__ method must give the number of cells.
+        """
+        cells = ResidentCells(5, Genome("ATTC"), workers=2)
+        assert len(cells) == 5
+        cells.close()
+
+    def test_initial_counts(self) -> None:
+        """
+        The initial counts must be those of the new cells.
+        """
+        cells = ResidentCells(3, Genome("ATTC"), workers=2)
+        assert cells.rna_count() == (3, 0)
+        assert cells.replication_count() == (0, 0)
+        assert cells.mutation_counts() == ({}, {})
+        assert cells.apparent_mutation_counts() == ({}, {})
+        cells.close()
+
+    def test_replicate(self) -> None:
+        """
+        Replication must be done by the workers, which must keep their cells
+        between calls.
+        """
+        cells = ResidentCells(2, Genome("A"), workers=2)
+        cells.replicate(steps=1)
+        assert cells.rna_count() == (2, 2)
+        assert cells.replication_count() == (2, 0)
+
+        cells.replicate(steps=3)
+        assert sum(cells.rna_count()) == 10
+        assert sum(cells.replication_count()) == 8
+
+        # The cells are only fetched from the workers when asked for.
+        assert [len(cell) for cell in cells] == [5, 5]
+        cells.close()
+
+    def test_counts_match_fetched_cells(self) -> None:
+        """
+        The counts sent by the workers must match those of the fetched cells.
+        """
+        cells = ResidentCells(3, Genome(length=100), workers=2, delta=True)
+        cells.replicate(steps=30, mutation_rate=0.02, ratio=3)
+        mutations = cells.mutation_counts()
+        apparent = cells.apparent_mutation_counts()
+        fetched = cells.cells
+        assert len(fetched) == 3
+        assert sum(len(cell) for cell in fetched) == sum(cells.rna_count())
+        recount = Cells.recount(cells)
+        assert (recount.positive_mutations, recount.negative_mutations) == mutations
+        assert (recount.from_positive, recount.from_negative) == apparent
+        assert cells.summary()
+        cells.close()
+
+    @pytest.mark.parametrize("check", (False, True))
+    def test_check_counts(self, check: bool) -> None:
+        """
+        The running totals of the fetched cells must be checkable, and counts
+        must add them up, whether or not checking was asked for.
+        """
+        cells = ResidentCells(3, Genome(length=100), workers=2, check=check)
+        cells.replicate(steps=30, mutation_rate=0.02, ratio=3)
+        assert cells.check is check
+        assert cells.directory is None
+        cells.check_counts()
+        counts = cells.counts()
+        assert (counts.positive_rnas, counts.negative_rnas) == cells.rna_count()
+        cells.close()
+
+    def test_closed(self) -> None:
+        """
+        Using the cells after closing must raise a RuntimeError.
+        """
+        cells = ResidentCells(1, Genome("A"))
+        cells.close()
+        with pytest.raises(RuntimeError):
+            cells.replicate(steps=1)
+
+    def test_seed(self) -> None:
+        """
+        Resident cells must give the same counts as Cells for the same seed,
+        whatever the number of workers.
+        """
+        results = []
+        for workers in 1, 2:
+            cells = ResidentCells(3, Genome("ACGTTGCAAC"), workers=workers, seed=5)
+            cells.replicate(steps=30, mutation_rate=0.05, ratio=2)
+            results.append((cells.rna_count(), cells.mutation_counts()))
+            cells.close()
+
+        expected = Cells(3, Genome("ACGTTGCAAC"), seed=5)
+        expected.replicate(steps=30, mutation_rate=0.05, ratio=2, backend="serial")
+        assert results == [(expected.rna_count(), expected.mutation_counts())] * 2
+
+    @pytest.mark.parametrize(
+        "options",
+        (
+            {"negative_propensity": 3.0},
+            {"positive_decay": 0.02, "negative_decay": 0.01},
+            {"max_rnas": 30},
+            {"mutation_spectrum": MutationSpectrum.uniform(0.05)},
+        ),
+    )
+    def test_options(self, options) -> None:
+        """
+        Resident cells replicated with optional replication parameters must
+        give the same counts as Cells.
+        """
+        cells = ResidentCells(3, Genome("ACGTTGCAAC"), workers=2, seed=5)
+        cells.replicate(steps=100, mutation_rate=0.05, ratio=2, **options)
+        result = counts(cells)
+        cells.close()
+
+        expected = Cells(3, Genome("ACGTTGCAAC"), seed=5)
+        expected.replicate(
+            steps=100, mutation_rate=0.05, ratio=2, backend="serial", **options
+        )
+        assert result == counts(expected)
+
+    def test_sample(self) -> None:
+        """
+        Resident cells must give the same sample as Cells for the same seeds,
+        whatever the number of workers.
+        """
+        results = []
+        for workers in 1, 2:
+            cells = ResidentCells(3, Genome("ACGTTGCAAC"), workers=workers, seed=5)
+            cells.replicate(steps=30, mutation_rate=0.05, ratio=2)
+            positive, negative, totals = cells.sample_apparent_mutation_counts(
+                40, seed=1
+            )
+            results.append((positive, negative, totals.tolist()))
+            cells.close()
+
+        expected = Cells(3, Genome("ACGTTGCAAC"), seed=5)
+        expected.replicate(steps=30, mutation_rate=0.05, ratio=2, backend="serial")
+        positive, negative, totals = expected.sample_apparent_mutation_counts(
+            40, seed=1
+        )
+        assert results == [(positive, negative, totals.tolist())] * 2
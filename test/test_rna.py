@@ -28,6 +28,16 @@ class Test_replicate:
     def test_three_bases(self) -> None:
         assert RNA(Genome("GAT", positive=True)).replicate() == RNA(Genome("ATC", positive=False))
 
+    def test_count(self) -> None:
+        """
+        Replicating with a count must return that many copies and add the count
+        to the number of replications.
+        """
+        rna = RNA(Genome("GAT", positive=False))
+        copies = rna.replicate(count=4)
+        assert copies == [RNA(Genome("ATC", positive=True))] * 4
+        assert rna.replications == 4
+
 
 class Test_equality:
     """
@@ -0,0 +1,159 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation import rna_store
+from viral_rna_simulation.cell import Cell
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.rna import RNA
+from viral_rna_simulation.rna_store import RNAStore
+
+
+def mutated(genome: Genome, seed: int) -> Genome:
+    """
+    Make a mutated copy of a genome.
+    """
+    return genome.replicate(0.5, np.random.default_rng(seed))
+
+
+class Test_rna_store:
+    """
+    Test the RNAStore class.
+    """
+
+    def test_empty(self, tmp_path) -> None:
+        """
+        A new store with no RNA must be empty.
+        """
+        store = RNAStore(str(tmp_path), 4)
+        assert len(store) == 0
+        assert list(store) == []
+
+    def test_round_trip(self, tmp_path) -> None:
+        """
+        Stored molecules must be read back with the same sense, bases, history,
+        mutant sites and replication count.
+        """
+        genome = Genome("ACGTTGCA")
+        genomes = [genome, mutated(genome, 1), mutated(mutated(genome, 1), 2)]
+        rnas = [RNA(genome) for genome in genomes]
+        rnas[1].replications = 3
+        store = RNAStore(str(tmp_path), 8, rnas)
+
+        assert len(store) == 3
+        for stored in store, [store[index] for index in range(3)]:
+            for rna, stored_rna in zip(rnas, stored):
+                assert rna == stored_rna
+                assert rna.replications == stored_rna.replications
+                assert rna.genome.history == stored_rna.genome.history
+                assert rna.genome.mutant == stored_rna.genome.mutant
+
+    def test_negative_index(self, tmp_path) -> None:
+        """
+        A negative index must count from the end, and an index out of range must
+        raise an IndexError.
+        """
+        store = RNAStore(str(tmp_path), 3, [RNA(Genome("ACG")), RNA(Genome("TTT"))])
+        assert str(store[-1].genome) == "TTT"
+        with pytest.raises(IndexError):
+            store[2]
+
+    def test_replications_are_written_back(self, tmp_path) -> None:
+        """
+        Replicating a stored molecule must update its stored replication count.
+        """
+        store = RNAStore(str(tmp_path), 3, [RNA(Genome("ACG"))])
+        copy = store[0].replicate()
+        assert str(copy.genome) == "CGT"
+        assert store[0].replications == 1
+        assert [rna.replications for rna in store] == [1]
+
+    def test_delta_genome(self, tmp_path) -> None:
+        """
+        A delta genome must be stored as a full genome with the same sites.
+        """
+        delta = DeltaGenome(Genome("ACGTTGCA")).replicate(0.5, np.random.default_rng(3))
+        store = RNAStore(str(tmp_path), 8, [RNA(delta)])
+        genome = store[0].genome
+        assert not genome.positive
+        assert genome.sites == delta.sites
+
+    def test_growth(self, tmp_path, monkeypatch) -> None:
+        """
+        A store must grow to hold more molecules than its initial capacity, and
+        iterate over them in several chunks.
+        """
+        monkeypatch.setattr(rna_store, "INITIAL_CAPACITY", 2)
+        monkeypatch.setattr(rna_store, "CHUNK_BYTES", 12)
+        genome = Genome("ACGT")
+        rnas = [RNA(genome)]
+        for seed in range(9):
+            rnas.append(RNA(mutated(rnas[-1].genome, seed)))
+        store = RNAStore(str(tmp_path), 4, rnas)
+        assert list(store) == rnas
+        assert [rna.genome.history for rna in store] == [
+            rna.genome.history for rna in rnas
+        ]
+
+    def test_clear(self, tmp_path) -> None:
+        """
+        A cleared store must be empty, and must reuse its files for molecules
+        added after that.
+        """
+        store = RNAStore(str(tmp_path), 3, [RNA(mutated(Genome("ACG"), 1))])
+        store.clear()
+        assert len(store) == 0
+        store.append(RNA(Genome("TTT")))
+        assert list(store) == [RNA(Genome("TTT"))]
+        assert store[0].genome.history == {}
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_pickle(self, tmp_path) -> None:
+        """
+        A pickled store must use the same files, and so see later changes.
+        """
+        store = RNAStore(str(tmp_path), 3, [RNA(Genome("ACG"))])
+        copy = pickle.loads(pickle.dumps(store))
+        copy.append(RNA(Genome("TTT")))
+        assert list(copy) == [RNA(Genome("ACG")), RNA(Genome("TTT"))]
+        assert copy.bases_filename == store.bases_filename
+
+
+class Test_cells:
+    """
+    Test Cell and Cells with RNA molecules stored on disk.
+    """
+
+    def test_incompatible(self, tmp_path) -> None:
+        """
+        Storing molecules on disk and as haplotypes must raise a ValueError.
+        """
+        with pytest.raises(ValueError):
+            Cell(Genome("ACGT"), haplotypes=True, directory=str(tmp_path))
+
+    @pytest.mark.parametrize("backend", ("serial", "processes"))
+    def test_same_as_memory(self, tmp_path, backend) -> None:
+        """
+        Cells with molecules stored on disk must give the same results as cells
+        with molecules in memory.
+        """
+        summaries = []
+        for rna_directory in None, str(tmp_path):
+            cells = Cells(
+                2, Genome("ACGTTGCAAC"), check=True, seed=4, rna_directory=rna_directory
+            )
+            cells.replicate(steps=60, mutation_rate=0.05, ratio=3, backend=backend)
+            summaries.append(cells.summary())
+        assert summaries[0] == summaries[1]
+
+    def test_directory_removed(self, tmp_path) -> None:
+        """
+        The temporary directory must be removed when the cells are garbage
+        collected.
+        """
+        cells = Cells(1, Genome("ACGT"), rna_directory=str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 1
+        del cells
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from viral_rna_simulation.selection import Selection
+
+
+class Test_selection:
+    """
+    Test the Selection class.
+    """
+
+    def test_empty(self) -> None:
+        """
+        An empty selection must have no weights and must not be sampled.
+        """
+        selection = Selection()
+        assert len(selection) == 0
+        assert selection.total == 0
+        with pytest.raises(ValueError):
+            selection.sample(np.random.default_rng(1))
+
+    @pytest.mark.parametrize("append", (False, True))
+    def test_find(self, append) -> None:
+        """
+        Finding a value must give the index whose run of cumulative weight
+        contains it, whether the weights are given initially or appended.
+        """
+        weights = [3, 0, 1, 4, 2, 0, 5, 1, 1, 2, 7]
+        if append:
+            selection = Selection()
+            for weight in weights:
+                selection.append(weight)
+        else:
+            selection = Selection(weights)
+        assert selection.total == sum(weights)
+        expected = [
+            index for index, weight in enumerate(weights) for _ in range(weight)
+        ]
+        assert [selection.find(value) for value in range(sum(weights))] == expected
+
+    def test_update_and_remove(self) -> None:
+        """
+        Changing or removing weights must change what is found.
+        """
+        selection = Selection([1, 1, 1, 1, 1])
+        selection.update(2, 3)
+        selection.remove(0)
+        assert selection.total == 6
+        assert [selection.find(value) for value in range(6)] == [1, 2, 2, 2, 3, 4]
+
+    def test_swap_remove(self) -> None:
+        """
+        Removing an index must move the last weight into its place, and the
+        tree must stay correct as weights are removed and appended.
+        """
+        selection = Selection([1, 2, 3, 4, 5])
+        selection.swap_remove(1)
+        assert selection.weights == [1, 5, 3, 4]
+        assert selection.total == 13
+        for _ in range(3):
+            selection.swap_remove(len(selection) - 1)
+        assert selection.weights == [1]
+        selection.append(2)
+        selection.append(3)
+        assert [selection.find(value) for value in range(6)] == [0, 1, 1, 2, 2, 2]
+        selection.swap_remove(0)
+        selection.swap_remove(0)
+        selection.swap_remove(0)
+        assert len(selection) == 0 and selection.total == 0
+
+    def test_never_chooses_zero(self) -> None:
+        """
+        An index with zero weight must never be sampled.
+        """
+        rng = np.random.default_rng(2)
+        selection = Selection([0.1, 0.0, 0.2, 0.0])
+        selection.remove(2)
+        assert {selection.sample(rng) for _ in range(1000)} == {0}
+
+    def test_sample_proportions(self) -> None:
+        """
+        Sampling must choose each index with probability proportional to its
+        weight.
+        """
+        rng = np.random.default_rng(3)
+        weights = [0.5, 2.0, 1.0, 0.5]
+        selection = Selection(weights)
+        n = 40000
+        counts = np.bincount([selection.sample(rng) for _ in range(n)], minlength=4)
+        expected = n * np.array(weights) / sum(weights)
+        # Each count is within about five standard deviations of its expectation.
+        assert (np.abs(counts - expected) < 5 * np.sqrt(expected)).all()
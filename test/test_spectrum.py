@@ -0,0 +1,291 @@
+import pickle
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from viral_rna_simulation.genome import DeltaGenome, Genome
+from viral_rna_simulation.spectrum import (
+    DIRECT,
+    END,
+    MutationSpectrum,
+    SpectrumIndex,
+    alias_table,
+    context_classes,
+    read_spectrum,
+)
+from viral_rna_simulation.utils import CODES, encode
+
+
+def context(bases: str) -> int:
+    """
+    Get the code of a trinucleotide context.
+    """
+    left, middle, right = (CODES[base] for base in bases)
+    return 16 * left + 4 * middle + right
+
+
+def spectrum(strand: int, bases: str, to: str, rate: float) -> MutationSpectrum:
+    """
+    Make a spectrum with a single non-zero rate.
+    """
+    rates = np.zeros((2, 64, 4))
+    rates[strand, context(bases), CODES[to]] = rate
+    return MutationSpectrum(rates)
+
+
+class Test_context_classes:
+    """
+    Test the context_classes function.
+    """
+
+    def test_classes(self) -> None:
+        """
+        The class of each site must come from its base and those of its
+        neighbours, with END for the missing neighbours at the ends.
+        """
+        assert context_classes(encode("ACG")).tolist() == [
+            20 * END + 5 * 0 + 1,
+            20 * 0 + 5 * 1 + 2,
+            20 * 1 + 5 * 2 + END,
+        ]
+
+    def test_one_site(self) -> None:
+        """
+        A single site must have no neighbours.
+        """
+        assert context_classes(encode("T")).tolist() == [20 * END + 5 * 3 + END]
+
+
+class Test_alias_table:
+    """
+    Test the alias_table function.
+    """
+
+    def test_probabilities(self) -> None:
+        """
+        Choosing with an alias table must give the probabilities it was made
+        from, and never choose an outcome with probability zero.
+        """
+        probabilities = np.array([0.1, 0.0, 0.6, 0.3])
+        accept, alias = alias_table(probabilities)
+        rng = np.random.default_rng(1)
+        columns = rng.integers(4, size=100_000)
+        accepted = rng.random(100_000) < accept[columns]
+        chosen = np.where(accepted, columns, alias[columns])
+        frequencies = np.bincount(chosen, minlength=4) / 100_000
+        assert frequencies[1] == 0
+        assert np.allclose(frequencies, probabilities, atol=0.01)
+
+    def test_all_zero(self) -> None:
+        """
+        If all the probabilities are zero, the outcomes must be equally likely.
+        """
+        accept, alias = alias_table(np.zeros(4))
+        assert accept.tolist() == [1.0] * 4
+
+
+class Test_mutation_spectrum:
+    """
+    Test the MutationSpectrum class.
+    """
+
+    def test_wrong_shape(self) -> None:
+        """
+        Rates of the wrong shape must raise a ValueError.
+        """
+        with pytest.raises(ValueError, match="shape"):
+            MutationSpectrum(np.zeros((2, 64)))
+
+    def test_negative(self) -> None:
+        """
+        A negative rate must raise a ValueError.
+        """
+        with pytest.raises(ValueError, match="negative"):
+            spectrum(0, "ACG", "T", -0.1)
+
+    def test_total_too_big(self) -> None:
+        """
+        A context with a total rate of more than one must raise a ValueError.
+        """
+        rates = np.zeros((2, 64, 4))
+        rates[1, context("ACG"), [CODES["A"], CODES["G"]]] = 0.6
+        with pytest.raises(ValueError, match="more than one"):
+            MutationSpectrum(rates)
+
+    def test_same_base_ignored(self) -> None:
+        """
+        The rate of a substitution to the middle base of a context must be
+        ignored.
+        """
+        assert not spectrum(0, "ACG", "C", 0.5).rates.any()
+
+    def test_uniform(self) -> None:
+        """
+        A uniform spectrum must have the same rate for all substitutions.
+        """
+        rates = MutationSpectrum.uniform(0.03).rates
+        assert np.allclose(rates.sum(axis=2), 0.03)
+        assert set(rates.ravel().tolist()) == {0.0, 0.01}
+
+    def test_to_list(self) -> None:
+        """
+        A spectrum made from the list of its rates must be equal to it.
+        """
+        rates = spectrum(1, "TCA", "T", 0.1)
+        assert MutationSpectrum(rates.to_list()) == rates
+
+    def test_index_shared(self) -> None:
+        """
+        The index of a genome must be made once and shared.
+        """
+        rates = MutationSpectrum.uniform(0.01)
+        genome = Genome("ACGTTGCAAC")
+        index = rates.index(genome.bases)
+        assert rates.index(Genome("ACGTTGCAAC").bases) is index
+        assert rates.index(Genome("ACGTTGCAAA").bases) is not index
+
+    def test_pickle(self) -> None:
+        """
+        Pickling must keep the rates but not the indexes.
+        """
+        rates = MutationSpectrum.uniform(0.01)
+        rates.index(Genome("ACGTTGCAAC").bases)
+        unpickled = pickle.loads(pickle.dumps(rates))
+        assert unpickled == rates
+        assert unpickled._indexes == {}
+
+
+class Test_read_spectrum:
+    """
+    Test the read_spectrum function.
+    """
+
+    def test_read(self, tmp_path) -> None:
+        """
+        Wildcards must match any base, later lines must override earlier ones,
+        and 'both' must set the rates for both strands.
+        """
+        filename = tmp_path / "spectrum.tsv"
+        filename.write_text(
+            "# A comment.\n"
+            "strand\tcontext\tto\trate\n"
+            "both\tNNN\tA\t0.001\n"
+            "\n"
+            "-\tTCN\tT\t0.01\n"
+            "-\tTCA\tT\t0.02\n"
+        )
+        rates = read_spectrum(str(filename)).rates
+        assert rates[0, context("TCA"), CODES["T"]] == 0.0
+        assert rates[1, context("TCA"), CODES["T"]] == 0.02
+        assert rates[1, context("TCG"), CODES["T"]] == 0.01
+        assert rates[0, context("GCG"), CODES["A"]] == 0.001
+        assert rates[1, context("GAG"), CODES["A"]] == 0.0
+        assert np.count_nonzero(rates) == 2 * 48 + 4
+
+    @pytest.mark.parametrize(
+        "line", ["+\tTC\tT\t0.1", "x\tTCA\tT\t0.1", "+\tTCA\tU\t0.1", "+\tTCA\tT"]
+    )
+    def test_bad_line(self, tmp_path, line) -> None:
+        """
+        A line that cannot be understood must raise a ValueError.
+        """
+        filename = tmp_path / "spectrum.tsv"
+        filename.write_text(f"strand\tcontext\tto\trate\n{line}\n")
+        with pytest.raises(ValueError, match="line 2"):
+            read_spectrum(str(filename))
+
+
+class Test_spectrum_index:
+    """
+    Test the SpectrumIndex class and replication with a mutation spectrum.
+    """
+
+    def test_ends(self) -> None:
+        """
+        The rate of a site at an end must be the average of those of the
+        contexts it could have.
+        """
+        index = SpectrumIndex(spectrum(0, "AAC", "T", 0.4), encode("ACGT"))
+        assert index.totals[0, 20 * END + 5 * CODES["A"] + CODES["C"]] == 0.1
+
+    @pytest.mark.parametrize("delta", [False, True])
+    def test_context(self, delta) -> None:
+        """
+        Only the sites in a context with a non-zero rate for the strand being
+        made must be mutated, to the given base, with the given rate.
+        """
+        genome = Genome(length=2000, rng=np.random.default_rng(3))
+        index = spectrum(1, "TCA", "T", 0.1).index(genome.bases)
+        rng = np.random.default_rng(1)
+        template = DeltaGenome(genome) if delta else genome
+        copies = template.replicate(index, rng, 2000)
+
+        # A C at the start (with no neighbour before it) has a quarter of the
+        # rate of one in a TCA.
+        new = str(genome.rc())
+        expected = {
+            offset + 1
+            for offset in range(len(new) - 2)
+            if new[offset : offset + 3] == "TCA"
+        }
+        assert new.startswith("CA")
+        sites = Counter()
+        for copy in copies:
+            assert not copy.positive
+            for offset in copy.mutant:
+                offset = len(genome) - 1 - offset if delta else offset
+                assert copy.bases[offset] == CODES["T"]
+                sites[offset] += 1
+        assert set(sites) - {0} <= expected
+        assert sites[0] / 2000 == pytest.approx(0.025, rel=0.3)
+        rate = sum(sites[offset] for offset in expected) / (2000 * len(expected))
+        assert rate == pytest.approx(0.1, rel=0.05)
+
+        # No mutations are made in (+) strand synthesis.
+        assert not any(copy.replicate(index, rng).mutant for copy in copies[:100])
+
+    def test_uniform(self) -> None:
+        """
+        A uniform spectrum must give the same mean number of mutations as the
+        uniform mutation rate.
+        """
+        genome = Genome(length=1000, rng=np.random.default_rng(3))
+        index = MutationSpectrum.uniform(0.01).index(genome.bases)
+        copies = genome.replicate(index, np.random.default_rng(1), 1000)
+        mean = sum(len(copy.mutant) for copy in copies) / 1000
+        assert mean == pytest.approx(10, rel=0.05)
+
+    @pytest.mark.parametrize("delta", [False, True])
+    @pytest.mark.parametrize("direct", [0, DIRECT])
+    def test_new_context(self, delta, direct, monkeypatch) -> None:
+        """
+        A context made by an earlier mutation must be mutated with its own rate,
+        and one destroyed by an earlier mutation must not be, whether or not the
+        sites with changed contexts are grouped by class.
+        """
+        monkeypatch.setattr("viral_rna_simulation.spectrum.DIRECT", direct)
+        infecting = Genome("A" * 10 + "C" + "A" * 9)
+        # A (-) molecule made from this has a TGT, with the G at offset 9.
+        index = spectrum(1, "TGT", "A", 1.0).index(infecting.bases)
+        rng = np.random.default_rng(1)
+
+        if delta:
+            changed = DeltaGenome(infecting, changes={10: CODES["A"]})
+        else:
+            changed = Genome(encode("A" * 20), history={10: (("CA", True),)})
+        assert not changed.replicate(index, rng).mutant
+
+        infecting = Genome("A" * 20)
+        index = spectrum(1, "TGT", "A", 1.0).index(infecting.bases)
+        if delta:
+            changed = DeltaGenome(infecting, changes={10: CODES["C"]})
+            expected = frozenset({10})
+        else:
+            changed = Genome(
+                encode("A" * 10 + "C" + "A" * 9), history={10: (("AC", True),)}
+            )
+            expected = frozenset({9})
+        for copy in changed.replicate(index, rng, 5):
+            assert copy.mutant == expected
+            assert str(copy) == "T" * 9 + "A" + "T" * 10
@@ -0,0 +1,84 @@
+from io import StringIO
+
+import pytest
+
+from viral_rna_simulation.sweep import COLUMNS, run_job, sweep, sweep_jobs, write_rows
+
+
+class Test_sweep_jobs:
+    """
+    Test the sweep_jobs function.
+    """
+
+    def test_count(self) -> None:
+        """
+        There must be a job for every replicate of every combination.
+        """
+        jobs = sweep_jobs(
+            mutation_rates=(0.0, 0.1), ratios=(1, 2, 3), replicates=4, seed=1
+        )
+        assert len(jobs) == 24
+        assert [job["job"] for job in jobs] == list(range(24))
+        assert {(job["mutation_rate"], job["ratio"]) for job in jobs} == {
+            (rate, ratio) for rate in (0.0, 0.1) for ratio in (1, 2, 3)
+        }
+
+    def test_seeds(self) -> None:
+        """
+        Jobs must have distinct seeds, and the same sweep seed must give the same
+        job seeds.
+        """
+        jobs = sweep_jobs(ratios=(1, 2), replicates=3, seed=1)
+        seeds = [job["seed"] for job in jobs]
+        assert len(set(seeds)) == 6
+        assert seeds == [
+            job["seed"] for job in sweep_jobs(ratios=(1, 2), replicates=3, seed=1)
+        ]
+
+
+class Test_sweep:
+    """
+    Test the sweep function.
+    """
+
+    def test_run_job(self) -> None:
+        """
+        A job with no mutation rate must have no mutations, and the expected
+        number of RNA molecules.
+        """
+        (job,) = sweep_jobs(mutation_rates=(0.0,), genome_lengths=(20,), seed=3)
+        row = run_job(job, n_cells=2, steps=10)
+        assert tuple(row) == COLUMNS
+        assert row["positive_rnas"] + row["negative_rnas"] == 22
+        assert row["positive_mutations"] == row["negative_mutations"] == 0
+        assert row["actual_rate"] == row["apparent_rate"] == 0.0
+
+    @pytest.mark.parametrize("workers", (1, 2))
+    def test_reproducible(self, workers) -> None:
+        """
+        A sweep must give one row per job, and the rows must not depend on the
+        number of workers.
+        """
+        jobs = sweep_jobs(mutation_rates=(0.01, 0.1), genome_lengths=(30,), seed=5)
+        rows = sorted(
+            sweep(jobs, steps=20, workers=workers), key=lambda row: row["job"]
+        )
+        assert rows == [run_job(job, steps=20) for job in jobs]
+
+    def test_resident_engine(self) -> None:
+        """
+        The resident engine must be rejected.
+        """
+        with pytest.raises(ValueError):
+            list(sweep(sweep_jobs(), engine="resident"))
+
+    def test_write_rows(self) -> None:
+        """
+        Rows must be written as TSV with a header.
+        """
+        jobs = sweep_jobs(ratios=(1, 2), genome_lengths=(10,), seed=5)
+        fp = StringIO()
+        assert write_rows(sweep(jobs, steps=5, workers=1), fp) == 2
+        header, *lines = fp.getvalue().splitlines()
+        assert header.split("\t") == list(COLUMNS)
+        assert len(lines) == 2
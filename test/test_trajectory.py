@@ -0,0 +1,117 @@
+import pytest
+
+from viral_rna_simulation.array_cells import ArrayCells
+from viral_rna_simulation.cells import Cells
+from viral_rna_simulation.counts import TOTALS
+from viral_rna_simulation.genome import Genome
+from viral_rna_simulation.resident_cells import ResidentCells
+from viral_rna_simulation.trajectory import Trajectory
+
+
+def recorded(backend: str = "serial", chunks: tuple[int, ...] = (30,)) -> Cells:
+    """
+    Replicate some cells with mutations (in chunks of steps), recording their
+    totals every 4 steps.
+    """
+    cells = Cells(3, Genome("ACGTTGCAAC" * 3), seed=2)
+    cells.record_trajectory(4, sum(chunks))
+    for steps in chunks:
+        cells.replicate(steps=steps, mutation_rate=0.05, ratio=2, backend=backend)
+    return cells
+
+
+class Test_trajectory:
+    """
+    Test the Trajectory class.
+    """
+
+    def test_bad_interval(self) -> None:
+        """
+        A recording interval less than one must raise a ValueError.
+        """
+        with pytest.raises(ValueError):
+            Trajectory(2, 0)
+
+    def test_preallocated(self) -> None:
+        """
+        The totals array must be allocated for the expected steps.
+        """
+        trajectory = Trajectory(3, 4, 30, start=5)
+        # Steps 8, 12, ..., 28 will be recorded.
+        assert trajectory.totals.shape == (6, 3, len(TOTALS))
+        assert len(trajectory) == 0
+
+    def test_steps(self) -> None:
+        """
+        The recorded steps must be the multiples of the interval.
+        """
+        cells = recorded()
+        assert cells.trajectory.steps.tolist() == [4, 8, 12, 16, 20, 24, 28]
+
+    def test_final_totals(self) -> None:
+        """
+        The totals recorded at the final step must match the final counts.
+        """
+        cells = Cells(2, Genome("ACGTTGCAAC"), seed=2)
+        cells.record_trajectory(5, 20)
+        cells.replicate(steps=20, mutation_rate=0.05, backend="serial")
+        last = cells.trajectory.totals[len(cells.trajectory) - 1]
+        assert [tuple(totals.tolist()) for totals in last] == [
+            cell.counts.totals() for cell in cells
+        ]
+
+    def test_chunks(self) -> None:
+        """
+        Replicating in chunks must record the same totals as replicating at
+        once, even if the chunks are not multiples of the interval.
+        """
+        expected = recorded().trajectory.frame()
+        assert recorded(chunks=(7, 10, 13)).trajectory.frame().equals(expected)
+
+    def test_grows(self) -> None:
+        """
+        Replicating more steps than expected must grow the totals array.
+        """
+        cells = recorded(chunks=(30, 30))
+        assert len(cells.trajectory) == 15
+        assert cells.trajectory.frame().equals(
+            recorded(chunks=(60,)).trajectory.frame()
+        )
+
+    @pytest.mark.parametrize("backend", ("threads", "processes"))
+    def test_backends(self, backend) -> None:
+        """
+        All backends must record the same totals.
+        """
+        assert (
+            recorded(backend)
+            .trajectory.frame()
+            .equals(recorded().trajectory.frame())
+        )
+
+    def test_resident_cells(self) -> None:
+        """
+        Resident cells must record the same totals as Cells.
+        """
+        cells = ResidentCells(3, Genome("ACGTTGCAAC" * 3), workers=2, seed=2)
+        cells.record_trajectory(4, 30)
+        cells.replicate(steps=30, mutation_rate=0.05, ratio=2)
+        frame = cells.trajectory.frame()
+        cells.close()
+        assert frame.equals(recorded().trajectory.frame())
+
+    def test_array_cells(self) -> None:
+        """
+        ArrayCells must refuse to record a trajectory.
+        """
+        with pytest.raises(ValueError):
+            ArrayCells(2, Genome("ACGT")).record_trajectory(4)
+
+    def test_frame(self) -> None:
+        """
+        The data frame must have a row for each recording and cell.
+        """
+        frame = recorded().trajectory.frame()
+        assert frame.columns == ["step", "cell", *TOTALS]
+        assert len(frame) == 7 * 3
+        assert frame["cell"].to_list()[:6] == [0, 1, 2, 0, 1, 2]
@@ -1,6 +1,17 @@
+import numpy as np
 import pytest
 
-from viral_rna_simulation.utils import rc, rc1, mutate_base
+from viral_rna_simulation.utils import (
+    BASES,
+    CODES,
+    decode,
+    encode,
+    grow,
+    mutate_base,
+    rc,
+    rc1,
+    rc_codes,
+)
 
 
 class Test_rc:
@@ -60,3 +71,51 @@ class Test_mutate_base:
     def test_one_base(self, from_, expected) -> None:
         for _ in range(100):
             assert mutate_base(from_) in expected
+
+
+class Test_encode_decode:
+    """
+    Test the encode and decode functions.
+    """
+    def test_roundtrip(self) -> None:
+        assert decode(encode("ACGTTGCA")) == "ACGTTGCA"
+
+    def test_complement_codes(self) -> None:
+        for base in "ACGT":
+            assert BASES[3 - CODES[base]] == rc1(base)
+
+    def test_rc_codes(self) -> None:
+        assert decode(rc_codes(encode("ATCG"))) == rc("ATCG")
+
+    def test_invalid(self) -> None:
+        with pytest.raises(ValueError):
+            encode("AXG")
+
+
+class Test_grow:
+    """
+    Test the grow function.
+    """
+    def test_big_enough(self) -> None:
+        """
+        An array that is already big enough must be returned unchanged.
+        """
+        array = np.arange(4)
+        assert grow(array, 3) is array
+
+    def test_doubled(self) -> None:
+        """
+        A small array must be at least doubled, keeping its contents.
+        """
+        grown = grow(np.arange(4, dtype=np.uint8), 5)
+        assert grown.dtype == np.uint8
+        assert grown.tolist() == [0, 1, 2, 3, 0, 0, 0, 0]
+
+    def test_trailing_shape(self) -> None:
+        """
+        The trailing shape of the array must be kept.
+        """
+        grown = grow(np.ones((2, 3)), 7)
+        assert grown.shape == (7, 3)
+        assert grown[:2].tolist() == [[1.0] * 3] * 2
+        assert not grown[2:].any()